@@ -1,4 +1,5 @@
 import streamlit as st
+from functions.prewarm import start_prewarmer
 
 try:
     st.set_page_config(
@@ -6,6 +7,9 @@ try:
 except Exception as e:
     st.error(f"Error setting page configuration: {e}")
 
+# Warms the default views of both dashboards in the background
+start_prewarmer()
+
 try:
     st.title('Cannabis Analytics Dashboard')
     st.sidebar.success("Select a dashboard from the menu.")
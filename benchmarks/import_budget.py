@@ -0,0 +1,134 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_PATH = os.path.join(REPO_ROOT, "benchmarks", "import_budget.json")
+ENTRY_POINTS = ["Main.py", "pages/sales_analytics.py", "pages/product_sales_analytics.py"]
+DEFAULT_TOLERANCE = 0.25
+
+# Backends that should only be imported by the renderer that needs them
+LAZY_BACKENDS = ["plotly.express", "seaborn", "matplotlib.pyplot", "snowflake.connector", "pydeck"]
+
+# Imported by the interpreter or the probe itself rather than by the entry point
+PROBE_MODULES = {"site", "encodings", "ast", "json", "time"}
+
+# Runs only the module-level imports of a script in a fresh interpreter: once cold, then
+# repeatedly against the warm sys.modules, which is what a Streamlit rerun pays.
+PROBE = """
+import ast, json, sys, time
+path, reruns = sys.argv[1], int(sys.argv[2])
+tree = ast.parse(open(path).read())
+imports = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+code = compile(ast.Module(body=imports, type_ignores=[]), path, "exec")
+started = time.perf_counter()
+exec(code, {"__name__": "__probe__"})
+cold = time.perf_counter() - started
+rerun_times = []
+for _ in range(reruns):
+    started = time.perf_counter()
+    exec(code, {"__name__": "__probe__"})
+    rerun_times.append(time.perf_counter() - started)
+print(json.dumps({
+    "cold_ms": cold * 1000,
+    "rerun_ms": sorted(rerun_times)[len(rerun_times) // 2] * 1000,
+    "loaded_backends": [name for name in json.loads(sys.argv[3]) if name in sys.modules],
+}))
+"""
+
+
+def measure(entry_point, repeat=3, reruns=20):
+    samples = []
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, "-c", PROBE, entry_point, str(reruns), json.dumps(LAZY_BACKENDS)],
+            cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+        )
+        samples.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    return {
+        "cold_ms": round(min(sample["cold_ms"] for sample in samples), 1),
+        "rerun_ms": round(statistics.median(sample["rerun_ms"] for sample in samples), 3),
+        "loaded_backends": samples[0]["loaded_backends"],
+        "heaviest_imports": heaviest_imports(entry_point),
+    }
+
+
+def heaviest_imports(entry_point, limit=5):
+    # Top-level modules ranked by cumulative import time, from `python -X importtime`
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE, entry_point, "1", "[]"],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+    )
+    modules = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if name.startswith("  ") or name.strip() in PROBE_MODULES:
+            continue
+        modules.append((int(cumulative) / 1000, name.strip()))
+    return [
+        {"module": name, "cumulative_ms": round(cumulative_ms, 1)}
+        for cumulative_ms, name in sorted(modules, reverse=True)[:limit]
+    ]
+
+
+def check(report, budget, tolerance):
+    failures = []
+    for entry_point, result in report.items():
+        limits = budget.get(entry_point)
+        if limits is None:
+            continue
+        if result["cold_ms"] > limits["cold_ms"] * (1 + tolerance):
+            failures.append(
+                f"{entry_point}: cold import {result['cold_ms']} ms exceeds budget {limits['cold_ms']} ms")
+        if result["loaded_backends"]:
+            failures.append(
+                f"{entry_point}: imports {', '.join(result['loaded_backends'])} eagerly")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure cold-start and per-rerun import time of the Streamlit entry points.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed fractional regression over the recorded budget.")
+    parser.add_argument("--update", action="store_true",
+                        help="Record the measured cold-start times as the new budget.")
+    parser.add_argument("--output", help="Also write the report as JSON to this path.")
+    args = parser.parse_args()
+
+    report = {entry_point: measure(entry_point, args.repeat) for entry_point in ENTRY_POINTS}
+    for entry_point, result in report.items():
+        print(f"{entry_point:40} cold {result['cold_ms']:8.1f} ms   rerun {result['rerun_ms']:7.3f} ms")
+        for heavy in result["heaviest_imports"]:
+            print(f"{'':42}{heavy['module']:28} {heavy['cumulative_ms']:8.1f} ms")
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+    if args.update:
+        budget = {entry_point: {"cold_ms": result["cold_ms"]} for entry_point, result in report.items()}
+        with open(BUDGET_PATH, "w") as budget_file:
+            json.dump(budget, budget_file, indent=2)
+            budget_file.write("\n")
+        return 0
+
+    try:
+        with open(BUDGET_PATH) as budget_file:
+            budget = json.load(budget_file)
+    except OSError:
+        budget = {}
+    failures = check(report, budget, args.tolerance)
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
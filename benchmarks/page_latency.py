@@ -0,0 +1,317 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+
+# Every case starts from cleared caches; a background pre-warmer would refill them, and a
+# disk cache shared with the app would answer the cold runs
+os.environ.setdefault("FLORAOS_PREWARM", "0")
+os.environ.setdefault("FLORAOS_DISK_CACHE", "0")
+
+from benchmarks import synthetic_data  # noqa: E402
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(synthetic_data.DATA_DIR, "bench")
+PAGES = ["pages/sales_analytics.py", "pages/product_sales_analytics.py"]
+DEFAULT_SCALES = [10_000, 100_000, 1_000_000]
+DEFAULT_WIDTHS = [7, 30, 90, 365]
+DEFAULT_TOLERANCE = 0.25
+# Differences below this are timer noise on pages that render in tens of milliseconds
+MIN_REGRESSION_MS = 25.0
+APP_TIMEOUT_SECONDS = 600
+
+
+class QueryTimer:
+    # Records the interval each warehouse call spends in execute and fetch, from any thread
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.intervals = []
+        self.rows = 0
+
+    def reset(self):
+        with self._lock:
+            self.intervals = []
+            self.rows = 0
+
+    def record(self, started, rows):
+        with self._lock:
+            self.intervals.append((started, time.perf_counter()))
+            self.rows += rows
+
+    def summary(self):
+        with self._lock:
+            intervals = sorted(self.intervals)
+            rows = self.rows
+        # Queries fanned out in parallel overlap; the union is what the page waited on
+        covered = 0.0
+        current_start = current_end = None
+        for start, end in intervals:
+            if current_end is None or start > current_end:
+                if current_end is not None:
+                    covered += current_end - current_start
+                current_start, current_end = start, end
+            else:
+                current_end = max(current_end, end)
+        if current_end is not None:
+            covered += current_end - current_start
+        return {
+            "queries": len(intervals),
+            "rows": rows,
+            "query_ms": sum(end - start for start, end in intervals) * 1000,
+            "query_wall_ms": covered * 1000,
+        }
+
+
+class TimedConnection:
+
+    def __init__(self, connection, timer):
+        self._connection = connection
+        self._timer = timer
+
+    def cursor(self):
+        return TimedCursor(self._connection.cursor(), self._timer)
+
+
+class TimedCursor:
+
+    def __init__(self, cursor, timer):
+        self._cursor = cursor
+        self._timer = timer
+        self._started = None
+
+    def execute(self, query, params=None):
+        self._started = time.perf_counter()
+        self._cursor.execute(query, params)
+        return self
+
+    def execute_async(self, query, params=None):
+        self._started = time.perf_counter()
+        return self._cursor.execute_async(query, params)
+
+    def fetch_pandas_all(self):
+        df = self._cursor.fetch_pandas_all()
+        self._timer.record(self._started, len(df))
+        return df
+
+    def fetch_arrow_batches(self):
+        rows = 0
+        for batch in self._cursor.fetch_arrow_batches():
+            rows += batch.num_rows
+            yield batch
+        self._timer.record(self._started, rows)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def warehouse_path(scale, seed, end_date):
+    # Generated once per scale, seed and end date and reused across runs
+    directory = os.path.join(BENCH_DIR, f"{scale}-seed{seed}-{end_date}")
+    path = os.path.join(directory, "floraos.duckdb")
+    if not os.path.exists(path):
+        print(f"Generating {scale:,} transactions into {path}", file=sys.stderr)
+        synthetic_data.generate(path, scale, seed=seed, end_date=end_date)
+    return path
+
+
+def reset_caches():
+    import streamlit as st
+    from functions.charts import chart_cache
+    from functions.query_cache import query_cache
+
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    query_cache.clear()
+    chart_cache.clear()
+
+
+def date_window(width, today):
+    # The pages default to, and the product page is capped at, the end of last month
+    end = today.replace(day=1) - datetime.timedelta(days=1)
+    return end - datetime.timedelta(days=width - 1), end
+
+
+def analysis_types(page):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(REPO_ROOT, page), default_timeout=APP_TIMEOUT_SECONDS)
+    at.run()
+    return list(at.sidebar.radio[0].options)
+
+
+def run_case(page, analysis_type, window, timer, measure_memory):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(REPO_ROOT, page), default_timeout=APP_TIMEOUT_SECONDS)
+    at.run()
+    at.sidebar.date_input[0].set_value(window)
+    at.sidebar.radio[0].set_value(analysis_type)
+    reset_caches()
+
+    result = {}
+    for phase in ("cold", "warm"):
+        timer.reset()
+        if measure_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        at.run()
+        wall_ms = (time.perf_counter() - started) * 1000
+        phase_result = {"wall_ms": wall_ms, **timer.summary()}
+        if measure_memory:
+            phase_result["peak_memory_mb"] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+            tracemalloc.stop()
+        # Everything the page waited on that was not the warehouse: transforms and rendering
+        phase_result["render_ms"] = max(wall_ms - phase_result["query_wall_ms"], 0.0)
+        result[phase] = phase_result
+
+    result["errors"] = [element.value for element in at.error] + [
+        str(element.value) for element in at.exception]
+    return result
+
+
+def run(scales, widths, repeat, seed, use_rollups, measure_memory, pages=PAGES):
+    from functions import local_warehouse
+    from functions.query_executor import cursor_pool
+    from functions.rollup_store import rollup_store
+
+    today = datetime.date.today()
+    timer = QueryTimer()
+    results = []
+    for scale in scales:
+        path = warehouse_path(scale, seed, today.isoformat())
+        cursor_pool.set_connection_factory(
+            lambda path=path: TimedConnection(local_warehouse.connect(path), timer))
+        # Without --rollups the rollup root is left empty so every page reads the warehouse
+        rollup_store.root = os.path.join(
+            os.path.dirname(path), "rollups" if use_rollups else "no-rollups")
+        if use_rollups and rollup_store.manifest() is None:
+            rollup_store.refresh()
+
+        for page in pages:
+            for analysis_type in analysis_types(page):
+                for width in widths:
+                    window = date_window(width, today)
+                    samples = [run_case(page, analysis_type, window, timer, False)
+                               for _ in range(repeat)]
+                    case = {
+                        "page": page,
+                        "analysis_type": analysis_type,
+                        "days": width,
+                        "scale": scale,
+                        "cold": _median_phase(samples, "cold"),
+                        "warm": _median_phase(samples, "warm"),
+                        "errors": samples[-1]["errors"],
+                    }
+                    if measure_memory:
+                        # A separate run, since tracing allocations skews the timings
+                        traced = run_case(page, analysis_type, window, timer, True)
+                        case["cold"]["peak_memory_mb"] = traced["cold"]["peak_memory_mb"]
+                        case["warm"]["peak_memory_mb"] = traced["warm"]["peak_memory_mb"]
+                    results.append(case)
+                    _print_case(case)
+    return {"meta": _meta(seed, use_rollups, repeat), "results": results}
+
+
+def _median_phase(samples, phase):
+    return {
+        metric: round(statistics.median(sample[phase][metric] for sample in samples), 3)
+        for metric in samples[0][phase]
+    }
+
+
+def _print_case(case):
+    cold, warm = case["cold"], case["warm"]
+    status = f"  ERRORS: {'; '.join(case['errors'])}" if case["errors"] else ""
+    print(f"{case['page']:34} {case['analysis_type']:24} {case['days']:>4}d {case['scale']:>10,}  "
+          f"cold {cold['wall_ms']:9.1f} ms (query {cold['query_wall_ms']:8.1f}, "
+          f"render {cold['render_ms']:8.1f})  warm {warm['wall_ms']:8.1f} ms{status}")
+
+
+def _meta(seed, use_rollups, repeat):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "recorded_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "seed": seed,
+        "rollups": use_rollups,
+        "repeat": repeat,
+    }
+
+
+def _case_key(case):
+    return (case["page"], case["analysis_type"], case["days"], case["scale"])
+
+
+def compare(report, baseline, tolerance, phase="cold"):
+    # Wall-time regressions beyond the tolerance, for every combination both reports ran
+    baseline_cases = {_case_key(case): case for case in baseline["results"]}
+    failures = []
+    for case in report["results"]:
+        before = baseline_cases.get(_case_key(case))
+        if before is None:
+            continue
+        old, new = before[phase]["wall_ms"], case[phase]["wall_ms"]
+        change = (new - old) / old if old else 0.0
+        print(f"{case['page']:34} {case['analysis_type']:24} {case['days']:>4}d {case['scale']:>10,}  "
+              f"{old:9.1f} -> {new:9.1f} ms  {change:+7.1%}")
+        if change > tolerance and new - old > MIN_REGRESSION_MS:
+            failures.append(f"{' / '.join(map(str, _case_key(case)))}: {phase} wall time "
+                            f"{new:.1f} ms vs {old:.1f} ms ({change:+.0%})")
+        if case["errors"]:
+            failures.append(f"{' / '.join(map(str, _case_key(case)))}: {'; '.join(case['errors'])}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure per-page, per-analysis latency and memory against a synthetic warehouse.")
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES,
+                        help="Synthetic transaction counts to benchmark.")
+    parser.add_argument("--days", type=int, nargs="+", default=DEFAULT_WIDTHS,
+                        help="Date-range widths in days.")
+    parser.add_argument("--pages", nargs="+", default=PAGES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--rollups", action="store_true",
+                        help="Serve the pages from refreshed rollups instead of the warehouse.")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the peak-memory pass.")
+    parser.add_argument("--output", help="Write the report as JSON to this path.")
+    parser.add_argument("--compare", help="Baseline report to compare cold wall times against.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed fractional regression over the baseline.")
+    args = parser.parse_args()
+
+    report = run(args.scales, args.days, args.repeat, args.seed, args.rollups,
+                 not args.no_memory, args.pages)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+            output_file.write("\n")
+
+    failures = [f"{' / '.join(map(str, _case_key(case)))}: {'; '.join(case['errors'])}"
+                for case in report["results"] if case["errors"]]
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            failures = compare(report, json.load(baseline_file), args.tolerance)
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,288 @@
+import argparse
+import datetime
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from functions.storage import DATA_DIR
+
+
+DEFAULT_PATH = os.path.join(DATA_DIR, "floraos.duckdb")
+DEFAULT_DAYS = 730
+CHUNK_TRANSACTIONS = 1_000_000
+
+# Store name in dutchie_inventory, display name in the inventory aging report, map centre
+LOCATIONS = [
+    ("lebanon", "Blue Sage - Lebanon (SMO5)", 37.68, -92.66),
+    ("carthage", "Blue Sage - Carthage (SMO6)", 37.18, -94.31),
+    ("springfield", "Blue Sage - Springfield (SMO7)", 37.21, -93.29),
+    ("joplin", "Blue Sage - Joplin (SMO8)", 37.08, -94.51),
+]
+BUDTENDERS_PER_LOCATION = 12
+
+# Category, master category, counts as cannabis inventory, share of the catalogue, median price
+CATEGORIES = [
+    ("Flower", "Flower", True, 0.30, 35.0),
+    ("Pre-Rolls", "Flower", True, 0.15, 12.0),
+    ("Vapes", "Concentrates", True, 0.15, 40.0),
+    ("Concentrates", "Concentrates", True, 0.10, 50.0),
+    ("Edibles", "Edibles", True, 0.15, 20.0),
+    ("Tinctures", "Ingestibles", True, 0.05, 45.0),
+    ("Topicals", "Topicals", True, 0.03, 30.0),
+    ("Accessories", "Accessories", False, 0.07, 15.0),
+]
+STRAINS = ["Blue Dream", "Gelato", "Sour Diesel", "Wedding Cake", "GSC", "Runtz", "Zkittlez",
+           "Gorilla Glue", "Ice Cream Cake", "Jack Herer", "Northern Lights", "Purple Punch"]
+BRANDS = ["Flora Farms", "Proper", "Vertical", "Robust", "Illicit", "Clovr", "Good Day Farm"]
+
+# Weekends sell more; index 0 is Monday
+WEEKDAY_WEIGHTS = np.array([0.85, 0.85, 0.9, 1.0, 1.25, 1.35, 1.0])
+VOID_RATE = 0.02
+UNPRICED_RATE = 0.01
+KNOWN_CUSTOMER_RATE = 0.7
+
+SCHEMA = {
+    "DUTCHIE_TRANSACTIONS": """
+        TRANSACTIONID BIGINT, TRANSACTIONDATE TIMESTAMP, TOTAL DOUBLE, COMPLETEDBYUSER VARCHAR,
+        ISVOID BOOLEAN, CUSTOMERID BIGINT
+    """,
+    "dutchie_inventory": "PRODUCTID BIGINT, PRODUCTNAME VARCHAR, LOCATION VARCHAR, CATEGORY VARCHAR",
+    "flattened_itemsv_blue_sage_04_28_2024": """
+        TRANSACTIONID BIGINT, PRODUCTID BIGINT, QUANTITY INTEGER, TOTALPRICE DOUBLE
+    """,
+    "MATCHED_CUSTOMERS_ZIPCODES": """
+        CUSTOMERID BIGINT, ZIPCODE VARCHAR, LATITUDE DOUBLE, LONGITUDE DOUBLE,
+        CREATIONDATE TIMESTAMP
+    """,
+    "report_inventory_aging_may_7_24": """
+        LOCATION VARCHAR, PRODUCT VARCHAR, CATEGORY VARCHAR, MASTERCATEGORY VARCHAR,
+        CANNABISINVENTORY BOOLEAN, "0-30" INTEGER, "31-60" INTEGER, "61-90" INTEGER,
+        "91-120" INTEGER, "121+" INTEGER
+    """,
+}
+
+
+def scale_for(transactions):
+    # Catalogue and customer base grow with the transaction count, within sensible bounds
+    return {
+        "transactions": transactions,
+        "products": int(np.clip(transactions // 200, 50, 20_000)),
+        "customers": int(np.clip(transactions // 20, 100, 2_000_000)),
+    }
+
+
+def generate(path=DEFAULT_PATH, transactions=100_000, days=DEFAULT_DAYS, seed=7, end_date=None,
+             progress=None):
+    # Same seed, scale and end date always produce the same database
+    import duckdb
+
+    if os.path.splitext(os.path.basename(path))[0].lower() != "floraos":
+        raise ValueError("The database file must be named floraos.duckdb so queries can "
+                         "address it as the FLORAOS catalog")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if os.path.exists(path):
+        os.remove(path)
+
+    rng = np.random.default_rng(seed)
+    scale = scale_for(transactions)
+    end_date = pd.Timestamp(end_date or datetime.date.today()).normalize()
+    start_date = end_date - pd.Timedelta(days=days - 1)
+
+    connection = duckdb.connect(path)
+    try:
+        connection.execute("CREATE SCHEMA blue_sage")
+        for table, columns in SCHEMA.items():
+            connection.execute(f"CREATE TABLE blue_sage.{table} ({columns})")
+
+        products = _products(rng, scale["products"])
+        _insert(connection, "dutchie_inventory",
+                products[["PRODUCTID", "PRODUCTNAME", "LOCATION", "CATEGORY"]])
+        _insert(connection, "report_inventory_aging_may_7_24", _inventory_aging(rng, products))
+        _insert(connection, "MATCHED_CUSTOMERS_ZIPCODES",
+                _customers(rng, scale["customers"], start_date, end_date))
+
+        budtenders = _budtenders()
+        day_weights = _day_weights(start_date, days)
+        product_index = _ProductIndex(products)
+        for first_id in range(1, transactions + 1, CHUNK_TRANSACTIONS):
+            size = min(CHUNK_TRANSACTIONS, transactions - first_id + 1)
+            df_transactions, df_items = _transaction_chunk(
+                rng, first_id, size, start_date, day_weights, budtenders, product_index,
+                scale["customers"])
+            _insert(connection, "DUTCHIE_TRANSACTIONS", df_transactions)
+            _insert(connection, "flattened_itemsv_blue_sage_04_28_2024", df_items)
+            if progress:
+                progress(first_id + size - 1, transactions)
+        connection.execute("CHECKPOINT")
+    finally:
+        connection.close()
+    return scale
+
+
+def _insert(connection, table, df):
+    connection.register("synthetic_chunk", df)
+    try:
+        connection.execute(f"INSERT INTO blue_sage.{table} SELECT * FROM synthetic_chunk")
+    finally:
+        connection.unregister("synthetic_chunk")
+
+
+def _products(rng, count):
+    shares = np.array([category[3] for category in CATEGORIES])
+    category_index = rng.choice(len(CATEGORIES), size=count, p=shares / shares.sum())
+    location_index = rng.integers(len(LOCATIONS), size=count)
+    names = (
+        np.array(BRANDS)[rng.integers(len(BRANDS), size=count)].astype(object) + " "
+        + np.array(STRAINS)[rng.integers(len(STRAINS), size=count)].astype(object) + " "
+        + np.array([category[0] for category in CATEGORIES])[category_index].astype(object)
+        + " #" + (np.arange(count) % 97 + 1).astype(str).astype(object)
+    )
+    median_price = np.array([category[4] for category in CATEGORIES])[category_index]
+    return pd.DataFrame({
+        "PRODUCTID": np.arange(1, count + 1, dtype=np.int64),
+        "PRODUCTNAME": names,
+        "LOCATION": np.array([location[0] for location in LOCATIONS])[location_index],
+        "CATEGORY": np.array([category[0] for category in CATEGORIES])[category_index],
+        "MASTERCATEGORY": np.array([category[1] for category in CATEGORIES])[category_index],
+        "CANNABISINVENTORY": np.array([category[2] for category in CATEGORIES])[category_index],
+        "PRICE": np.round(median_price * rng.lognormal(0.0, 0.35, size=count), 2),
+        "LOCATION_INDEX": location_index,
+    })
+
+
+def _inventory_aging(rng, products):
+    report_names = np.array([location[1] for location in LOCATIONS])
+    # Most stock is fresh; a long tail has sat on the shelf for months
+    on_hand = rng.poisson(rng.gamma(1.5, 12.0, size=(len(products), 5)))
+    on_hand[:, 1:] *= rng.random((len(products), 4)) < [0.5, 0.3, 0.2, 0.15]
+    return pd.DataFrame({
+        "LOCATION": report_names[products["LOCATION_INDEX"].to_numpy()],
+        "PRODUCT": products["PRODUCTNAME"].to_numpy(),
+        "CATEGORY": products["CATEGORY"].to_numpy(),
+        "MASTERCATEGORY": products["MASTERCATEGORY"].to_numpy(),
+        "CANNABISINVENTORY": products["CANNABISINVENTORY"].to_numpy(),
+        **{bucket: on_hand[:, i].astype(np.int32)
+           for i, bucket in enumerate(["0-30", "31-60", "61-90", "91-120", "121+"])},
+    })
+
+
+def _customers(rng, count, start_date, end_date):
+    home = rng.integers(len(LOCATIONS), size=count)
+    centres = np.array([location[2:] for location in LOCATIONS])[home]
+    latitude = centres[:, 0] + rng.normal(0, 0.25, size=count)
+    longitude = centres[:, 1] + rng.normal(0, 0.3, size=count)
+    # Some addresses never matched a zip code
+    unmatched = rng.random(count) < 0.05
+    latitude[unmatched] = np.nan
+    longitude[unmatched] = np.nan
+    # Sign-ups start a year before the transaction history
+    history_seconds = int((end_date - start_date).total_seconds()) + 365 * 86_400
+    creation = (start_date - pd.Timedelta(days=365)) + pd.to_timedelta(
+        rng.integers(history_seconds, size=count), unit="s")
+    return pd.DataFrame({
+        "CUSTOMERID": np.arange(1, count + 1, dtype=np.int64),
+        "ZIPCODE": (64000 + rng.integers(1000, size=count)).astype(str),
+        "LATITUDE": np.round(latitude, 5),
+        "LONGITUDE": np.round(longitude, 5),
+        "CREATIONDATE": creation,
+    })
+
+
+def _budtenders():
+    return np.array([
+        [f"{location[0].title()} Budtender {i + 1:02d}" for i in range(BUDTENDERS_PER_LOCATION)]
+        for location in LOCATIONS
+    ])
+
+
+def _day_weights(start_date, days):
+    dates = pd.date_range(start_date, periods=days, freq="D")
+    growth = np.linspace(0.8, 1.2, days)
+    weights = WEEKDAY_WEIGHTS[dates.dayofweek] * growth
+    return weights / weights.sum()
+
+
+class _ProductIndex:
+    # Product ids grouped by store, so items can be drawn from the store that sold them
+
+    def __init__(self, products):
+        order = np.argsort(products["LOCATION_INDEX"].to_numpy(), kind="stable")
+        self.product_ids = products["PRODUCTID"].to_numpy()[order]
+        self.prices = products["PRICE"].to_numpy()[order]
+        self.sizes = np.bincount(products["LOCATION_INDEX"].to_numpy(), minlength=len(LOCATIONS))
+        self.offsets = np.r_[0, np.cumsum(self.sizes)[:-1]]
+
+    def sample(self, rng, location_index):
+        # Squaring a uniform draw skews sales toward each store's first products
+        within = (rng.random(len(location_index)) ** 2 * self.sizes[location_index]).astype(np.int64)
+        positions = self.offsets[location_index] + within
+        return self.product_ids[positions], self.prices[positions]
+
+
+def _transaction_chunk(rng, first_id, size, start_date, day_weights, budtenders, product_index,
+                       customers):
+    transaction_ids = np.arange(first_id, first_id + size, dtype=np.int64)
+    # Stores without products in a tiny catalogue make no sales
+    stocked = np.flatnonzero(product_index.sizes)
+    location_index = stocked[rng.integers(len(stocked), size=size)]
+    day = rng.choice(len(day_weights), size=size, p=day_weights)
+    seconds = rng.integers(9 * 3600, 21 * 3600, size=size)
+    transaction_date = start_date + pd.to_timedelta(day * 86_400 + seconds, unit="s")
+    budtender = budtenders[location_index, rng.integers(budtenders.shape[1], size=size)]
+
+    item_counts = 1 + rng.poisson(1.5, size=size)
+    item_transactions = np.repeat(transaction_ids, item_counts)
+    product_ids, prices = product_index.sample(rng, np.repeat(location_index, item_counts))
+    quantity = rng.integers(1, 4, size=len(product_ids)).astype(np.int32)
+    total_price = np.round(prices * quantity, 2)
+    total = np.add.reduceat(total_price, np.r_[0, np.cumsum(item_counts)[:-1]])
+    total[rng.random(size) < UNPRICED_RATE] = np.nan
+
+    customer_id = pd.array(rng.integers(1, customers + 1, size=size), dtype="Int64")
+    customer_id[rng.random(size) >= KNOWN_CUSTOMER_RATE] = pd.NA
+
+    df_transactions = pd.DataFrame({
+        "TRANSACTIONID": transaction_ids,
+        "TRANSACTIONDATE": transaction_date,
+        "TOTAL": np.round(total, 2),
+        "COMPLETEDBYUSER": budtender,
+        "ISVOID": rng.random(size) < VOID_RATE,
+        "CUSTOMERID": customer_id,
+    })
+    df_items = pd.DataFrame({
+        "TRANSACTIONID": item_transactions,
+        "PRODUCTID": product_ids,
+        "QUANTITY": quantity,
+        "TOTALPRICE": total_price,
+    })
+    return df_transactions, df_items
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate a seeded synthetic FLORAOS.BLUE_SAGE warehouse in DuckDB.")
+    parser.add_argument("--path", default=DEFAULT_PATH)
+    parser.add_argument("--transactions", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--end-date", help="Last day of history (YYYY-MM-DD); defaults to today.")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+
+    def progress(done, total):
+        print(f"{done:>12,} / {total:,} transactions  {time.perf_counter() - started:7.1f}s",
+              file=sys.stderr)
+
+    scale = generate(args.path, args.transactions, args.days, args.seed, args.end_date, progress)
+    print(f"Wrote {args.path}: {scale['transactions']:,} transactions, {scale['products']:,} "
+          f"products, {scale['customers']:,} customers")
+    print(f"Run the dashboards against it with FLORAOS_LOCAL_WAREHOUSE={args.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
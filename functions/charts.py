@@ -0,0 +1,125 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import pandas as pd
+
+from functions.instrumentation import recorder
+
+
+CHART_CACHE_BYTES = int(os.environ.get("FLORAOS_CHART_CACHE_MB", "64")) * 1024 * 1024
+
+
+def frame_fingerprint(df):
+    digest = hashlib.sha1()
+    digest.update(json.dumps([str(column) for column in df.columns]).encode())
+    digest.update(json.dumps([str(dtype) for dtype in df.dtypes]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class ChartCache:
+    # Rendered output (PNG bytes or plotly JSON) keyed by renderer, input frame and options,
+    # evicted least-recently-used once the stored output exceeds max_bytes.
+
+    def __init__(self, max_bytes=CHART_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, key, render, label=None):
+        started = time.perf_counter()
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                output = self._entries[key]
+            else:
+                output = None
+                self.misses += 1
+        if output is not None:
+            recorder.record("chart", label or key, started, nbytes=len(output), outcome="hit")
+            return output
+        output = render()
+        recorder.record("chart", label or key, started, nbytes=len(output), outcome="miss")
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = output
+                self._size += len(output)
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+        return output
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._size,
+                    "hits": self.hits, "misses": self.misses}
+
+
+chart_cache = ChartCache()
+
+
+@contextmanager
+def figure_scope(figsize=(10, 5)):
+    # A standalone Figure is never registered with pyplot's global state, and is cleared on
+    # exit, so nothing outlives the render even if drawing fails.
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize)
+    try:
+        yield fig
+    finally:
+        fig.clear()
+
+
+def render_png(draw, df, figsize=(10, 5), **options):
+    # draw(fig, df, **options) fills in the figure; the PNG is memoized
+    key = ("png", _renderer_name(draw), frame_fingerprint(df), list(figsize), _options_key(options))
+
+    def render():
+        with figure_scope(figsize) as fig:
+            draw(fig, df, **options)
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format="png", bbox_inches="tight")
+            return buffer.getvalue()
+
+    return chart_cache.get_or_render(_key(key), render, label=_renderer_name(draw))
+
+
+def render_plotly_json(build, df, **options):
+    # build(df, **options) returns a plotly figure; its JSON is memoized
+    key = ("plotly", _renderer_name(build), frame_fingerprint(df), _options_key(options))
+    return chart_cache.get_or_render(
+        _key(key), lambda: build(df, **options).to_json(), label=_renderer_name(build))
+
+
+def plotly_figure(figure_json):
+    import plotly.io as pio
+
+    return pio.from_json(figure_json)
+
+
+def _renderer_name(renderer):
+    return f"{renderer.__module__}.{renderer.__qualname__}"
+
+
+def _options_key(options):
+    return json.dumps(options, sort_keys=True, default=str)
+
+
+def _key(parts):
+    return hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+
+from functions.storage import DATA_DIR
+
+
+# A second tier under the in-memory query cache. Point FLORAOS_DISK_CACHE_DIR at a volume
+# shared by the replicas and a restart (or a new replica) starts warm.
+DISK_CACHE_ENABLED = os.environ.get("FLORAOS_DISK_CACHE", "1") != "0"
+DISK_CACHE_DIR = os.environ.get("FLORAOS_DISK_CACHE_DIR", os.path.join(DATA_DIR, "query_cache"))
+DISK_CACHE_BYTES = int(os.environ.get("FLORAOS_DISK_CACHE_MB", "1024")) * 1024 * 1024
+COMPRESSION = "zstd"
+METADATA_KEY = b"floraos.cache"
+ENTRY_SUFFIX = ".parquet"
+# Temporary files this old were left by a writer that crashed mid-write
+STALE_TMP_SECONDS = 60 * 60
+
+logger = logging.getLogger(__name__)
+
+
+class DiskEntry:
+    __slots__ = ("frame", "stored_at", "date_column", "fetched_nbytes")
+
+    def __init__(self, frame, stored_at, date_column, fetched_nbytes=None):
+        self.frame = frame
+        self.stored_at = stored_at
+        self.date_column = date_column
+        self.fetched_nbytes = fetched_nbytes
+
+
+class DiskCache:
+    # One compressed Parquet file per cache key. The key, the date column and the wall-clock
+    # time it was stored travel in the file's schema metadata, and every data page carries a
+    # CRC that is verified on read, so a file is self-describing and self-checking. Files are
+    # written next to their final name and renamed into place, so a reader on any replica
+    # sees the old entry or the new one, never a partial write. Hits refresh the file's
+    # mtime, and the least recently used files are removed once the directory outgrows the cap.
+
+    def __init__(self, root=DISK_CACHE_DIR, max_bytes=DISK_CACHE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.corrupt = 0
+
+    def get(self, template, window, max_age=None):
+        import pyarrow.parquet as pq
+
+        path = self._path(template, window)
+        try:
+            table = pq.read_table(path, page_checksum_verification=True)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            # Torn by a crash or damaged on the volume: dropped and fetched again
+            logger.warning("Discarding unreadable cache file %s: %s", path, e)
+            self.corrupt += 1
+            self.misses += 1
+            _remove_quietly(path)
+            return None
+
+        metadata = _read_metadata(table)
+        if metadata is None or metadata.get("key") != _key_text(template, window):
+            self.corrupt += 1
+            self.misses += 1
+            _remove_quietly(path)
+            return None
+        if max_age is not None and time.time() - metadata["stored_at"] > max_age:
+            self.misses += 1
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        frame = table.to_pandas()
+        return DiskEntry(frame, metadata["stored_at"], metadata.get("date_column"),
+                         metadata.get("fetched_nbytes"))
+
+    def put(self, template, window, frame, date_column=None, fetched_nbytes=None):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        path = self._path(template, window)
+        tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            metadata = {
+                "key": _key_text(template, window),
+                "date_column": date_column,
+                "stored_at": time.time(),
+                "fetched_nbytes": fetched_nbytes,
+            }
+            table = table.replace_schema_metadata({
+                **(table.schema.metadata or {}),
+                METADATA_KEY: json.dumps(metadata).encode(),
+            })
+            pq.write_table(table, tmp_path, compression=COMPRESSION, write_page_checksum=True)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            # The disk tier is best effort; the result is still cached in memory
+            logger.warning("Could not write cache file %s: %s", path, e)
+            _remove_quietly(tmp_path)
+            return False
+        self.writes += 1
+        self.evict()
+        return True
+
+    def evict(self):
+        entries = self._entries(stale_before=time.time() - STALE_TMP_SECONDS)
+        total = sum(size for _, _, size in entries)
+        for path, _, size in sorted(entries, key=lambda entry: entry[1]):
+            if total <= self.max_bytes:
+                break
+            # Another replica may have removed it already
+            _remove_quietly(path)
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        for path, _, _ in self._entries():
+            _remove_quietly(path)
+
+    def stats(self):
+        entries = self._entries()
+        return {
+            "entries": len(entries),
+            "bytes": sum(size for _, _, size in entries),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "corrupt": self.corrupt,
+        }
+
+    def _entries(self, stale_before=None):
+        entries = []
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return entries
+        for name in names:
+            path = os.path.join(self.root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if name.endswith(ENTRY_SUFFIX):
+                entries.append((path, stat.st_mtime, stat.st_size))
+            elif stale_before is not None and ".tmp-" in name and stat.st_mtime < stale_before:
+                _remove_quietly(path)
+        return entries
+
+    def _path(self, template, window):
+        digest = hashlib.sha256(_key_text(template, window).encode()).hexdigest()
+        return os.path.join(self.root, digest + ENTRY_SUFFIX)
+
+
+def _key_text(template, window):
+    return json.dumps([template, [d.isoformat() for d in window] if window else None])
+
+
+def _read_metadata(table):
+    raw = (table.schema.metadata or {}).get(METADATA_KEY)
+    try:
+        return json.loads(raw) if raw is not None else None
+    except ValueError:
+        return None
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+disk_cache = DiskCache() if DISK_CACHE_ENABLED else None
@@ -0,0 +1,84 @@
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+
+# Text columns whose distinct values make up at most this share of the rows become categoricals
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+BOOLEAN_STRINGS = {"true": True, "false": False}
+
+
+def compact_dtypes(df):
+    # Every change is lossless: integers are downcast, floats become float32 and decimals
+    # become floats only when every value survives the round trip, true/false columns become
+    # bool and repetitive text becomes categorical. Other object columns (dates, for one)
+    # are left as they are.
+    for column in df.columns:
+        series = df[column]
+        if isinstance(series.dtype, pd.CategoricalDtype) or pd.api.types.is_bool_dtype(series.dtype):
+            continue
+        if pd.api.types.is_integer_dtype(series.dtype):
+            df[column] = pd.to_numeric(series, downcast="integer")
+        elif pd.api.types.is_float_dtype(series.dtype):
+            df[column] = _compact_float(series)
+        elif series.dtype == object and len(series):
+            df[column] = _compact_object(series)
+    return df
+
+
+def deep_nbytes(df):
+    # Counts the characters of object columns too, which is what a cached frame really costs
+    return int(df.memory_usage(index=False, deep=True).sum()) if df is not None else 0
+
+
+def _compact_float(series):
+    if series.dtype != np.float64:
+        return series
+    values = series.to_numpy()
+    narrowed = values.astype(np.float32)
+    if np.array_equal(narrowed.astype(np.float64), values, equal_nan=True):
+        return pd.Series(narrowed, index=series.index, name=series.name)
+    return series
+
+
+def _compact_object(series):
+    kind = pd.api.types.infer_dtype(series, skipna=True)
+    if kind == "boolean":
+        return series.astype(bool) if series.notna().all() else series.astype("boolean")
+    if kind == "decimal":
+        # NUMBER columns with more significant digits than a double holds stay Decimal
+        values = series.dropna()
+        floats = values.astype(float)
+        if all(Decimal(str(number)) == value for number, value in zip(floats, values)):
+            return series.astype(float)
+        return series
+    if kind != "string":
+        return series
+    distinct = series.dropna().unique()
+    if len(distinct) <= 2 and all(value.lower() in BOOLEAN_STRINGS for value in distinct):
+        series = series.str.lower().map(BOOLEAN_STRINGS)
+        return series.astype(bool) if series.notna().all() else series.astype("boolean")
+    if len(distinct) <= CATEGORY_MAX_UNIQUE_RATIO * len(series):
+        return series.astype("category")
+    return series
+
+
+def concat_compact(frames):
+    # pd.concat falls back to object dtype when categoricals disagree on their categories,
+    # so categorical columns are unioned explicitly to stay compact.
+    frames = [df for df in frames if df is not None]
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0]
+
+    categorical_columns = [
+        column for column in frames[0].columns
+        if all(isinstance(df[column].dtype, pd.CategoricalDtype) for df in frames)
+    ]
+    df = pd.concat(frames, ignore_index=True)
+    for column in categorical_columns:
+        df[column] = union_categoricals([frame[column] for frame in frames], ignore_order=True)
+    return df
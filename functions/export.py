@@ -0,0 +1,265 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from functions.pipeline import Pipeline
+from functions.query_executor import (
+    QueryCancelled, cancel_queries, cancelled_by, execute_query, iter_query_batches)
+from functions.storage import DATA_DIR
+from functions.streaming import widen_integers
+
+
+EXPORT_DIR = os.path.join(DATA_DIR, "exports")
+# Exports queue on their own small pool, so a large one never holds more than this many
+# pooled cursors or delays the page queries of any session
+MAX_EXPORT_WORKERS = int(os.environ.get("FLORAOS_MAX_EXPORT_WORKERS", "2"))
+EXPORT_RETENTION_SECONDS = float(os.environ.get("FLORAOS_EXPORT_RETENTION_HOURS", "24")) * 60 * 60
+# Streamlit holds a download in memory whole, so large exports are split into files of at
+# most this many rows (or one warehouse batch), each downloaded on its own
+EXPORT_PART_ROWS = int(os.environ.get("FLORAOS_EXPORT_PART_ROWS", "1000000"))
+EXPORT_FORMATS = {"CSV": (".csv", "text/csv"), "Parquet": (".parquet", "application/vnd.apache.parquet")}
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=MAX_EXPORT_WORKERS, thread_name_prefix="floraos-export")
+
+
+def transaction_items(date_range, locations=None):
+    # One row per item sold, with the transaction, budtender and product it belongs to
+    return (
+        Pipeline.table("FLORAOS.BLUE_SAGE.flattened_itemsv_blue_sage_04_28_2024", alias="i")
+        .join("FLORAOS.BLUE_SAGE.dutchie_inventory", "i.productid = p.productid", alias="p")
+        .join("FLORAOS.BLUE_SAGE.dutchie_transactions", "i.transactionid = t.transactionid", alias="t")
+        .filter_date_range("t.transactiondate", date_range)
+        .filter_in("p.location", "location", locations)
+        .select(
+            TRANSACTIONID="t.transactionid",
+            TRANSACTIONDATE="t.transactiondate",
+            LOCATION="p.location",
+            BUDTENDER="t.completedbyuser",
+            PRODUCTID="i.productid",
+            PRODUCTNAME="p.productname",
+            ITEM_TOTAL="i.totalprice",
+            TRANSACTION_TOTAL="t.total",
+            ISVOID="t.isvoid",
+        )
+    )
+
+
+class ExportPart:
+    __slots__ = ("file_name", "path", "rows")
+
+    def __init__(self, file_name, path, rows):
+        self.file_name = file_name
+        self.path = path
+        self.rows = rows
+
+    def read_bytes(self):
+        return Path(self.path).read_bytes()
+
+
+class ExportJob:
+    # Streams the item rows for a date range and set of locations into CSV or Parquet
+    # files, one warehouse result batch at a time, so memory is bounded by the batch size
+    # rather than the export. The files only appear under their final names once complete.
+    # Cancelling also aborts the job's query if it is still running in the warehouse.
+
+    def __init__(self, date_range, locations=(), file_format="CSV", directory=EXPORT_DIR,
+                 part_rows=EXPORT_PART_ROWS):
+        extension, self.mime = EXPORT_FORMATS[file_format]
+        self.extension = extension
+        self.job_id = uuid.uuid4().hex[:12]
+        self.date_range = tuple(date_range)
+        self.locations = tuple(sorted(locations or ()))
+        self.file_format = file_format
+        self.file_name = f"transactions_{self.date_range[0]}_{self.date_range[1]}_{self.job_id}{extension}"
+        self.path = os.path.join(directory, self.file_name)
+        self.part_rows = part_rows
+        self.parts = []
+        self.status = "queued"
+        self.rows = 0
+        self.total_rows = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._cancelled = threading.Event()
+
+    @property
+    def active(self):
+        return self.status in ("queued", "running")
+
+    def progress(self):
+        if self.status == "done":
+            return 1.0
+        if not self.total_rows:
+            return 0.0
+        return min(self.rows / self.total_rows, 1.0)
+
+    def cancel(self):
+        cancel_queries(self._cancelled)
+
+    def run(self):
+        if self._cancelled.is_set():
+            self._finish("cancelled")
+            return
+        self.status = "running"
+        # [temporary path, rows] of each part written so far
+        parts = []
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with cancelled_by(self._cancelled):
+                items = transaction_items(self.date_range, self.locations)
+                count = items.aggregate(ROWS="COUNT(*)").to_query()
+                self.total_rows = int(execute_query(count.sql, count.params).iloc[0, 0])
+
+                query = items.order_by("TRANSACTIONDATE", "TRANSACTIONID").to_query()
+                status = self._write(iter_query_batches(query.sql, query.params), parts)
+            if status == "done":
+                self.parts = self._publish(parts)
+            else:
+                _remove_parts(parts)
+            self._finish(status)
+        except QueryCancelled:
+            _remove_parts(parts)
+            self._finish("cancelled")
+        except Exception as e:
+            logger.warning("Export %s failed: %s", self.job_id, e)
+            _remove_parts(parts)
+            self.error = str(e)
+            self._finish("failed")
+
+    def _write(self, batches, parts):
+        # Returns the final status: done, empty (nothing matched) or cancelled part way
+        writer = None
+        schema = None
+        try:
+            for batch in batches:
+                if self._cancelled.is_set():
+                    return "cancelled"
+                if writer is not None and parts[-1][1] + batch.num_rows > self.part_rows:
+                    writer.close()
+                    writer = None
+                if writer is None:
+                    # Snowflake sizes integer columns per batch, so the files use int64 throughout
+                    schema = schema or widen_integers(batch.schema)
+                    parts.append([f"{self.path}.part{len(parts) + 1}.tmp-{uuid.uuid4().hex}", 0])
+                    writer = _open_writer(parts[-1][0], self.file_format, schema)
+                writer.write_table(batch.cast(writer.schema))
+                parts[-1][1] += batch.num_rows
+                self.rows += batch.num_rows
+            return "done" if parts else "empty"
+        finally:
+            batches.close()
+            if writer is not None:
+                writer.close()
+
+    def _publish(self, parts):
+        if len(parts) == 1:
+            names = [self.file_name]
+        else:
+            stem = self.file_name[:-len(self.extension)]
+            names = [f"{stem}_part{number}of{len(parts)}{self.extension}"
+                     for number in range(1, len(parts) + 1)]
+        published = []
+        for name, (tmp_path, rows) in zip(names, parts):
+            path = os.path.join(os.path.dirname(self.path), name)
+            os.replace(tmp_path, path)
+            published.append(ExportPart(name, path, rows))
+        return published
+
+    def _finish(self, status):
+        self.status = status
+        self.finished_at = time.time()
+
+
+class _Writer:
+    __slots__ = ("schema", "_writer")
+
+    def __init__(self, schema, writer):
+        self.schema = schema
+        self._writer = writer
+
+    def write_table(self, table):
+        self._writer.write_table(table)
+
+    def close(self):
+        self._writer.close()
+
+
+def _open_writer(path, file_format, schema):
+    if file_format == "Parquet":
+        import pyarrow.parquet as pq
+
+        return _Writer(schema, pq.ParquetWriter(path, schema, compression="zstd"))
+    import pyarrow.csv as pa_csv
+
+    return _Writer(schema, pa_csv.CSVWriter(path, schema))
+
+
+class ExportManager:
+    # The export jobs each session has started. Jobs run on their own threads, so the
+    # session that started one keeps working (and can start others) while it runs, and a
+    # rerun of the page neither waits for nor cancels it. Finished files are removed once
+    # they are older than EXPORT_RETENTION_SECONDS.
+
+    def __init__(self, directory=EXPORT_DIR, retention_seconds=EXPORT_RETENTION_SECONDS):
+        self.directory = directory
+        self.retention_seconds = retention_seconds
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def start(self, session_id, date_range, locations=(), file_format="CSV"):
+        self.remove_expired()
+        job = ExportJob(date_range, locations, file_format, directory=self.directory)
+        with self._lock:
+            self._jobs.setdefault(session_id, []).append(job)
+        _executor.submit(job.run)
+        return job
+
+    def jobs(self, session_id):
+        with self._lock:
+            return list(self._jobs.get(session_id, ()))
+
+    def has_active(self, session_id):
+        return any(job.active for job in self.jobs(session_id))
+
+    def remove_expired(self, now=None):
+        cutoff = (now or time.time()) - self.retention_seconds
+        with self._lock:
+            for session_id, jobs in list(self._jobs.items()):
+                kept = [job for job in jobs if job.active or (job.finished_at or 0) >= cutoff]
+                if kept:
+                    self._jobs[session_id] = kept
+                else:
+                    del self._jobs[session_id]
+        # Files left by earlier processes as well as by expired jobs
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+def _remove_parts(parts):
+    for tmp_path, _ in parts:
+        _remove_quietly(tmp_path)
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+export_manager = ExportManager()
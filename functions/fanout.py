@@ -0,0 +1,54 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from functions.instrumentation import section
+
+
+MAX_FANOUT_WORKERS = int(os.environ.get("FLORAOS_MAX_FANOUT_WORKERS", "4"))
+PROGRESS_INTERVAL_SECONDS = 0.5
+
+# Shared by every session so the number of queries in flight stays bounded per process
+_executor = ThreadPoolExecutor(
+    max_workers=MAX_FANOUT_WORKERS, thread_name_prefix="floraos-fanout")
+
+
+class QueryFanout:
+    # Runs the independent queries of a page concurrently. Declare them with submit(),
+    # then iterate as_completed() to render each section as soon as its result is ready.
+
+    def __init__(self):
+        self._futures = {}
+        self._script_run_ctx = get_script_run_ctx()
+
+    def submit(self, name, fn, *args, **kwargs):
+        # The caller's context (e.g. the instrumented dashboard section) goes with the task
+        context = contextvars.copy_context()
+        future = _executor.submit(context.run, self._run, name, fn, args, kwargs)
+        self._futures[future] = name
+        return future
+
+    def as_completed(self, on_wait=None):
+        # `on_wait(pending_names, elapsed_seconds)` is called while nothing new has finished,
+        # so the page can show progress (and Streamlit can stop the run if it was superseded)
+        pending = dict(self._futures)
+        started = time.monotonic()
+        while pending:
+            done, _ = wait(pending, timeout=PROGRESS_INTERVAL_SECONDS if on_wait else None,
+                           return_when=FIRST_COMPLETED)
+            if not done:
+                on_wait(list(pending.values()), time.monotonic() - started)
+            for future in done:
+                yield pending.pop(future), future.result()
+
+    def _run(self, name, fn, args, kwargs):
+        # Worker threads need the session's script context for st.connection, st.cache_data
+        # and st.error to behave as they do on the script thread.
+        if self._script_run_ctx is not None:
+            add_script_run_ctx(threading.current_thread(), self._script_run_ctx)
+        with section(name):
+            return fn(*args, **kwargs)
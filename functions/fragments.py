@@ -0,0 +1,23 @@
+import functools
+
+import streamlit as st
+
+from functions.instrumentation import section
+
+
+def page_fragment(name, run_every=None, key=None):
+    # Turns a render_* function into a section Streamlit can rerun on its own. A widget
+    # inside it reruns only that function, with the arguments of its last full-page call,
+    # so those arguments are the section's declared data dependencies: pass it the frames
+    # it shows, fetched by the page, and its widgets never re-enter the data path.
+    # Fragments cannot draw in the sidebar, so a section's own widgets live in its body.
+    # With `run_every` (seconds) the section also reruns itself on that interval. A `key`
+    # lets a widget callback rerun the section by name with `st.rerun(key)`.
+    def decorate(render):
+        @st.fragment(run_every=run_every, key=key)
+        @functools.wraps(render)
+        def run(*args, **kwargs):
+            with section(name):
+                return render(*args, **kwargs)
+        return run
+    return decorate
@@ -1,163 +1,324 @@
+import contextvars
+import datetime
+from contextlib import contextmanager
 import streamlit as st
-import plotly.express as px
-import seaborn as sns
-import matplotlib.pyplot as plt
 import pandas as pd
-from snowflake.connector import connect, ProgrammingError, DatabaseError
+from functions.charts import plotly_figure, render_plotly_json, render_png
+from functions.instrumentation import current_session_id, recorder
+from functions.inventory_index import AGE_BUCKETS, InventoryAgingIndex
+from functions.lazy_imports import is_snowflake_database_error, lazy_module
+from functions.pipeline import Pipeline
+from functions.query_cache import query_cache
+from functions.query_executor import QueryCancelled, cursor_pool, execute_query, query_progress
+from functions.ranking import rank_metrics, render_leaderboard, top_n as rank_top_n
+from functions.streaming import StreamTruncated, fetch_frame
+from functions.rollup_store import rollup_store
+from functions.transaction_window import transaction_window
 
+# Chart backends are imported by the first renderer that needs them
+px = lazy_module("plotly.express")
+pdk = lazy_module("pydeck")
+sns = lazy_module("seaborn")
 
-def run_query(query):
-    try:
-        conn = st.connection("snowflake")
-        cur = conn.cursor()
-        cur.execute(query)
-        df = cur.fetch_pandas_all()
-        return df
-    except (ProgrammingError, DatabaseError) as e:
+# Quick queries finish without a progress line flashing up
+LOADING_STATUS_AFTER_SECONDS = 1.0
+
+# Set by raising_query_errors(): get_data re-raises failures instead of reporting them
+_raise_query_errors = contextvars.ContextVar("floraos_raise_query_errors", default=False)
+
+
+def report_query_error(e):
+    if is_snowflake_database_error(e):
         st.error(f"Database error: {e}")
-        return pd.DataFrame()
-    except Exception as e:
+    else:
         st.error(f"An error occurred: {e}")
-        return pd.DataFrame()
 
-def display_popular_products_by_sales(df):
+
+def run_query(query, params=None):
     try:
-        # Sort the dataframe by total sales
-        df_sorted_sales = df.sort_values(by="TOTAL_SALES", ascending=False).reset_index(drop=True)
-        
-        # Initialize markdown strings
-        popular_sales_markdown = "### 🏆 Top 10 Products by :blue[Total Sales] 🏆\n"
-        
-        # Construct markdown content for each metric
-        for i in range(min(10, len(df_sorted_sales))):  # Ensure we don't go out of index range
-            sales_product = df_sorted_sales.iloc[i]
-
-            # Sales-based report
-            popular_sales_markdown += (
-                f"{i + 1}. **{sales_product['PRODUCTNAME']}** - ${sales_product['TOTAL_SALES']:.2f} in sales\n"
-            )
+        return execute_query(query, params)
+    except QueryCancelled:
+        # Superseded by a newer run of the page, which shows the current result instead
+        raise
+    except Exception as e:
+        report_query_error(e)
+        return pd.DataFrame()
+
 
-        return popular_sales_markdown
+def fetch_streaming(query, params=None):
+    # For large results: builds a compact frame from Arrow batches and stops at the memory
+    # ceiling. A cut-short result is raised, so get_data shows it without caching it.
+    result = fetch_frame(query, params)
+    if result.truncated:
+        raise StreamTruncated(result.frame, result.rows)
+    return result.frame
+
+
+def display_popular_products_by_sales(df, top_n=10):
+    return display_popular_products(df, "TOTAL_SALES", top_n)
+
+
+def display_popular_products_by_transactions(df, top_n=10):
+    return display_popular_products(df, "TOTAL_TRANSACTIONS", top_n)
+
+
+def display_popular_products(df, by, top_n=10):
+    try:
+        return render_leaderboard(rank_top_n(df, by, top_n), by)
     except KeyError as e:
         st.error(f"Column not found: {e}")
         return ""
 
-def display_popular_products_by_transactions(df):
-    try:
-        # Sort the dataframe by total transactions
-        df_sorted_transactions = df.sort_values(by="TOTAL_TRANSACTIONS", ascending=False).reset_index(drop=True)
-        
-        popular_transactions_markdown = "### 🏆 Top 10 Products by :blue[Total Transactions] 🏆\n"
-
-        # Construct markdown content for each metric
-        for i in range(min(10, len(df_sorted_transactions))):  # Ensure we don't go out of index range
-            trans_product = df_sorted_transactions.iloc[i]
-
-            # Transactions-based report
-            popular_transactions_markdown += (
-                f"{i + 1}. **{trans_product['PRODUCTNAME']}** - {trans_product['TOTAL_TRANSACTIONS']} transactions\n"
-            )
 
-        return popular_transactions_markdown
+def display_leaderboards(df, metrics=("TOTAL_SALES", "TOTAL_TRANSACTIONS"), top_n=10):
+    try:
+        rankings = rank_metrics(df, metrics, top_n)
+        return [render_leaderboard(rankings[metric], metric) for metric in metrics]
     except KeyError as e:
         st.error(f"Column not found: {e}")
-        return ""
+        return ["" for _ in metrics]
 
-def display_popular_products(df, by, top_n=10):
+
+def default_date_range(today=None):
+    # Both pages open on last month; the pre-warmer computes the same range
+    today = today or datetime.date.today()
+    last_month_end = today.replace(day=1) - datetime.timedelta(days=1)
+    return last_month_end.replace(day=1), last_month_end
+
+
+def get_data(query, date_column=None, fetch=None):
+    # Results are cached per date window; passing the date column of a daily-grain
+    # result lets narrower windows be answered from an already cached wider one.
+    # Errors are reported here rather than inside the fetch, so every session waiting on
+    # a shared (coalesced) query shows the failure, not only the one that ran it.
+    try:
+        return query_cache.get_or_fetch(
+            query.sql, fetch or execute_query, date_column=date_column, params=query.params)
+    except QueryCancelled:
+        raise
+    except StreamTruncated as e:
+        # Raised to every session sharing the fetch, so each one warns about the partial rows
+        st.warning(str(e))
+        return e.frame.copy()
+    except Exception as e:
+        if _raise_query_errors.get():
+            raise
+        report_query_error(e)
+        return pd.DataFrame()
+
+
+@contextmanager
+def raising_query_errors():
+    # For callers outside a page (the pre-warmer), where st.error draws nothing and an empty
+    # frame would hide the failure
+    token = _raise_query_errors.set(True)
     try:
-        df_sorted = df.sort_values(by=by, ascending=False).head(top_n)
-        metric = "Total Sales" if by == "TOTAL_SALES" else "Total Transactions"
-        popular_markdown = f"### 🏆 Top {top_n} Products by :blue[{metric}] 🏆\n"
-        for i, row in df_sorted.iterrows():
-            popular_markdown += (
-                f"{i + 1}. **{row['PRODUCTNAME']}** - "
-                f"{'$' if by == 'TOTAL_SALES' else ''}{row[by]:.2f if by == 'TOTAL_SALES' else ''}{' transactions' if by == 'TOTAL_TRANSACTIONS' else ''}\n"
+        yield
+    finally:
+        _raise_query_errors.reset(token)
+
+
+def show_loading(placeholder, label, elapsed):
+    if elapsed >= LOADING_STATUS_AFTER_SECONDS:
+        placeholder.caption(f"⏳ Loading {label}… {elapsed:.0f}s")
+
+
+@contextmanager
+def loading_status(label):
+    # Shows how long the queries inside have been running. Redrawing it between polls is
+    # also where Streamlit stops a run the user has superseded, which cancels the query.
+    placeholder = st.empty()
+    with query_progress(lambda elapsed: show_loading(placeholder, label, elapsed)):
+        yield
+    placeholder.empty()
+
+
+def get_rollup_window(date_range):
+    # The local daily rollups answer a date range without the warehouse once they cover it
+    if date_range and rollup_store.covers(*date_range):
+        return tuple(date_range)
+    return None
+
+
+def get_location_product_sales(date_range, locations=None, top_n=10):
+    window = get_rollup_window(date_range)
+    if window is not None:
+        return rollup_store.location_product_sales(*window, locations=locations, top_n=top_n)
+
+    # One grouped scan ranks products within every location, instead of one join per store
+    query = (
+        Pipeline.table("FLORAOS.BLUE_SAGE.flattened_itemsv_blue_sage_04_28_2024", alias="i")
+        .join("FLORAOS.BLUE_SAGE.dutchie_inventory", "i.productid = p.productid", alias="p")
+        .join("FLORAOS.BLUE_SAGE.dutchie_transactions", "i.transactionid = t.transactionid", alias="t")
+        .filter_date_range("t.transactiondate", date_range)
+        .filter_in("p.location", "location", locations)
+        .aggregate(
+            by={"PRODUCTNAME": "p.productname", "LOCATION": "p.location"},
+            TOTAL_SALES="SUM(i.totalprice)",
+            TOTAL_TRANSACTIONS="COUNT(DISTINCT i.transactionid)",
+        )
+        .top_n(top_n, by="SUM(i.totalprice)", partition_by="p.location",
+               tie_break="p.productname")
+        .order_by("LOCATION", "TOTAL_SALES DESC", "PRODUCTNAME")
+    )
+    return get_data(query.to_query())
+
+
+def get_store_locations():
+    # The dutchie_inventory location names, which the product and export queries filter on
+    query = (
+        Pipeline.table("FLORAOS.BLUE_SAGE.dutchie_inventory")
+        .aggregate(by={"LOCATION": "location"}, PRODUCTS="COUNT(*)")
+        .order_by("LOCATION")
+    )
+    df = get_data(query.to_query())
+    if df is None or df.empty:
+        return []
+    return [str(location) for location in df["LOCATION"].dropna()]
+
+
+def split_by_location(df):
+    if df is None or df.empty:
+        return {}
+    return {
+        location: df_location.reset_index(drop=True)
+        for location, df_location in df.groupby("LOCATION", sort=True, observed=True)
+    }
+
+
+def get_budtender_transaction_data(date_range):
+    window = get_rollup_window(date_range)
+    if window is not None:
+        df_daily = rollup_store.daily_budtender_sales(*window)
+    else:
+        # Daily grain, so a cached wider range can answer narrower ones; the top 10 is
+        # picked after summing the days
+        query = (
+            Pipeline.table("FLORAOS.BLUE_SAGE.DUTCHIE_TRANSACTIONS")
+            .filter_date_range("transactiondate", date_range)
+            .filter("NOT ISVOID")
+            .aggregate(
+                by={"TRANSACTION_DATE": "TO_DATE(transactiondate)", "BUDTENDER": "completedbyuser"},
+                TOTAL_SALES="SUM(total)",
+                PRICED_TRANSACTIONS="COUNT(total)",
+                TOTAL_TRANSACTIONS="COUNT(transactionid)",
             )
-        return popular_markdown
-    except KeyError as e:
-        st.error(f"Column not found: {e}")
-        return ""
+        )
+        df_daily = get_data(query.to_query(), date_column="TRANSACTION_DATE")
+    if df_daily is None or df_daily.empty:
+        return df_daily
+    # Cached text columns are categoricals; only budtenders present in the window count
+    df = df_daily.groupby("BUDTENDER", as_index=False, observed=True)[
+        ["TOTAL_SALES", "PRICED_TRANSACTIONS", "TOTAL_TRANSACTIONS"]].sum()
+    df["AVERAGE_SALE_AMOUNT"] = df["TOTAL_SALES"] / df["PRICED_TRANSACTIONS"]
+    # Plain labels again, so charts draw the ten budtenders and not every cached category
+    # Ties go to the budtender's name, so the rollups and the warehouse pick the same ten
+    return (
+        df[["BUDTENDER", "AVERAGE_SALE_AMOUNT", "TOTAL_TRANSACTIONS"]]
+        .astype({"BUDTENDER": object})
+        .sort_values(by=["TOTAL_TRANSACTIONS", "BUDTENDER"], ascending=[False, True])
+        .head(10)
+        .reset_index(drop=True)
+    )
 
 
-def get_data(query):
-    return run_query(query)
-
-
-def get_Lebanon_data(query_date_filter):
-    query = f"""
-        SELECT
-            p.productname,
-            p.location,
-            SUM(i.totalprice) AS total_sales,
-            COUNT(DISTINCT i.transactionid) AS total_transactions
-        FROM
-            FLORAOS.BLUE_SAGE.flattened_itemsv_blue_sage_04_28_2024 AS i
-            JOIN FLORAOS.BLUE_SAGE.dutchie_inventory AS p ON i.productid = p.productid
-            JOIN FLORAOS.BLUE_SAGE.dutchie_transactions AS t ON i.transactionid = t.transactionid
-        {query_date_filter}
-        AND p.location = 'lebanon'
-        GROUP BY
-            p.productname,
-            p.location
-        ORDER BY
-            total_sales DESC
-        LIMIT 10;
-    """
-    return get_data(query)
+DAYS_OF_WEEK = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
 
 
-def get_budtender_transaction_data(query_date_filter):
-    query = f"""
-        SELECT
-            completedbyuser AS budtender,
-            AVG(total) AS average_sale_amount,
-            COUNT(transactionid) AS total_transactions
-        FROM
-            FLORAOS.BLUE_SAGE.DUTCHIE_TRANSACTIONS
-        {query_date_filter}
-        AND NOT ISVOID
-        GROUP BY
-            completedbyuser
-        ORDER BY
-            total_transactions DESC
-        LIMIT 10;
-    """
-    return get_data(query)
+def get_weekly_profitability(date_range):
+    window = get_rollup_window(date_range)
+    if window is not None:
+        df_daily = rollup_store.daily_revenue(*window)
+    else:
+        query = (
+            Pipeline.table("FLORAOS.BLUE_SAGE.DUTCHIE_TRANSACTIONS")
+            .filter_date_range("TRANSACTIONDATE", date_range)
+            .aggregate(
+                by={"TRANSACTION_DATE": "TO_DATE(TRANSACTIONDATE)"},
+                TOTAL_REVENUE="SUM(TOTAL)",
+                PRICED_TRANSACTIONS="COUNT(TOTAL)",
+            )
+        )
+        df_daily = get_data(query.to_query(), date_column="TRANSACTION_DATE")
+    if df_daily is None or df_daily.empty:
+        return df_daily
+    df_daily = df_daily.assign(
+        DAY_OF_WEEK=pd.to_datetime(df_daily["TRANSACTION_DATE"]).dt.day_name())
+    df = df_daily.groupby("DAY_OF_WEEK")[["TOTAL_REVENUE", "PRICED_TRANSACTIONS"]].sum()
+    df["AVERAGE_REVENUE"] = df["TOTAL_REVENUE"] / df["PRICED_TRANSACTIONS"]
+    df = df.reindex([day for day in DAYS_OF_WEEK if day in df.index])
+    return df[["TOTAL_REVENUE", "AVERAGE_REVENUE"]].rename_axis("DAY_OF_WEEK").reset_index()
 
 
-def get_weekly_profitability(query_date_filter):
-    query = f"""
-        SELECT 
-            DAYNAME(TRANSACTIONDATE) AS DAY_OF_WEEK,
-            SUM(TOTAL) AS TOTAL_REVENUE,
-            AVG(TOTAL) AS AVERAGE_REVENUE
-        FROM FLORAOS.BLUE_SAGE.DUTCHIE_TRANSACTIONS
-        {query_date_filter}
-        GROUP BY DAY_OF_WEEK
-        ORDER BY 
-            CASE 
-                WHEN DAY_OF_WEEK = 'Monday' THEN 1
-                WHEN DAY_OF_WEEK = 'Tuesday' THEN 2
-                WHEN DAY_OF_WEEK = 'Wednesday' THEN 3
-                WHEN DAY_OF_WEEK = 'Thursday' THEN 4
-                WHEN DAY_OF_WEEK = 'Friday' THEN 5
-                WHEN DAY_OF_WEEK = 'Saturday' THEN 6
-                WHEN DAY_OF_WEEK = 'Sunday' THEN 7
-                ELSE 8
-            END;
-    """
-    return get_data(query)
+CUSTOMER_CELL_PRECISION = 2
 
 
-def get_customer_sales():
-    query = """
-        SELECT
-            LATITUDE, 
-            LONGITUDE
-        FROM FLORAOS.BLUE_SAGE.MATCHED_CUSTOMERS_ZIPCODES          
-        WHERE LATITUDE IS NOT NULL AND LONGITUDE IS NOT NULL;
-    """
-    return get_data(query)
+def get_customer_sales(date_range, precision=CUSTOMER_CELL_PRECISION):
+    # Customers are binned into lat/long grid cells in the warehouse (2 decimals is roughly
+    # 1 km), so the payload grows with the number of cells rather than customers. The date
+    # range selects customers by when they signed up, and revenue is what they spent in it
+    # (the join reuses the start_date / end_date the date filter binds).
+    query = (
+        Pipeline.table("FLORAOS.BLUE_SAGE.MATCHED_CUSTOMERS_ZIPCODES", alias="c")
+        .join("FLORAOS.BLUE_SAGE.DUTCHIE_TRANSACTIONS",
+              "t.CUSTOMERID = c.CUSTOMERID AND NOT t.ISVOID"
+              " AND TO_DATE(t.TRANSACTIONDATE) BETWEEN %(start_date)s AND %(end_date)s",
+              alias="t", how="LEFT JOIN")
+        .filter_date_range("c.CREATIONDATE", date_range)
+        .filter("c.LATITUDE IS NOT NULL AND c.LONGITUDE IS NOT NULL")
+        .aggregate(
+            by={"LATITUDE": "ROUND(c.LATITUDE, %(precision)s)",
+                "LONGITUDE": "ROUND(c.LONGITUDE, %(precision)s)"},
+            CUSTOMERS="COUNT(DISTINCT c.CUSTOMERID)",
+            REVENUE="COALESCE(SUM(t.TOTAL), 0)",
+        )
+        .bind(precision=int(precision))
+    )
+    return get_data(query.to_query())
+
+
+def bin_customer_cells(df, precision):
+    # Coarsens cells client-side without another query; cells are merged by rounding their
+    # centres, and the new centre is the customer-weighted mean of the merged cells.
+    df = df.astype({"LATITUDE": float, "LONGITUDE": float, "CUSTOMERS": float, "REVENUE": float})
+    cells = df.assign(
+        LAT_CELL=df["LATITUDE"].round(precision),
+        LON_CELL=df["LONGITUDE"].round(precision),
+        LAT_WEIGHTED=df["LATITUDE"] * df["CUSTOMERS"],
+        LON_WEIGHTED=df["LONGITUDE"] * df["CUSTOMERS"],
+    ).groupby(["LAT_CELL", "LON_CELL"], as_index=False)[
+        ["CUSTOMERS", "REVENUE", "LAT_WEIGHTED", "LON_WEIGHTED"]].sum()
+    weights = cells["CUSTOMERS"].where(cells["CUSTOMERS"] > 0)
+    return pd.DataFrame({
+        "LATITUDE": (cells["LAT_WEIGHTED"] / weights).fillna(cells["LAT_CELL"]),
+        "LONGITUDE": (cells["LON_WEIGHTED"] / weights).fillna(cells["LON_CELL"]),
+        "CUSTOMERS": cells["CUSTOMERS"],
+        "REVENUE": cells["REVENUE"],
+    })
+
+
+def build_weekly_profitability_bar(df_weekly_profitability):
+    return px.bar(df_weekly_profitability, x='DAY_OF_WEEK', y='TOTAL_REVENUE',
+                  title='This chart shows which days of the week are the most profitable')
+
+
+def build_customer_map(df_cells, weight="Customers"):
+    # A density heatmap of the customer cells, weighted by customers or revenue
+    return pdk.Deck(
+        map_style=None,
+        initial_view_state=pdk.ViewState(
+            latitude=df_cells["LATITUDE"].mean(),
+            longitude=df_cells["LONGITUDE"].mean(),
+            zoom=8,
+        ),
+        layers=[pdk.Layer(
+            "HeatmapLayer",
+            data=df_cells,
+            get_position=["LONGITUDE", "LATITUDE"],
+            get_weight=weight.upper(),
+            radius_pixels=40,
+        )],
+    )
 
 
 def render_profitability_visualizations(df_weekly_profitability):
@@ -178,40 +339,168 @@ def render_profitability_visualizations(df_weekly_profitability):
         return None
 
 
-def get_transaction_data():
-    query = """
-        SELECT
-            CAST(TRANSACTIONDATE AS DATE) AS Transaction_Date,
-            TRANSACTIONID, TOTAL
-        FROM FLORAOS.BLUE_SAGE.DUTCHIE_TRANSACTIONS
-        WHERE TRANSACTIONDATE >= CURRENT_DATE - INTERVAL '1 year';
-    """
-    return get_data(query)
+def get_transaction_data(incremental=True):
+    if incremental:
+        # Only the rows since the last pull are fetched; the rest of the year is kept locally
+        try:
+            return transaction_window.get()
+        except Exception as e:
+            st.error(f"Could not refresh transaction data: {e}")
+            df = transaction_window.load()
+            return df if df is not None else pd.DataFrame()
+
+    # The cut-off is bound as a date rather than computed in SQL, so the text stays the same
+    query = (
+        Pipeline.table("FLORAOS.BLUE_SAGE.DUTCHIE_TRANSACTIONS")
+        .select(TRANSACTION_DATE="CAST(TRANSACTIONDATE AS DATE)")
+        .select("TRANSACTIONID", "TOTAL")
+        .filter("TRANSACTIONDATE >= %(since)s", since=transaction_window.window_start())
+    )
+    return get_data(query.to_query(), fetch=fetch_streaming)
+
+
+def draw_heatmap(fig, dataframe):
+    ax = fig.subplots()
+    sns.heatmap(dataframe.set_index(['LOCATION', 'PRODUCT'])[
+                ['0-30', '31-60', '61-90', '91-120', '121+']], annot=True, cmap='coolwarm', fmt=".1f", ax=ax)
+    ax.set_title('Inventory Age Distribution')
+    ax.set_xlabel('Age Categories')
+    ax.set_ylabel('Product and Location')
 
 
 def create_heatmap(dataframe):
+    # Returns PNG bytes for st.image, rendered once per distinct input
     try:
-        plt.figure(figsize=(10, 3))
-        sns.heatmap(dataframe.set_index(['LOCATION', 'PRODUCT'])[
-                    ['0-30', '31-60', '61-90', '91-120', '121+']], annot=True, cmap='coolwarm', fmt=".1f")
-        plt.title('Inventory Age Distribution')
-        plt.xlabel('Age Categories')
-        plt.ylabel('Product and Location')
-        return plt
+        return render_png(draw_heatmap, dataframe, figsize=(10, 3))
     except KeyError as e:
         st.error(f"Column not found for heatmap: {e}")
         return None
 
 
-def display_inventory_aging(df):
+BUDTENDER_CHARTS = {
+    "AVERAGE_SALE_AMOUNT": {
+        "title": "Average Sale Amount per Budtender",
+        "label": "Average Sale Amount ($)",
+        "color": "c",
+        "color_scale": "Viridis",
+        "currency": True,
+    },
+    "TOTAL_TRANSACTIONS": {
+        "title": "Total Transactions per Budtender",
+        "label": "Total Transactions",
+        "color": "m",
+        "color_scale": "Magma",
+        "currency": False,
+    },
+}
+
+
+def draw_budtender_bar(fig, df, metric):
+    chart = BUDTENDER_CHARTS[metric]
+    ax = fig.subplots()
+    sns.barplot(data=df, x=metric, y="BUDTENDER", color=chart["color"], ax=ax)
+    if chart["currency"]:
+        ax.xaxis.set_major_formatter("${x:,.2f}")
+    ax.set_xlabel(chart["label"])
+    ax.set_ylabel("Budtender")
+    ax.set_title(chart["title"])
+
+
+def build_budtender_bar(df, metric):
+    chart = BUDTENDER_CHARTS[metric]
+    fig = px.bar(
+        df,
+        x=metric,
+        y="BUDTENDER",
+        title=chart["title"],
+        labels={metric: chart["label"], "BUDTENDER": "Budtender"},
+        orientation="h",
+        color=metric,
+        color_continuous_scale=chart["color_scale"],
+    )
+    if chart["currency"]:
+        fig.update_xaxes(tickprefix="$", tickformat=",.2f")
+    return fig
+
+
+def render_budtender_charts(df_budtender, metric):
+    # Sorted on the numeric metric; both renderings are memoized on the data and options
+    df_sorted = df_budtender.sort_values(by=metric, ascending=False).reset_index(drop=True)
+    png = render_png(draw_budtender_bar, df_sorted, metric=metric)
+    figure_json = render_plotly_json(build_budtender_bar, df_sorted, metric=metric)
+    return png, plotly_figure(figure_json)
+
+
+@st.cache_data
+def get_inventory_aging_data():
+    # Only cannabis inventory is ever shown, so non-cannabis rows never leave the warehouse
+    query = (
+        Pipeline.table("floraos.blue_sage.report_inventory_aging_may_7_24")
+        .select(LOCATION="SPLIT_PART(LOCATION, ' - ', 2)")
+        .select("PRODUCT", "CATEGORY", "MASTERCATEGORY", *[f'"{bucket}"' for bucket in AGE_BUCKETS])
+        .filter("CANNABISINVENTORY")
+    ).to_query()
+    return get_data(query)
+
+
+@st.cache_resource
+def get_inventory_aging_index():
+    # Built once per data load and shared read-only by every session
+    df = get_inventory_aging_data()
+    if df is None or df.empty:
+        return None
+    return InventoryAgingIndex(df)
+
+
+def display_inventory_aging(df, bucket="121+"):
     try:
-        df_filtered = df[df['121+'] > 0].reset_index(drop=True)
-        inventory_markdown = "### 🌿 Products with Inventory Aged 121+ Days 🌿\n"
-        for i, product in df_filtered.iterrows():
-            inventory_markdown += (
-                f"{i + 1}. **{product['LOCATION']} - :blue[{product['PRODUCT']}]** :orange[{product['121+']}] units aged 121+ days\n"
-            )
-        return inventory_markdown
+        df_filtered = df[df[bucket] > 0]
+        inventory_markdown = f"### 🌿 Products with Inventory Aged {bucket} Days 🌿\n"
+        if df_filtered.empty:
+            return inventory_markdown
+        lines = (
+            pd.Series(range(1, len(df_filtered) + 1), index=df_filtered.index).astype(str)
+            + ". **" + df_filtered["LOCATION"].astype(str)
+            + " - :blue[" + df_filtered["PRODUCT"].astype(str) + "]** :orange["
+            + df_filtered[bucket].astype(str) + f"] units aged {bucket} days"
+        )
+        return inventory_markdown + "\n".join(lines) + "\n"
     except KeyError as e:
         st.error(f"Column not found: {e}")
         return ""
+
+
+DIAGNOSTIC_COLUMNS = ["section", "kind", "label", "outcome", "duration_ms", "rows", "bytes", "query_id"]
+
+
+def render_diagnostics_panel(since):
+    # Opt-in: everything this session recorded since `since` (the start of the script run)
+    if not st.sidebar.toggle("Show diagnostics", key="show_diagnostics"):
+        return
+    events = recorder.session_events(current_session_id(), since)
+    with st.sidebar.expander("Diagnostics", expanded=True):
+        if not events:
+            st.caption("Nothing was recorded during this run.")
+            return
+        df = pd.DataFrame(events)
+        queries = df[df["kind"] == "query"]
+        lookups = df[df["kind"] == "cache"]
+        hits = lookups["outcome"].isin(["hit", "covered_hit", "disk_hit"]).sum()
+        pool = cursor_pool.stats()
+        col1, col2 = st.columns(2)
+        col1.metric("Queries", len(queries))
+        col2.metric("Query time", f"{queries['duration_ms'].sum():,.0f} ms")
+        col1.metric("Cache hits", f"{hits}/{len(lookups)}")
+        col2.metric("Cursors in use", f"{pool['in_use']}/{pool['size']}")
+
+        st.markdown("**Slowest sections**")
+        sections = df[df["kind"] == "section"].sort_values("duration_ms", ascending=False)
+        st.dataframe(sections[["label", "outcome", "duration_ms"]], hide_index=True)
+        st.markdown("**Calls**")
+        st.dataframe(df[DIAGNOSTIC_COLUMNS], hide_index=True)
+
+        # Shared by every session of this process
+        report = query_cache.memory_report()
+        cached_bytes = sum(row["bytes"] for row in report)
+        st.markdown(f"**Cached results** ({cached_bytes / 1024 / 1024:,.1f} MB in this process)")
+        st.dataframe(pd.DataFrame(report), hide_index=True)
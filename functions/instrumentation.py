@@ -0,0 +1,201 @@
+import contextvars
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from functions.storage import write_text_atomic
+
+
+# Prometheus text exposition is rewritten here at most every METRICS_FLUSH_SECONDS
+METRICS_FILE = os.environ.get("FLORAOS_METRICS_FILE")
+METRICS_FLUSH_SECONDS = float(os.environ.get("FLORAOS_METRICS_FLUSH_SECONDS", "10"))
+# One JSON object per event is appended here
+METRICS_LOG = os.environ.get("FLORAOS_METRICS_LOG")
+EVENT_BUFFER_SIZE = 2000
+DURATION_BUCKETS = (0.005, 0.025, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 120.0)
+LABEL_LENGTH = 120
+
+logger = logging.getLogger("floraos.metrics")
+if METRICS_LOG:
+    _handler = logging.FileHandler(METRICS_LOG)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_current_section = contextvars.ContextVar("floraos_section", default=None)
+
+
+class Recorder:
+    # Keeps the most recent events for the diagnostics panel and running totals per
+    # (kind, section, outcome) for the metrics file. Recording is an append and a few
+    # additions under a lock, so it can sit on every query, cache lookup and chart.
+
+    def __init__(self, buffer_size=EVENT_BUFFER_SIZE, metrics_file=METRICS_FILE,
+                 flush_seconds=METRICS_FLUSH_SECONDS):
+        self.events = deque(maxlen=buffer_size)
+        self.metrics_file = metrics_file
+        self.flush_seconds = flush_seconds
+        self._series = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = 0.0
+
+    def record(self, kind, label, started, rows=None, nbytes=None, outcome="ok", query_id=None,
+               error=None):
+        duration = time.perf_counter() - started
+        event = {
+            "at": time.time(),
+            "session": current_session_id(),
+            "section": _current_section.get(),
+            "kind": kind,
+            "label": query_label(label),
+            "outcome": outcome,
+            "duration_ms": round(duration * 1000, 3),
+            "rows": rows,
+            "bytes": nbytes,
+            "query_id": query_id,
+            "error": error,
+        }
+        with self._lock:
+            self.events.append(event)
+            series = self._series.get((kind, event["section"], outcome))
+            if series is None:
+                series = self._series[(kind, event["section"], outcome)] = _Series()
+            series.add(duration, rows, nbytes)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(event))
+        if self.metrics_file and time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+        return event
+
+    def session_events(self, session_id, since=None):
+        with self._lock:
+            return [
+                event for event in self.events
+                if event["session"] == session_id and (since is None or event["at"] >= since)
+            ]
+
+    def prometheus_text(self):
+        with self._lock:
+            series = {key: value.snapshot() for key, value in self._series.items()}
+        lines = [
+            "# HELP floraos_events_total Instrumented calls by kind, dashboard section and outcome.",
+            "# TYPE floraos_events_total counter",
+        ]
+        for key, value in sorted(series.items(), key=_series_sort_key):
+            lines.append(f"floraos_events_total{_labels(*key)} {value['count']}")
+        for metric, field, help_text in (
+            ("floraos_rows_total", "rows", "Rows returned."),
+            ("floraos_bytes_total", "bytes", "Approximate bytes returned or rendered."),
+        ):
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+            for key, value in sorted(series.items(), key=_series_sort_key):
+                lines.append(f"{metric}{_labels(*key)} {value[field]}")
+        lines += [
+            "# HELP floraos_duration_seconds Time spent per instrumented call.",
+            "# TYPE floraos_duration_seconds histogram",
+        ]
+        for key, value in sorted(series.items(), key=_series_sort_key):
+            for bound, count in zip(DURATION_BUCKETS, value["buckets"]):
+                lines.append(f"floraos_duration_seconds_bucket{_labels(*key, le=bound)} {count}")
+            lines.append(f"floraos_duration_seconds_bucket{_labels(*key, le='+Inf')} {value['count']}")
+            lines.append(f"floraos_duration_seconds_sum{_labels(*key)} {value['seconds']:.6f}")
+            lines.append(f"floraos_duration_seconds_count{_labels(*key)} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self, path=None):
+        path = path or self.metrics_file
+        if not path or not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_flush = time.monotonic()
+            write_text_atomic(self.prometheus_text(), path)
+        except OSError as e:
+            logger.warning("Could not write metrics to %s: %s", path, e)
+        finally:
+            self._flush_lock.release()
+
+    def clear(self):
+        with self._lock:
+            self.events.clear()
+            self._series.clear()
+
+
+class _Series:
+    __slots__ = ("count", "seconds", "rows", "bytes", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+
+    def add(self, duration, rows, nbytes):
+        self.count += 1
+        self.seconds += duration
+        self.rows += rows or 0
+        self.bytes += nbytes or 0
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if duration <= bound:
+                self.buckets[i] += 1
+
+    def snapshot(self):
+        return {"count": self.count, "seconds": self.seconds, "rows": self.rows,
+                "bytes": self.bytes, "buckets": list(self.buckets)}
+
+
+recorder = Recorder()
+
+
+@contextmanager
+def section(name):
+    # Tags everything recorded inside with the dashboard section, and times the section
+    token = _current_section.set(name)
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        recorder.record("section", name, started, outcome=outcome)
+        _current_section.reset(token)
+
+
+def frame_nbytes(df):
+    # Shallow memory usage: cheap, and close enough for object columns to rank sections
+    return int(df.memory_usage(index=False, deep=False).sum()) if df is not None else 0
+
+
+def query_label(text):
+    return re.sub(r"\s+", " ", str(text)).strip()[:LABEL_LENGTH]
+
+
+def current_session_id():
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx is not None else None
+
+
+def _labels(kind, section_name, outcome, **extra):
+    labels = {"kind": kind, "section": section_name or "", "outcome": outcome, **extra}
+    return "{" + ",".join(
+        f'{name}="{_escape_label(value)}"' for name, value in labels.items()) + "}"
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _series_sort_key(item):
+    kind, section_name, outcome = item[0]
+    return kind, section_name or "", outcome
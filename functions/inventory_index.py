@@ -0,0 +1,60 @@
+import numpy as np
+
+
+AGE_BUCKETS = ["0-30", "31-60", "61-90", "91-120", "121+"]
+EXCLUDED_SCAN_CHUNK = 256
+
+
+class InventoryAgingIndex:
+    # Built once per data load. For every age bucket the rows are sorted once, then split
+    # into location, category and location x category partitions that keep that order, so
+    # a top-K lookup is a slice of the first K positions. A location or category of None
+    # means "all".
+
+    def __init__(self, df, cannabis_only=True):
+        if cannabis_only and "CANNABISINVENTORY" in df.columns:
+            df = df[df["CANNABISINVENTORY"].fillna(False).astype(bool)]
+        self.df = df.reset_index(drop=True)
+        self.locations = sorted(self.df["LOCATION"].dropna().unique())
+        self.categories = sorted(self.df["CATEGORY"].dropna().unique())
+        self._categories = self.df["CATEGORY"].to_numpy()
+        self._partitions = {}
+
+        for bucket in AGE_BUCKETS:
+            values = self.df[bucket].to_numpy(dtype=float, na_value=-np.inf)
+            order = np.argsort(-values, kind="stable")
+            self._partitions[(None, None, bucket)] = order
+            ordered = self.df.iloc[order]
+            for key_columns in (["LOCATION"], ["CATEGORY"], ["LOCATION", "CATEGORY"]):
+                groups = ordered.groupby(key_columns, sort=False, observed=True).indices
+                for key, group_positions in groups.items():
+                    location, category = _partition_key(key_columns, key)
+                    self._partitions[(location, category, bucket)] = order[group_positions]
+
+    def top(self, location=None, category=None, bucket="121+", k=10, exclude_categories=()):
+        positions = self._partitions.get((location, category, bucket))
+        if positions is None:
+            return self.df.iloc[:0]
+        if not exclude_categories:
+            return self.df.iloc[positions[:k]].reset_index(drop=True)
+
+        # Exclusions are applied while walking the pre-sorted partition, stopping once K rows
+        # have been kept, rather than filtering the whole partition first.
+        kept = []
+        for start in range(0, len(positions), EXCLUDED_SCAN_CHUNK):
+            chunk = positions[start:start + EXCLUDED_SCAN_CHUNK]
+            chunk = chunk[~np.isin(self._categories[chunk], list(exclude_categories))]
+            kept.append(chunk)
+            if sum(len(part) for part in kept) >= k:
+                break
+        selected = np.concatenate(kept)[:k] if kept else positions[:0]
+        return self.df.iloc[selected].reset_index(drop=True)
+
+    def __len__(self):
+        return len(self.df)
+
+
+def _partition_key(key_columns, key):
+    key = key if isinstance(key, tuple) else (key,)
+    values = dict(zip(key_columns, key))
+    return values.get("LOCATION"), values.get("CATEGORY")
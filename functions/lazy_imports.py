@@ -0,0 +1,30 @@
+import importlib
+import sys
+
+
+class LazyModule:
+    # Stands in for a heavy module and imports it on first attribute access, so chart
+    # backends are only loaded by the renderers that actually use them.
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attribute):
+        module = importlib.import_module(self._name)
+        return getattr(module, attribute)
+
+    def __repr__(self):
+        loaded = "loaded" if self._name in sys.modules else "not loaded"
+        return f"<lazy module {self._name!r} ({loaded})>"
+
+
+def lazy_module(name):
+    return sys.modules.get(name) or LazyModule(name)
+
+
+def is_snowflake_database_error(error):
+    # The connector is only imported once a query runs, so an error raised before that
+    # cannot be one of its exceptions.
+    connector = sys.modules.get("snowflake.connector")
+    return connector is not None and isinstance(
+        error, (connector.ProgrammingError, connector.DatabaseError))
@@ -0,0 +1,230 @@
+import os
+import re
+import threading
+import time
+import uuid
+
+
+# An embedded DuckDB database that answers the dashboard's Snowflake SQL offline. The
+# `FLORAOS` catalog comes from the file name, so `FLORAOS.BLUE_SAGE.<table>` resolves as-is.
+LOCAL_WAREHOUSE_PATH = os.environ.get("FLORAOS_LOCAL_WAREHOUSE")
+LOCAL_WAREHOUSE_LATENCY_SECONDS = float(os.environ.get("FLORAOS_LOCAL_WAREHOUSE_LATENCY", "0"))
+ARROW_BATCH_ROWS = 128 * 1024
+
+# Snowflake functions the dashboard queries use that DuckDB spells differently
+COMPAT_MACROS = [
+    "CREATE OR REPLACE TEMP MACRO to_date(value) AS CAST(value AS DATE)",
+]
+
+PYFORMAT_PARAMETER = re.compile(r"%\((\w+)\)s")
+
+# The subset of the connector's QueryStatus values an asynchronous local query goes through
+RUNNING = "RUNNING"
+SUCCESS = "SUCCESS"
+FAILED_WITH_ERROR = "FAILED_WITH_ERROR"
+ABORTED = "ABORTED"
+
+
+class LocalQueryError(Exception):
+    pass
+
+
+class LocalWarehouseConnection:
+    # Mirrors the parts of the connector's connection the executor uses: `cursor()` and
+    # `close()`. Opened read-only by default so several processes can share one file.
+
+    def __init__(self, path, read_only=True, latency_seconds=LOCAL_WAREHOUSE_LATENCY_SECONDS):
+        import duckdb
+
+        self.path = path
+        self.latency_seconds = latency_seconds
+        self._database = duckdb.connect(path, read_only=read_only)
+        self._lock = threading.Lock()
+        self._queries = {}
+
+    def cursor(self):
+        return LocalWarehouseCursor(self, self._duckdb_cursor(), self.latency_seconds)
+
+    def get_query_status(self, query_id):
+        return self._query(query_id).status
+
+    def get_query_status_throw_if_error(self, query_id):
+        query = self._query(query_id)
+        if query.status in (FAILED_WITH_ERROR, ABORTED):
+            with self._lock:
+                self._queries.pop(query_id, None)
+            query.done.wait()
+            query.connection.close()
+            if query.status == ABORTED:
+                raise LocalQueryError(f"Status of query '{query_id}' is ABORTED")
+            raise LocalQueryError(f"Query '{query_id}' failed: {query.error}") from query.error
+        return query.status
+
+    @staticmethod
+    def is_still_running(status):
+        return status == RUNNING
+
+    def close(self):
+        self._database.close()
+
+    def _duckdb_cursor(self):
+        # Each DuckDB cursor is its own connection to the shared database, so cursors can be
+        # used from different threads like the connector's
+        with self._lock:
+            connection = self._database.cursor()
+        for macro in COMPAT_MACROS:
+            connection.execute(macro)
+        return connection
+
+    def _submit(self, query, params, latency_seconds):
+        local_query = _LocalQuery(str(uuid.uuid4()), self._duckdb_cursor())
+        with self._lock:
+            self._queries[local_query.query_id] = local_query
+        threading.Thread(target=local_query.run, args=(query, params, latency_seconds),
+                         name="floraos-local-query", daemon=True).start()
+        return local_query.query_id
+
+    def _query(self, query_id):
+        with self._lock:
+            query = self._queries.get(query_id)
+        if query is None:
+            raise LocalQueryError(f"No query with id '{query_id}'")
+        return query
+
+    def _take_result(self, query_id):
+        query = self._query(query_id)
+        query.done.wait()
+        self.get_query_status_throw_if_error(query_id)
+        with self._lock:
+            self._queries.pop(query_id, None)
+        return query.connection
+
+
+class _LocalQuery:
+    # One asynchronously submitted query. The simulated latency is spent before the query
+    # starts, and either part can be aborted, like a queued or running warehouse query.
+
+    def __init__(self, query_id, connection):
+        self.query_id = query_id
+        self.connection = connection
+        self.status = RUNNING
+        self.error = None
+        self.aborted = threading.Event()
+        self.done = threading.Event()
+
+    def run(self, query, params, latency_seconds):
+        try:
+            if latency_seconds and self.aborted.wait(latency_seconds):
+                self.status = ABORTED
+                return
+            self.connection.execute(query, params)
+            self.status = ABORTED if self.aborted.is_set() else SUCCESS
+        except Exception as e:
+            if self.aborted.is_set():
+                self.status = ABORTED
+            else:
+                self.error = e
+                self.status = FAILED_WITH_ERROR
+        finally:
+            self.done.set()
+
+    def abort(self):
+        if self.done.is_set():
+            return False
+        self.aborted.set()
+        self.connection.interrupt()
+        return True
+
+
+class LocalWarehouseCursor:
+
+    def __init__(self, warehouse, connection, latency_seconds=0.0):
+        self.connection = warehouse
+        self._connection = connection
+        self._result = None
+        # The connection an asynchronous query ran on, kept open until its result is read
+        self._async_connection = None
+        self._closed = False
+        self.latency_seconds = latency_seconds
+        self.sfqid = None
+
+    def execute(self, query, params=None):
+        query, params = translate_parameters(query, params)
+        self._close_async_connection()
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        self.sfqid = str(uuid.uuid4())
+        self._result = self._connection.execute(query, params)
+        return self
+
+    def execute_async(self, query, params=None):
+        query, params = translate_parameters(query, params)
+        self.sfqid = self.connection._submit(query, params, self.latency_seconds)
+        return {"queryId": self.sfqid}
+
+    def get_results_from_sfqid(self, query_id):
+        self._close_async_connection()
+        self.sfqid = query_id
+        self._result = self._async_connection = self.connection._take_result(query_id)
+
+    def abort_query(self, query_id):
+        try:
+            return self.connection._query(query_id).abort()
+        except LocalQueryError:
+            return False
+
+    def fetch_pandas_all(self):
+        df = self._result.df()
+        # Snowflake reports unquoted identifiers in upper case
+        df.columns = [str(column).upper() for column in df.columns]
+        return df
+
+    def fetch_arrow_batches(self):
+        reader = self._result.fetch_record_batch(ARROW_BATCH_ROWS)
+        import pyarrow as pa
+
+        for batch in reader:
+            yield pa.Table.from_batches([batch]).rename_columns(
+                [name.upper() for name in batch.schema.names])
+
+    def fetchall(self):
+        return self._result.fetchall()
+
+    def is_closed(self):
+        return self._closed
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._close_async_connection()
+            self._connection.close()
+
+    def _close_async_connection(self):
+        if self._async_connection is not None:
+            self._async_connection.close()
+            self._async_connection = None
+
+
+def translate_parameters(query, params):
+    # The connector's pyformat style (%(name)s) becomes DuckDB's $name, and %s becomes ?
+    if params is None:
+        return query, None
+    if isinstance(params, dict):
+        return PYFORMAT_PARAMETER.sub(r"$\1", query), params
+    return query.replace("%s", "?"), list(params)
+
+
+_connections = {}
+_connections_lock = threading.Lock()
+
+
+def connect(path=None, read_only=True):
+    path = path or LOCAL_WAREHOUSE_PATH
+    if not path:
+        raise ValueError("No local warehouse configured; set FLORAOS_LOCAL_WAREHOUSE")
+    with _connections_lock:
+        connection = _connections.get((path, read_only))
+        if connection is None:
+            connection = LocalWarehouseConnection(path, read_only=read_only)
+            _connections[(path, read_only)] = connection
+        return connection
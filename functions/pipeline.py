@@ -0,0 +1,115 @@
+from functions.query_builder import QueryBuilder
+
+
+class Pipeline:
+    # A lazy description of a warehouse query. Every step returns a new Pipeline and nothing
+    # runs until the compiled query is fetched, so filters, projections, grouping and top-N
+    # all execute in the warehouse and only the final rows reach pandas.
+    #
+    #     Pipeline.table("FLORAOS.BLUE_SAGE.DUTCHIE_TRANSACTIONS")
+    #         .filter_date_range("transactiondate", date_range)
+    #         .aggregate(by={"BUDTENDER": "completedbyuser"}, TOTAL_SALES="SUM(total)")
+    #         .top_n(10, "TOTAL_SALES")
+    #         .to_query()
+
+    def __init__(self, source, joins=(), columns=(), filters=(), group_keys=(), aggregates=(),
+                 qualify=None, order=(), limit=None, params=None):
+        self.source = source
+        self.joins = tuple(joins)
+        self.columns = tuple(columns)
+        self.filters = tuple(filters)
+        self.group_keys = tuple(group_keys)
+        self.aggregates = tuple(aggregates)
+        self.qualify = qualify
+        self.order = tuple(order)
+        self.limit_rows = limit
+        self.params = dict(params or {})
+
+    @classmethod
+    def table(cls, name, alias=None):
+        return cls(f"{name} AS {alias}" if alias else name)
+
+    def join(self, name, on, alias=None, how="JOIN"):
+        target = f"{name} AS {alias}" if alias else name
+        return self._replace(joins=self.joins + (f"{how} {target} ON {on}",))
+
+    def select(self, *columns, **expressions):
+        # Positional columns are used as written; keyword columns become `expression AS name`
+        projected = columns + tuple(f"{expression} AS {name}" for name, expression in expressions.items())
+        return self._replace(columns=self.columns + projected)
+
+    def filter(self, condition, **params):
+        return self._replace(filters=self.filters + (("where", condition, params),))
+
+    def filter_date_range(self, column, date_range):
+        return self._replace(filters=self.filters + (("date_range", column, date_range),))
+
+    def filter_in(self, column, name, values):
+        return self._replace(filters=self.filters + (("in", column, name, tuple(values or ())),))
+
+    def aggregate(self, by=(), **aggregates):
+        # `by` is a list of key expressions, or a mapping of output name to key expression
+        keys = tuple(f"{expression} AS {name}" for name, expression in by.items()) \
+            if isinstance(by, dict) else tuple(by)
+        return self._replace(
+            group_keys=keys,
+            aggregates=tuple(f"{expression} AS {name}" for name, expression in aggregates.items()))
+
+    def top_n(self, n, by, partition_by=None, tie_break=None):
+        # Per-partition top-N is a QUALIFY on the row number; a global one is ORDER BY + LIMIT.
+        # `tie_break` orders rows with equal `by` values, so the same rows make the cut
+        order = f"{by} DESC" + (f", {tie_break}" if tie_break else "")
+        if partition_by is None:
+            return self._replace(order=(order,), limit=int(n))
+        partition = ", ".join(partition_by) if isinstance(partition_by, (list, tuple)) else partition_by
+        qualify = (f"ROW_NUMBER() OVER (PARTITION BY {partition} ORDER BY {order}) <= %(top_n)s",
+                   int(n))
+        return self._replace(qualify=qualify)
+
+    def bind(self, **params):
+        # For placeholders written directly into expressions, e.g. ROUND(x, %(precision)s)
+        return self._replace(params={**self.params, **params})
+
+    def order_by(self, *columns):
+        return self._replace(order=columns)
+
+    def limit(self, n):
+        return self._replace(limit=int(n))
+
+    def to_query(self):
+        columns = self.group_keys + self.aggregates if self.aggregates else self.columns
+        clauses = [f"SELECT {', '.join(columns) or '*'}", f"FROM {self.source}", *self.joins, "{where}"]
+        if self.aggregates and self.group_keys:
+            clauses.append(f"GROUP BY {', '.join(str(i + 1) for i in range(len(self.group_keys)))}")
+        if self.qualify is not None:
+            clauses.append(f"QUALIFY {self.qualify[0]}")
+        if self.order:
+            clauses.append(f"ORDER BY {', '.join(self.order)}")
+        if self.limit_rows is not None:
+            clauses.append("LIMIT %(limit)s")
+
+        builder = QueryBuilder("\n".join(clauses))
+        for kind, *arguments in self.filters:
+            if kind == "where":
+                condition, params = arguments
+                builder.where(condition, **params)
+            elif kind == "date_range":
+                builder.where_date_range(*arguments)
+            else:
+                builder.where_in(*arguments)
+        builder.bind(**self.params)
+        if self.qualify is not None:
+            builder.bind(top_n=self.qualify[1])
+        if self.limit_rows is not None:
+            builder.bind(limit=self.limit_rows)
+        return builder.build()
+
+    def _replace(self, **changes):
+        state = {
+            "source": self.source, "joins": self.joins, "columns": self.columns,
+            "filters": self.filters, "group_keys": self.group_keys, "aggregates": self.aggregates,
+            "qualify": self.qualify, "order": self.order, "limit": self.limit_rows,
+            "params": self.params,
+        }
+        state.update(changes)
+        return Pipeline(**state)
@@ -0,0 +1,144 @@
+import datetime
+import logging
+import os
+import threading
+import time
+
+
+PREWARM_ENABLED = os.environ.get("FLORAOS_PREWARM", "1") != "0"
+# Refreshes land comfortably inside the query cache's 15 minute TTL
+PREWARM_INTERVAL_SECONDS = float(os.environ.get("FLORAOS_PREWARM_INTERVAL_SECONDS", str(12 * 60)))
+# Slack for a pass that starts late, so an entry cannot expire just before it
+REFRESH_AHEAD_SECONDS = 60
+
+logger = logging.getLogger(__name__)
+
+
+def default_views(today):
+    # The queries a first visit to each page runs with the sidebar left on its defaults.
+    # Imported here so that starting the pre-warmer from Main.py stays cheap. The inventory
+    # aging index is not warmed: st.cache_resource keeps it for the life of the process, so
+    # only the first pass would ever build it.
+    from functions.functions import (
+        default_date_range,
+        get_budtender_transaction_data,
+        get_customer_sales,
+        get_location_product_sales,
+        get_weekly_profitability,
+    )
+
+    date_range = default_date_range(today)
+    return {
+        "weekly_profitability": lambda: get_weekly_profitability(date_range),
+        "customer_sales": lambda: get_customer_sales(date_range),
+        "budtender_metrics": lambda: get_budtender_transaction_data(date_range),
+        "location_product_sales": lambda: get_location_product_sales(date_range),
+    }
+
+
+class Prewarmer:
+    # One background thread per process. Once a day (at start and on each day rollover,
+    # which includes the month rollover that moves the default range) it refreshes the
+    # rollups and fills the cache with the default views. Those lookups go through the
+    # disk tier, so a replica that another has already warmed runs no queries. Between
+    # warms, every `interval` seconds, it only re-fetches cached results someone has read
+    # since the previous pass and that would otherwise expire before the next one, so an
+    # idle dashboard leaves the warehouse idle. Failures are logged and retried next pass.
+
+    def __init__(self, views=default_views, interval=PREWARM_INTERVAL_SECONDS,
+                 today=datetime.date.today):
+        self.views = views
+        self.interval = interval
+        self.today = today
+        self.passes = 0
+        self.last_pass = None
+        self.last_errors = {}
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="floraos-prewarm", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run_once(self, today=None):
+        from functions.functions import raising_query_errors
+        from functions.rollup_store import rollup_store
+
+        today = today or self.today()
+        started = time.monotonic()
+        errors = {}
+        # Rollups are only kept fresh where someone has opted into them with a first refresh
+        if rollup_store.manifest() is not None:
+            try:
+                rollup_store.refresh()
+            except Exception as e:
+                errors["rollups"] = str(e)
+                logger.warning("Pre-warm could not refresh rollups: %s", e)
+        for name, view in self.views(today).items():
+            try:
+                with raising_query_errors():
+                    view()
+            except Exception as e:
+                errors[name] = str(e)
+                logger.warning("Pre-warm of %s failed: %s", name, e)
+        self._finish_pass(today, started, errors)
+        logger.info("Pre-warmed default views for %s in %.1fs", today, self.last_pass["seconds"])
+        return errors
+
+    def refresh_read(self, read_since):
+        from functions.query_cache import query_cache
+
+        started = time.monotonic()
+        errors = query_cache.refresh_expiring(read_since, self.interval + REFRESH_AHEAD_SECONDS)
+        for query, error in errors.items():
+            logger.warning("Pre-warm refresh of %s failed: %s", query, error)
+        self._finish_pass(self.today(), started, errors)
+        return errors
+
+    def _finish_pass(self, today, started, errors):
+        self.passes += 1
+        self.last_errors = errors
+        self.last_pass = {"date": today.isoformat(), "seconds": time.monotonic() - started}
+
+    def _loop(self):
+        warmed_for = None
+        last_pass = None
+        next_refresh = 0.0
+        while not self._stop.is_set():
+            today = self.today()
+            if today != warmed_for:
+                last_pass = time.monotonic()
+                self.run_once(today)
+                warmed_for = today
+                next_refresh = time.monotonic() + self.interval
+            elif time.monotonic() >= next_refresh:
+                read_since, last_pass = last_pass, time.monotonic()
+                self.refresh_read(read_since)
+                next_refresh = time.monotonic() + self.interval
+            self._stop.wait(min(max(next_refresh - time.monotonic(), 0.0), _seconds_to_midnight()))
+
+
+def _seconds_to_midnight():
+    now = datetime.datetime.now()
+    midnight = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time())
+    return max((midnight - now).total_seconds(), 1.0)
+
+
+prewarmer = Prewarmer()
+
+
+def start_prewarmer():
+    # Safe to call on every script run: only the first call in a process starts the thread
+    if PREWARM_ENABLED:
+        prewarmer.start()
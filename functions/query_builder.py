@@ -0,0 +1,58 @@
+from functions.query_cache import as_date, normalize_query
+
+
+class BoundQuery:
+    # Normalized SQL text plus its bind parameters (the connector's pyformat style,
+    # %(name)s). The same logical query always produces the same text, whatever the
+    # dates, stores or limits, so client cache keys and Snowflake's result cache line up.
+    __slots__ = ("sql", "params")
+
+    def __init__(self, sql, params=None):
+        self.sql = normalize_query(sql)
+        self.params = dict(params or {})
+
+    def __repr__(self):
+        return f"BoundQuery({self.sql!r}, {self.params!r})"
+
+
+class QueryBuilder:
+    # Fills the `{where}` placeholder of a SQL template with the conditions added so far.
+    # Values never enter the SQL text; they are bound as parameters.
+
+    def __init__(self, template):
+        self.template = template
+        self.conditions = []
+        self.params = {}
+
+    def where(self, condition, **params):
+        self.conditions.append(condition)
+        self.params.update(params)
+        return self
+
+    def where_date_range(self, column, date_range):
+        # The window is bound as start_date / end_date, which the query cache reads back to
+        # answer narrower windows from a wider cached result
+        if not date_range:
+            return self
+        start, end = date_range
+        return self.where(
+            f"TO_DATE({column}) BETWEEN %(start_date)s AND %(end_date)s",
+            start_date=as_date(start), end_date=as_date(end))
+
+    def where_in(self, column, name, values):
+        # Sorted and de-duplicated, so the same set of values binds identically
+        if not values:
+            return self
+        values = sorted(set(values))
+        placeholders = ", ".join(f"%({name}_{i})s" for i in range(len(values)))
+        return self.where(f"{column} IN ({placeholders})",
+                          **{f"{name}_{i}": value for i, value in enumerate(values)})
+
+    def bind(self, **params):
+        self.params.update(params)
+        return self
+
+    def build(self):
+        where = f"WHERE {' AND '.join(self.conditions)}" if self.conditions else ""
+        return BoundQuery(self.template.replace("{where}", where), self.params)
+
@@ -0,0 +1,303 @@
+import datetime
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from functions.disk_cache import disk_cache as default_disk_cache
+from functions.dtypes import compact_dtypes, deep_nbytes
+from functions.instrumentation import frame_nbytes, query_label, recorder
+from functions.single_flight import COALESCE_TIMEOUT_SECONDS, SingleFlight, SingleFlightTimeout
+
+
+DEFAULT_TTL_SECONDS = 15 * 60
+DEFAULT_MAX_ENTRIES = 128
+
+
+def normalize_query(query):
+    return " ".join(query.split()).rstrip(";").rstrip()
+
+
+def cache_key(query, params=None):
+    # Bound queries carry their window as the start_date / end_date parameters; every other
+    # parameter is part of the template. Unbound SQL has no window.
+    if not params:
+        return normalize_query(query), None
+    params = dict(params)
+    window = None
+    if "start_date" in params and "end_date" in params:
+        window = (as_date(params.pop("start_date")), as_date(params.pop("end_date")))
+    template = normalize_query(query)
+    if params:
+        template += f" /* {json.dumps(params, sort_keys=True, default=str)} */"
+    return template, window
+
+
+def as_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value))
+
+
+class _CacheEntry:
+    __slots__ = ("frame", "stored_at", "date_column", "nbytes", "fetched_nbytes", "source",
+                 "last_read")
+
+    def __init__(self, frame, stored_at, date_column, fetched_nbytes=None, source=None,
+                 last_read=None):
+        self.frame = frame
+        self.stored_at = stored_at
+        self.date_column = date_column
+        self.nbytes = deep_nbytes(frame)
+        # The size as it came back from the warehouse, before compact_dtypes
+        self.fetched_nbytes = fetched_nbytes
+        # (query, params, fetch) it was fetched with, so refresh_expiring can run it again
+        self.source = source
+        self.last_read = stored_at if last_read is None else last_read
+
+
+class QueryCache:
+    # In memory per process, backed by `disk` (see disk_cache.py) when one is configured.
+    # Memory misses are looked up on disk before the warehouse, and every stored result is
+    # written through, so entries outlive restarts and are shared between replicas.
+
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES,
+                 disk=default_disk_cache):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.disk = disk
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.covered_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.flights = SingleFlight()
+
+    def get_or_fetch(self, query, fetch, date_column=None, params=None,
+                     timeout=COALESCE_TIMEOUT_SECONDS):
+        # fetch(query, params) runs the query; identical (query, params) pairs share one entry
+        template, window = cache_key(query, params)
+        source = (query, params, fetch)
+        frame = self.lookup(template, window, source)
+        if frame is not None:
+            return frame
+
+        def fetch_and_store():
+            # A flight that finished between our lookup and now has already stored its result
+            frame = self._lookup_memory(template, window)[0]
+            if frame is not None:
+                return frame
+            frame = fetch(query, params)
+            # Empty results are never cached; failures raise through to get_data, which reports them
+            if frame is not None and not frame.empty:
+                frame = self.store(template, window, frame, date_column, source)
+            return frame
+
+        # Concurrent misses for the same normalized query share one warehouse query
+        started = time.perf_counter()
+        try:
+            frame, shared = self.flights.do((template, window), fetch_and_store, timeout)
+        except SingleFlightTimeout:
+            recorder.record("coalesced", template, started, outcome="timeout")
+            raise
+        if shared:
+            recorder.record("coalesced", template, started, outcome="shared",
+                            rows=len(frame) if frame is not None else None)
+        return frame.copy() if frame is not None else frame
+
+    def lookup(self, template, window, source=None):
+        started = time.perf_counter()
+        frame, outcome = self._lookup(template, window, source)
+        recorder.record("cache", template, started, outcome=outcome,
+                        rows=len(frame) if frame is not None else None,
+                        nbytes=frame_nbytes(frame) if frame is not None else None)
+        return frame
+
+    def _lookup(self, template, window, source=None):
+        frame, outcome = self._lookup_memory(template, window)
+        if frame is None and self.disk is not None:
+            frame = self._lookup_disk(template, window, source)
+            if frame is not None:
+                outcome = "disk_hit"
+        if frame is None:
+            with self._lock:
+                self.misses += 1
+        return frame, outcome
+
+    def _lookup_memory(self, template, window):
+        with self._lock:
+            now = time.monotonic()
+            key = (template, window)
+            entry = self._entries.get(key)
+            if entry is not None and not self._is_expired(entry, now):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                entry.last_read = now
+                return entry.frame.copy(), "hit"
+            if entry is not None:
+                del self._entries[key]
+
+            if window is not None:
+                covering_key = self._find_covering_entry(template, window, now)
+                if covering_key is not None:
+                    self._entries.move_to_end(covering_key)
+                    self.covered_hits += 1
+                    covering = self._entries[covering_key]
+                    covering.last_read = now
+                    return _slice_window(covering.frame, covering.date_column, window), "covered_hit"
+
+            return None, "miss"
+
+    def _lookup_disk(self, template, window, source=None, max_age=None, last_read=None):
+        # Read outside the lock. A hit is promoted into memory with the age it had on disk,
+        # so it still expires when the original fetch would have.
+        entry = self.disk.get(template, window,
+                             max_age=self.ttl_seconds if max_age is None else max_age)
+        if entry is None:
+            return None
+        now = time.monotonic()
+        stored_at = now - max(time.time() - entry.stored_at, 0.0)
+        with self._lock:
+            self.disk_hits += 1
+            self._store_memory(template, window, entry.frame, entry.date_column, stored_at,
+                               entry.fetched_nbytes, source,
+                               last_read=now if last_read is None else last_read)
+        return entry.frame.copy()
+
+    def store(self, template, window, frame, date_column=None, source=None, last_read=None):
+        # Returns the frame as cached: every result is compacted first, since it is kept for
+        # every session until it expires
+        fetched_nbytes = deep_nbytes(frame)
+        frame = compact_dtypes(frame.copy())
+        with self._lock:
+            self._store_memory(template, window, frame, date_column, time.monotonic(),
+                               fetched_nbytes, source, last_read)
+        if self.disk is not None:
+            self.disk.put(template, window, frame, date_column, fetched_nbytes)
+        return frame
+
+    def _store_memory(self, template, window, frame, date_column, stored_at, fetched_nbytes=None,
+                      source=None, last_read=None):
+        key = (template, window)
+        self._entries[key] = _CacheEntry(
+            frame, stored_at, date_column, fetched_nbytes, source, last_read)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self, disk=False):
+        with self._lock:
+            self._entries.clear()
+        if disk and self.disk is not None:
+            self.disk.clear()
+
+    def refresh_expiring(self, read_since, within):
+        # Re-fetches the entries someone read since `read_since` (time.monotonic()) that would
+        # expire in the next `within` seconds. Entries nobody reads are left to expire, so
+        # the warehouse is only kept busy while people use the dashboards. Returns
+        # {query: error} for the refreshes that failed.
+        now = time.monotonic()
+        with self._lock:
+            expiring = [
+                (key, entry) for key, entry in self._entries.items()
+                if entry.source is not None and entry.last_read >= read_since
+                and now - entry.stored_at > self.ttl_seconds - within
+            ]
+        errors = {}
+        for key, entry in expiring:
+            try:
+                self.flights.do(key, lambda key=key, entry=entry: self._refresh(key, entry, within))
+            except Exception as e:
+                errors[query_label(key[0])] = str(e)
+        return errors
+
+    def _refresh(self, key, entry, within):
+        template, window = key
+        # Another replica may have refreshed it already; its copy is used if it outlives
+        # `within`, instead of querying again
+        if self.disk is not None:
+            frame = self._lookup_disk(template, window, entry.source,
+                                      max_age=self.ttl_seconds - within,
+                                      last_read=entry.last_read)
+            if frame is not None:
+                return frame
+        query, params, fetch = entry.source
+        frame = fetch(query, params)
+        if frame is not None and not frame.empty:
+            # Refreshing is not reading: an entry nobody reads still expires
+            frame = self.store(template, window, frame, entry.date_column, entry.source,
+                               last_read=entry.last_read)
+        return frame
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.covered_hits + self.disk_hits + self.misses
+            stats = {
+                "entries": len(self._entries),
+                "bytes": sum(entry.nbytes for entry in self._entries.values()),
+                "hits": self.hits,
+                "covered_hits": self.covered_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits + self.covered_hits + self.disk_hits) / lookups
+                if lookups else 0.0,
+                "coalescing": self.flights.stats(),
+            }
+        stats["disk"] = self.disk.stats() if self.disk is not None else None
+        return stats
+
+    def memory_report(self):
+        # One row per entry held in memory, largest first
+        with self._lock:
+            now = time.monotonic()
+            entries = list(self._entries.items())
+        report = []
+        for (template, window), entry in entries:
+            report.append({
+                "query": query_label(template),
+                "window": f"{window[0]} to {window[1]}" if window else "",
+                "rows": len(entry.frame),
+                "bytes": entry.nbytes,
+                "fetched_bytes": entry.fetched_nbytes,
+                "reduction": round(entry.fetched_nbytes / entry.nbytes, 1)
+                if entry.fetched_nbytes and entry.nbytes else None,
+                "age_seconds": round(now - entry.stored_at),
+            })
+        return sorted(report, key=lambda row: row["bytes"], reverse=True)
+
+    def _is_expired(self, entry, now):
+        return now - entry.stored_at > self.ttl_seconds
+
+    def _find_covering_entry(self, template, window, now):
+        # Only daily-grain entries (those stored with a date column) can be narrowed
+        expired = []
+        found = None
+        for (entry_template, entry_window), entry in self._entries.items():
+            if entry_template != template or entry_window is None or entry.date_column is None:
+                continue
+            if self._is_expired(entry, now):
+                expired.append((entry_template, entry_window))
+                continue
+            if entry_window[0] <= window[0] and window[1] <= entry_window[1]:
+                found = (entry_template, entry_window)
+                break
+        for key in expired:
+            del self._entries[key]
+        return found
+
+
+def _slice_window(frame, date_column, window):
+    dates = pd.to_datetime(frame[date_column])
+    mask = (dates >= pd.Timestamp(window[0])) & (dates <= pd.Timestamp(window[1]))
+    return frame.loc[mask].reset_index(drop=True)
+
+
+query_cache = QueryCache()
@@ -0,0 +1,405 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import streamlit as st
+
+from functions import local_warehouse
+from functions.instrumentation import current_session_id, frame_nbytes, recorder
+from functions.single_flight import FlightAbandoned
+
+
+CURSOR_POOL_SIZE = int(os.environ.get("FLORAOS_CURSOR_POOL_SIZE", "8"))
+CURSOR_ACQUIRE_TIMEOUT_SECONDS = float(
+    os.environ.get("FLORAOS_CURSOR_ACQUIRE_TIMEOUT_SECONDS", "120"))
+# Status polls of a running query start fast and back off to this interval
+QUERY_POLL_SECONDS = float(os.environ.get("FLORAOS_QUERY_POLL_SECONDS", "0.5"))
+FIRST_POLL_SECONDS = 0.02
+
+logger = logging.getLogger(__name__)
+
+_progress_callback = contextvars.ContextVar("floraos_query_progress", default=None)
+_cancel_event = contextvars.ContextVar("floraos_cancel_event", default=None)
+
+
+class PoolSaturatedError(Exception):
+    pass
+
+
+class QueryCancelled(FlightAbandoned):
+    pass
+
+
+def _streamlit_connection():
+    # FLORAOS_LOCAL_WAREHOUSE points every query at an offline DuckDB stand-in instead
+    if local_warehouse.LOCAL_WAREHOUSE_PATH:
+        return local_warehouse.connect()
+    return st.connection("snowflake")
+
+
+class CursorPool:
+    # Hands out cursors from a bounded pool. Every query needs a checked-out cursor, so the
+    # pool size is also the cap on queries running at once in this process.
+
+    def __init__(self, connection_factory=_streamlit_connection, size=CURSOR_POOL_SIZE,
+                 acquire_timeout=CURSOR_ACQUIRE_TIMEOUT_SECONDS):
+        self.connection_factory = connection_factory
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self._idle = []
+        self._open = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._condition = threading.Condition()
+        self.checkouts = 0
+        self.saturated_checkouts = 0
+        self.timeouts = 0
+        self.discarded = 0
+        self.peak_in_use = 0
+        self.total_wait_seconds = 0.0
+
+    @contextmanager
+    def cursor(self):
+        connection, cur = self._checkout()
+        try:
+            yield cur
+        except BaseException:
+            # A cursor that failed or was abandoned mid-query (e.g. a stream that was not
+            # read to the end) is not trusted for reuse
+            self._discard(cur)
+            raise
+        else:
+            self._checkin(connection, cur)
+
+    def set_connection_factory(self, connection_factory):
+        with self._condition:
+            self.connection_factory = connection_factory
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._condition.notify_all()
+        for _, cur in idle:
+            _close_quietly(cur)
+
+    def stats(self):
+        with self._condition:
+            return {
+                "size": self.size,
+                "open": self._open,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "peak_in_use": self.peak_in_use,
+                "saturation": self._in_use / self.size if self.size else 0.0,
+                "checkouts": self.checkouts,
+                "saturated_checkouts": self.saturated_checkouts,
+                "timeouts": self.timeouts,
+                "discarded": self.discarded,
+                "total_wait_seconds": self.total_wait_seconds,
+            }
+
+    def close(self):
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for _, cur in idle:
+            _close_quietly(cur)
+
+    def _checkout(self):
+        connection = _raw_connection(self.connection_factory())
+        started = time.monotonic()
+        deadline = started + self.acquire_timeout
+        with self._condition:
+            self.checkouts += 1
+            if not self._idle and self._open >= self.size:
+                self.saturated_checkouts += 1
+            while not self._idle and self._open >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    logger.warning("Cursor pool saturated: %s", self._stats_line())
+                    raise PoolSaturatedError(
+                        f"No Snowflake cursor became available within {self.acquire_timeout:.0f}s")
+                self._waiting += 1
+                try:
+                    self._condition.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self.total_wait_seconds += time.monotonic() - started
+
+            cur = None
+            while self._idle:
+                idle_connection, idle_cur = self._idle.pop()
+                if idle_connection is connection and not _is_closed(idle_cur):
+                    cur = idle_cur
+                    break
+                # Cursors from a connection that has since been reset are dropped
+                self._open -= 1
+                self.discarded += 1
+                _close_quietly(idle_cur)
+            self._open += cur is None
+            self._in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self._in_use)
+
+        if cur is None:
+            try:
+                cur = connection.cursor()
+            except Exception:
+                self._drop_checked_out()
+                raise
+        return connection, cur
+
+    def _checkin(self, connection, cur):
+        with self._condition:
+            self._in_use -= 1
+            self._idle.append((connection, cur))
+            self._condition.notify()
+
+    def _discard(self, cur):
+        _close_quietly(cur)
+        self._drop_checked_out()
+
+    def _drop_checked_out(self):
+        with self._condition:
+            self._in_use -= 1
+            self._open -= 1
+            self.discarded += 1
+            self._condition.notify()
+
+    def _stats_line(self):
+        return (f"in_use={self._in_use}/{self.size} waiting={self._waiting} "
+                f"saturated_checkouts={self.saturated_checkouts}")
+
+
+def _raw_connection(connection):
+    # st.connection wraps the connector's connection; cursors come from the raw one
+    return getattr(connection, "raw_connection", connection)
+
+
+def _is_closed(cur):
+    is_closed = getattr(cur, "is_closed", None)
+    return bool(is_closed()) if callable(is_closed) else False
+
+
+def _close_quietly(cur):
+    try:
+        cur.close()
+    except Exception:
+        pass
+
+
+cursor_pool = CursorPool()
+
+
+class _RunningQuery:
+    __slots__ = ("query_id", "session", "cursor", "cancel_event", "cancelled")
+
+    def __init__(self, query_id, session, cursor, cancel_event=None):
+        self.query_id = query_id
+        self.session = session
+        self.cursor = cursor
+        self.cancel_event = cancel_event
+        self.cancelled = False
+
+
+class QueryRegistry:
+    # The warehouse queries in flight, by the session whose script run started them. Script
+    # runs of a session never overlap, so whatever a session still has running when its next
+    # run starts was started by a superseded run (or by one of its fan-out threads). Those
+    # the new run asks for again it joins through single flight; the rest only hold a
+    # warehouse slot. Queries started outside a session (the pre-warmer, exports) are never
+    # cancelled this way; an export cancels its own through cancel_queries.
+
+    def __init__(self):
+        self._queries = {}
+        self._lock = threading.Lock()
+        self.cancelled = 0
+
+    def register(self, query_id, cur):
+        cancel_event = _cancel_event.get()
+        running = _RunningQuery(query_id, current_session_id(), cur, cancel_event)
+        with self._lock:
+            self._queries[query_id] = running
+            # Cancelled between being submitted and getting here
+            late = cancel_event is not None and cancel_event.is_set()
+            if late:
+                running.cancelled = True
+                self.cancelled += 1
+        if late:
+            _abort_quietly(cur, query_id)
+        return running
+
+    def unregister(self, query_id):
+        with self._lock:
+            self._queries.pop(query_id, None)
+
+    def in_flight(self, session_id=None):
+        with self._lock:
+            return [running.query_id for running in self._queries.values()
+                    if session_id is None or running.session == session_id]
+
+    def cancel_session(self, session_id, query_ids=None):
+        # Only the queries in `query_ids` when it is given
+        if session_id is None:
+            return 0
+        return self._cancel(
+            lambda running: running.session == session_id
+            and (query_ids is None or running.query_id in query_ids), "superseded")
+
+    def cancel_event(self, cancel_event):
+        return self._cancel(lambda running: running.cancel_event is cancel_event, "cancelled")
+
+    def _cancel(self, matches, reason):
+        with self._lock:
+            stale = [running for running in self._queries.values()
+                     if not running.cancelled and matches(running)]
+            for running in stale:
+                running.cancelled = True
+            self.cancelled += len(stale)
+        for running in stale:
+            _abort_quietly(running.cursor, running.query_id)
+            logger.info("Cancelled %s query %s", reason, running.query_id)
+        return len(stale)
+
+
+query_registry = QueryRegistry()
+
+
+def superseded_queries():
+    # Called at the top of every page run: what an earlier run of the session left running
+    return set(query_registry.in_flight(current_session_id()))
+
+
+def cancel_superseded_queries(query_ids):
+    # Called once the page run has finished. A query it needed again it joined and waited
+    # for, so those still running were not asked for with the run's inputs.
+    return query_registry.cancel_session(current_session_id(), query_ids)
+
+
+@contextmanager
+def cancelled_by(cancel_event):
+    # Queries run inside the block raise QueryCancelled once cancel_queries(cancel_event) is
+    # called, also one submitted just after it, and are aborted in the warehouse
+    token = _cancel_event.set(cancel_event)
+    try:
+        yield
+    finally:
+        _cancel_event.reset(token)
+
+
+def cancel_queries(cancel_event):
+    cancel_event.set()
+    return query_registry.cancel_event(cancel_event)
+
+
+@contextmanager
+def query_progress(callback):
+    # `callback(elapsed_seconds)` is called between status polls of the queries run inside
+    # the block. On the script thread, drawing anything there is also the point where
+    # Streamlit stops a superseded run, and the query being waited on is then aborted.
+    token = _progress_callback.set(callback)
+    try:
+        yield
+    finally:
+        _progress_callback.reset(token)
+
+
+def _wait_for_result(cur, query_id):
+    # Polls an asynchronously submitted query until it finishes and attaches its result to `cur`
+    running = query_registry.register(query_id, cur)
+    try:
+        _wait_for(cur.connection, running)
+    except Exception:
+        raise
+    except BaseException:
+        # The script run was stopped or superseded while waiting
+        _abort_quietly(cur, query_id)
+        raise
+    finally:
+        query_registry.unregister(query_id)
+    cur.get_results_from_sfqid(query_id)
+
+
+def _wait_for(connection, running):
+    progress = _progress_callback.get()
+    started = time.monotonic()
+    delay = FIRST_POLL_SECONDS
+    while True:
+        try:
+            status = connection.get_query_status_throw_if_error(running.query_id)
+        except Exception as e:
+            if running.cancelled:
+                raise QueryCancelled(f"Query {running.query_id} was cancelled") from e
+            raise
+        if running.cancelled:
+            raise QueryCancelled(f"Query {running.query_id} was cancelled")
+        if not connection.is_still_running(status):
+            return
+        if progress is not None:
+            progress(time.monotonic() - started)
+        time.sleep(delay)
+        delay = min(delay * 2, QUERY_POLL_SECONDS)
+
+
+def _abort_quietly(cur, query_id):
+    try:
+        cur.abort_query(query_id)
+    except Exception as e:
+        logger.warning("Could not cancel query %s: %s", query_id, e)
+
+
+def execute_query(query, params=None):
+    started = time.perf_counter()
+    query_id = None
+    try:
+        with cursor_pool.cursor() as cur:
+            cur.execute_async(query, params)
+            query_id = cur.sfqid
+            _wait_for_result(cur, query_id)
+            df = cur.fetch_pandas_all()
+    except QueryCancelled as e:
+        recorder.record("query", query, started, outcome="cancelled", query_id=query_id,
+                        error=type(e).__name__)
+        raise
+    except Exception as e:
+        recorder.record("query", query, started, outcome="error", query_id=query_id,
+                        error=type(e).__name__)
+        raise
+    recorder.record("query", query, started, rows=len(df), nbytes=frame_nbytes(df),
+                    query_id=query_id)
+    return df
+
+
+def iter_query_batches(query, params=None):
+    # Yields the result as Arrow record batches while holding one pooled cursor
+    started = time.perf_counter()
+    query_id = None
+    rows = 0
+    nbytes = 0
+    outcome = "error"
+    error = None
+    try:
+        with cursor_pool.cursor() as cur:
+            cur.execute_async(query, params)
+            query_id = cur.sfqid
+            _wait_for_result(cur, query_id)
+            for batch in cur.fetch_arrow_batches():
+                rows += batch.num_rows
+                nbytes += batch.nbytes
+                yield batch
+        outcome = "ok"
+    except GeneratorExit:
+        outcome = "abandoned"
+        raise
+    except QueryCancelled as e:
+        outcome = "cancelled"
+        error = type(e).__name__
+        raise
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        recorder.record("query", query, started, rows=rows, nbytes=nbytes, outcome=outcome,
+                        query_id=query_id, error=error)
@@ -0,0 +1,227 @@
+import argparse
+import datetime
+import json
+import os
+import threading
+
+import pandas as pd
+
+from functions.query_executor import execute_query
+from functions.storage import DATA_DIR, read_json, write_json_atomic, write_parquet_atomic
+from functions.transaction_window import RECONCILE_DAYS
+
+
+DEFAULT_BACKFILL_DAYS = 400
+
+# Daily-grain aggregates. Every measure is additive across days, budtenders and voids
+# (a transaction has exactly one date and one budtender), so any date range can be
+# re-aggregated from these rows without going back to the warehouse.
+ROLLUP_QUERIES = {
+    "transactions_daily": """
+        SELECT
+            TO_DATE(transactiondate) AS transaction_date,
+            completedbyuser AS budtender,
+            isvoid,
+            SUM(total) AS total_sales,
+            COUNT(total) AS priced_transactions,
+            COUNT(transactionid) AS total_transactions
+        FROM FLORAOS.BLUE_SAGE.DUTCHIE_TRANSACTIONS
+        WHERE TO_DATE(transactiondate) >= %(since)s
+        GROUP BY
+            transaction_date,
+            completedbyuser,
+            isvoid;
+    """,
+    "product_sales_daily": """
+        SELECT
+            TO_DATE(t.transactiondate) AS transaction_date,
+            p.location,
+            p.productname,
+            t.completedbyuser AS budtender,
+            SUM(i.totalprice) AS total_sales,
+            COUNT(DISTINCT i.transactionid) AS total_transactions
+        FROM
+            FLORAOS.BLUE_SAGE.flattened_itemsv_blue_sage_04_28_2024 AS i
+            JOIN FLORAOS.BLUE_SAGE.dutchie_inventory AS p ON i.productid = p.productid
+            JOIN FLORAOS.BLUE_SAGE.dutchie_transactions AS t ON i.transactionid = t.transactionid
+        WHERE TO_DATE(t.transactiondate) >= %(since)s
+        GROUP BY
+            transaction_date,
+            p.location,
+            p.productname,
+            t.completedbyuser;
+    """,
+}
+
+
+class RollupStore:
+    # Daily rollups live in one Parquet file per table and month, next to a manifest that
+    # records the covered start date and the TRANSACTIONDATE high-water mark. Rows may still
+    # be arriving for the high-water day, so only the days before it count as covered.
+    # Every refresh also re-fetches the last `reconcile_days`, which picks up late voids and
+    # corrected totals.
+
+    def __init__(self, root=os.path.join(DATA_DIR, "rollups"), reconcile_days=RECONCILE_DAYS):
+        self.root = root
+        self.reconcile_days = reconcile_days
+        self._lock = threading.Lock()
+        self._partition_cache = {}
+
+    def manifest(self):
+        manifest = read_json(os.path.join(self.root, "manifest.json"))
+        if manifest is None:
+            return None
+        watermark = datetime.date.fromisoformat(manifest["watermark"])
+        return {
+            "start": datetime.date.fromisoformat(manifest["start"]),
+            "watermark": watermark,
+            "complete_through": watermark - datetime.timedelta(days=1),
+            "refreshed_at": manifest["refreshed_at"],
+        }
+
+    def covers(self, start, end):
+        manifest = self.manifest()
+        return (manifest is not None and manifest["start"] <= start
+                and end <= manifest["complete_through"])
+
+    def refresh(self, since=None, today=None):
+        # Re-fetches everything from the watermark day onwards (that day may have been
+        # partial) and the reconciliation window, or backfills from `since` when it predates
+        # what is stored. A later `since` never skips the days after the watermark.
+        with self._lock:
+            today = today or datetime.date.today()
+            manifest = self.manifest()
+            if manifest is None:
+                if since is None:
+                    since = today - datetime.timedelta(days=DEFAULT_BACKFILL_DAYS)
+                start = since
+            else:
+                since = min(
+                    since or manifest["watermark"], manifest["watermark"],
+                    today - datetime.timedelta(days=self.reconcile_days),
+                )
+                start = min(since, manifest["start"])
+
+            watermark = manifest["watermark"] if manifest is not None else None
+            for name, query in ROLLUP_QUERIES.items():
+                df = execute_query(query, {"since": since})
+                df["TRANSACTION_DATE"] = pd.to_datetime(df["TRANSACTION_DATE"])
+                self._merge_partitions(name, df, since)
+                if not df.empty:
+                    latest = df["TRANSACTION_DATE"].max().date()
+                    watermark = latest if watermark is None else max(watermark, latest)
+
+            self._write_manifest(start, watermark or since - datetime.timedelta(days=1))
+            return self.manifest()
+
+    def load(self, name, start, end, columns=None):
+        frames = []
+        for month in _months_between(start, end):
+            df = self._read_partition(name, month)
+            if df is not None:
+                frames.append(df if columns is None else df[["TRANSACTION_DATE", *columns]])
+        if not frames:
+            return pd.DataFrame()
+        df = pd.concat(frames, ignore_index=True)
+        mask = df["TRANSACTION_DATE"].between(pd.Timestamp(start), pd.Timestamp(end))
+        return df.loc[mask].reset_index(drop=True)
+
+    def daily_revenue(self, start, end):
+        df = self.load("transactions_daily", start, end,
+                       columns=["TOTAL_SALES", "PRICED_TRANSACTIONS"])
+        return (
+            df.groupby("TRANSACTION_DATE", as_index=False)[["TOTAL_SALES", "PRICED_TRANSACTIONS"]]
+            .sum()
+            .rename(columns={"TOTAL_SALES": "TOTAL_REVENUE"})
+        )
+
+    def daily_budtender_sales(self, start, end):
+        df = self.load("transactions_daily", start, end)
+        return df.loc[df["ISVOID"].eq(False)].drop(columns="ISVOID").reset_index(drop=True)
+
+    def location_product_sales(self, start, end, locations=None, top_n=10):
+        df = self.load("product_sales_daily", start, end)
+        if locations:
+            df = df.loc[df["LOCATION"].isin(locations)]
+        df = df.groupby(["PRODUCTNAME", "LOCATION"], as_index=False)[
+            ["TOTAL_SALES", "TOTAL_TRANSACTIONS"]].sum()
+        return (
+            df.sort_values(by=["LOCATION", "TOTAL_SALES", "PRODUCTNAME"],
+                           ascending=[True, False, True])
+            .groupby("LOCATION")
+            .head(top_n)
+            .reset_index(drop=True)
+        )
+
+    def _partition_path(self, name, month):
+        return os.path.join(self.root, name, f"{month:%Y-%m}.parquet")
+
+    def _read_partition(self, name, month):
+        path = self._partition_path(name, month)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        cached = self._partition_cache.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, pd.read_parquet(path))
+            self._partition_cache[path] = cached
+        return cached[1]
+
+    def _merge_partitions(self, name, df_new, since):
+        os.makedirs(os.path.join(self.root, name), exist_ok=True)
+        since_month = since.replace(day=1)
+        months = {
+            datetime.date.fromisoformat(filename[:7] + "-01")
+            for filename in os.listdir(os.path.join(self.root, name))
+            if filename.endswith(".parquet")
+        }
+        months = {month for month in months if month >= since_month}
+        months.update(df_new["TRANSACTION_DATE"].dt.date.map(lambda day: day.replace(day=1)))
+
+        for month in sorted(months):
+            df_existing = self._read_partition(name, month)
+            month_start = pd.Timestamp(month)
+            month_end = month_start + pd.offsets.MonthBegin(1)
+            df_month = df_new.loc[df_new["TRANSACTION_DATE"].between(
+                month_start, month_end, inclusive="left")]
+            if df_existing is not None:
+                df_month = pd.concat(
+                    [df_existing.loc[df_existing["TRANSACTION_DATE"] < pd.Timestamp(since)], df_month],
+                    ignore_index=True,
+                )
+            write_parquet_atomic(df_month, self._partition_path(name, month))
+
+    def _write_manifest(self, start, watermark):
+        manifest = {
+            "start": start.isoformat(),
+            "watermark": watermark.isoformat(),
+            "refreshed_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        }
+        write_json_atomic(manifest, os.path.join(self.root, "manifest.json"))
+
+
+def _months_between(start, end):
+    month = start.replace(day=1)
+    while month <= end:
+        yield month
+        month = (month + datetime.timedelta(days=32)).replace(day=1)
+
+
+rollup_store = RollupStore()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the local daily transaction rollups.")
+    parser.add_argument("command", choices=["refresh", "status"])
+    parser.add_argument("--since", type=datetime.date.fromisoformat,
+                        help="Also re-fetch from this date, when it predates the stored watermark.")
+    args = parser.parse_args()
+
+    if args.command == "refresh":
+        rollup_store.refresh(since=args.since)
+    print(json.dumps(rollup_store.manifest(), default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import os
+import threading
+
+
+COALESCE_TIMEOUT_SECONDS = float(os.environ.get("FLORAOS_COALESCE_TIMEOUT_SECONDS", "300"))
+
+
+class SingleFlightTimeout(TimeoutError):
+    pass
+
+
+class FlightAbandoned(Exception):
+    # Raised by `fn` to give up without a result (e.g. its query was cancelled because the
+    # run that started it was superseded). Waiters go round again instead of failing.
+    pass
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error", "abandoned", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.abandoned = False
+        self.waiters = 0
+
+
+class SingleFlight:
+    # Process-wide request coalescing. The first caller for a key runs `fn` on its own
+    # thread; callers that arrive while it is running wait for that result instead of
+    # starting the same work again. Errors are re-raised in every waiter.
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.shared = 0
+        self.timeouts = 0
+        self.peak_waiters = 0
+
+    def do(self, key, fn, timeout=COALESCE_TIMEOUT_SECONDS):
+        # Returns (result, shared), where shared is True for callers that waited
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+                    self.leaders += 1
+                else:
+                    flight.waiters += 1
+                    self.shared += 1
+                    self.peak_waiters = max(self.peak_waiters, flight.waiters)
+
+            if leader:
+                return self._lead(key, flight, fn), False
+
+            if not flight.done.wait(timeout):
+                with self._lock:
+                    self.timeouts += 1
+                    flight.waiters -= 1
+                raise SingleFlightTimeout(
+                    f"Timed out after {timeout:.0f}s waiting for an identical query to finish")
+            # A leader whose script run was stopped or whose query was cancelled (not a
+            # failed query) leaves no result; the waiters go round again and one takes over
+            if flight.abandoned:
+                continue
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._flights),
+                "leaders": self.leaders,
+                "shared": self.shared,
+                "timeouts": self.timeouts,
+                "peak_waiters": self.peak_waiters,
+            }
+
+    def _lead(self, key, flight, fn):
+        try:
+            flight.result = fn()
+            return flight.result
+        except FlightAbandoned:
+            flight.abandoned = True
+            raise
+        except Exception as e:
+            flight.error = e
+            raise
+        except BaseException:
+            flight.abandoned = True
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
@@ -0,0 +1,452 @@
+import argparse
+import datetime
+import html
+import importlib.util
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+
+import streamlit.config
+import streamlit.logger
+
+# Outside a running app Streamlit warns on every cache and script context lookup. Set
+# before the imports below, which also run first in every spawned render process.
+streamlit.config.set_option("global.showWarningOnDirectExecution", False)
+streamlit.config.set_option("logger.level", "error")
+streamlit.logger.set_log_level("error")
+
+from functions.disk_cache import DiskCache, disk_cache  # noqa: E402
+from functions.fanout import QueryFanout  # noqa: E402
+from functions.functions import (  # noqa: E402
+    AGE_BUCKETS,
+    CUSTOMER_CELL_PRECISION,
+    bin_customer_cells,
+    build_customer_map,
+    build_weekly_profitability_bar,
+    create_heatmap,
+    default_date_range,
+    display_inventory_aging,
+    display_leaderboards,
+    get_budtender_transaction_data,
+    get_customer_sales,
+    get_inventory_aging_index,
+    get_location_product_sales,
+    get_weekly_profitability,
+    render_budtender_charts,
+    split_by_location,
+)
+from functions.instrumentation import recorder  # noqa: E402
+from functions.query_cache import query_cache  # noqa: E402
+from functions.storage import DATA_DIR, write_text_atomic  # noqa: E402
+
+
+SNAPSHOT_DIR = os.path.join(DATA_DIR, "snapshots")
+# Drawing charts is CPU bound, so views render in separate processes rather than threads
+MAX_SNAPSHOT_WORKERS = int(os.environ.get("FLORAOS_MAX_SNAPSHOT_WORKERS", str(os.cpu_count() or 1)))
+
+# Each dashboard section, with the page and analysis type that show it
+SECTIONS = {
+    "Weekly profitability": ("Sales Analytics", "Profitability Analysis"),
+    "Customer map": ("Sales Analytics", "Customer Analysis"),
+    "Budtender metrics": ("Product Analytics", "Average Sale Amount"),
+    "Product leaderboards": ("Product Analytics", "Sales by Product"),
+    "Inventory aging": ("Product Analytics", "Sales by Product"),
+}
+
+COLOR_PATTERN = re.compile(r":(\w+)\[(.*?)\]")
+BOLD_PATTERN = re.compile(r"\*\*(.+?)\*\*")
+ITALIC_PATTERN = re.compile(r"\*(.+?)\*")
+HEADING_PATTERN = re.compile(r"(#{1,6})\s+(.*)")
+LIST_ITEM_PATTERN = re.compile(r"(\d+)\.\s+(.*)")
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<script src="plotly.min.js"></script>
+<style>
+body {{ font-family: sans-serif; margin: 2rem auto; max-width: 1200px; padding: 0 1rem; }}
+img {{ max-width: 100%; }}
+iframe {{ border: 0; width: 100%; height: 520px; }}
+table {{ border-collapse: collapse; font-size: 0.9rem; }}
+th, td {{ border: 1px solid #ddd; padding: 0.25rem 0.5rem; }}
+.warning {{ background: #fff8e1; padding: 0.75rem; }}
+</style>
+</head>
+<body>
+{body}
+</body>
+</html>
+"""
+
+
+def section_data(date_range):
+    # Fetched exactly as the pages fetch them, so every process shares the same cache entries
+    return {
+        "Weekly profitability": lambda: get_weekly_profitability(date_range),
+        "Customer map": lambda: get_customer_sales(date_range),
+        "Budtender metrics": lambda: get_budtender_transaction_data(date_range),
+        "Product leaderboards": lambda: get_location_product_sales(date_range),
+        "Inventory aging": get_inventory_aging_index,
+    }
+
+
+class SnapshotView:
+    __slots__ = ("section", "location")
+
+    def __init__(self, section, location=None):
+        self.section = section
+        self.location = location
+
+    @property
+    def page(self):
+        return SECTIONS[self.section][0]
+
+    @property
+    def analysis_type(self):
+        return SECTIONS[self.section][1]
+
+    @property
+    def title(self):
+        title = f"{self.analysis_type}: {self.section}"
+        return f"{title} ({self.location})" if self.location else title
+
+    @property
+    def file_stem(self):
+        parts = [self.page, self.section] + ([self.location] if self.location else [])
+        return "--".join(_slug(part) for part in parts)
+
+
+class SnapshotPage:
+    # Collects a view as static HTML, with the same calls the pages make on st. Images are
+    # written next to the page; plotly charts stay interactive and are also saved as PNG
+    # when the optional kaleido package is installed.
+
+    def __init__(self, directory, view, date_range):
+        self.directory = directory
+        self.view = view
+        self.date_range = date_range
+        self._body = []
+
+    def markdown(self, text):
+        self._body.append(markdown_html(text))
+
+    def warning(self, text):
+        self._body.append(f'<p class="warning">{html.escape(text)}</p>')
+
+    def image(self, png, name):
+        file_name = self._write_bytes(name, ".png", png)
+        self._body.append(f'<img src="{file_name}" alt="{html.escape(name)}">')
+
+    def plotly_chart(self, fig, name):
+        self._body.append(fig.to_html(full_html=False, include_plotlyjs=False))
+        if importlib.util.find_spec("kaleido") is not None:
+            self._write_bytes(name, ".png", fig.to_image(format="png"))
+
+    def pydeck_chart(self, deck, name):
+        # Map layers need their own document, with deck.gl inlined so it opens offline
+        file_name = self._write_bytes(name, ".html", deck.to_html(as_string=True, offline=True).encode())
+        self._body.append(f'<iframe src="{file_name}" title="{html.escape(name)}"></iframe>')
+
+    def dataframe(self, df):
+        self._body.append(df.to_html(index=False, border=0))
+
+    def write(self):
+        header = (
+            f"<h1>{html.escape(self.view.page)}</h1>\n"
+            f"<h2>{html.escape(self.view.title)}</h2>\n"
+            f"<p>{self.date_range[0]} to {self.date_range[1]}</p>"
+        )
+        path = os.path.join(self.directory, self.view.file_stem + ".html")
+        write_text_atomic(PAGE_TEMPLATE.format(
+            title=html.escape(self.view.title), body="\n".join([header, *self._body])), path)
+        return path
+
+    def _write_bytes(self, name, extension, data):
+        file_name = f"{self.view.file_stem}--{_slug(name)}{extension}"
+        with open(os.path.join(self.directory, file_name), "wb") as output_file:
+            output_file.write(data)
+        return file_name
+
+
+def markdown_html(text):
+    # The subset of Streamlit markdown the pages produce: headings, numbered lists, bold,
+    # italics and :color[...] spans
+    blocks = []
+    items = []
+    for line in text.splitlines():
+        line = line.strip()
+        item = LIST_ITEM_PATTERN.match(line)
+        if item:
+            # Ranks can repeat on ties, so each item keeps its own number
+            items.append(f'<li value="{item.group(1)}">{_inline_html(item.group(2))}</li>')
+            continue
+        if items:
+            blocks.append("<ol>" + "".join(items) + "</ol>")
+            items = []
+        heading = HEADING_PATTERN.match(line)
+        if heading:
+            level = len(heading.group(1))
+            blocks.append(f"<h{level}>{_inline_html(heading.group(2))}</h{level}>")
+        elif line:
+            blocks.append(f"<p>{_inline_html(line)}</p>")
+    if items:
+        blocks.append("<ol>" + "".join(items) + "</ol>")
+    return "\n".join(blocks)
+
+
+def _inline_html(text):
+    text = html.escape(text, quote=False)
+    text = COLOR_PATTERN.sub(r'<span style="color: \1">\2</span>', text)
+    text = BOLD_PATTERN.sub(r"<strong>\1</strong>", text)
+    return ITALIC_PATTERN.sub(r"<em>\1</em>", text)
+
+
+def _slug(text):
+    return re.sub(r"[^a-z0-9]+", "-", str(text).lower()).strip("-")
+
+
+def snapshot_weekly_profitability(page, df, date_range_text, location=None):
+    page.markdown(f"#### Below you will find insightful sale metrics :blue[*{date_range_text}*]")
+    if df is None or df.empty:
+        page.warning("No data available for the selected date range.")
+        return
+    page.plotly_chart(build_weekly_profitability_bar(df), "weekly profitability")
+
+
+def snapshot_customer_map(page, df, date_range_text, location=None):
+    page.markdown(f"#### Below you will find customer sale metrics :blue[*{date_range_text}*]")
+    if df is None or df.empty:
+        page.warning("No customer data available for the selected date range.")
+        return
+    page.markdown(
+        '#### The map below shows the :blue[density of customers] based on their home address.')
+    page.pydeck_chart(
+        build_customer_map(bin_customer_cells(df, CUSTOMER_CELL_PRECISION)), "customer map")
+
+
+def snapshot_budtender_metrics(page, df, date_range_text, location=None):
+    page.markdown(f"#### Below you will find product sale metrics :blue[*{date_range_text}*]")
+    if df is None or df.empty:
+        page.warning("No data available for the selected date range.")
+        return
+    for metric, title in (("AVERAGE_SALE_AMOUNT", "Average Sale Amount per Budtender"),
+                          ("TOTAL_TRANSACTIONS", "Total Transactions per Budtender")):
+        png, fig = render_budtender_charts(df, metric)
+        page.markdown(f"### {title}")
+        page.image(png, metric)
+        page.plotly_chart(fig, f"{metric} interactive")
+
+
+def snapshot_product_leaderboards(page, df, date_range_text, location=None):
+    df_location = split_by_location(df).get(location)
+    if df_location is None or df_location.empty:
+        page.warning("No data available for the selected date range.")
+        return
+    page.markdown(f"#### Below you will find the 10 best-selling products :blue[{date_range_text}]")
+    page.markdown(f"### :orange[{location.title()}] -  *Sales* and *Transactions* by Product")
+    for leaderboard in display_leaderboards(df_location):
+        page.markdown(leaderboard)
+    page.dataframe(df_location)
+
+
+def snapshot_inventory_aging(page, inventory_index, date_range_text, location=None):
+    if inventory_index is None or not len(inventory_index):
+        page.warning("No inventory aging data available.")
+        return
+    # The page's default filters: every category but edibles, aged the longest
+    bucket = AGE_BUCKETS[-1]
+    df_top_aged = inventory_index.top(
+        location=location, bucket=bucket, k=10, exclude_categories=("Edibles",))
+    page.markdown("### :blue[Inventory Aging]")
+    page.markdown(display_inventory_aging(df_top_aged, bucket))
+    if not df_top_aged.empty:
+        heatmap_png = create_heatmap(df_top_aged)
+        if heatmap_png is not None:
+            page.image(heatmap_png, "heatmap")
+
+
+SECTION_RENDERERS = {
+    "Weekly profitability": snapshot_weekly_profitability,
+    "Customer map": snapshot_customer_map,
+    "Budtender metrics": snapshot_budtender_metrics,
+    "Product leaderboards": snapshot_product_leaderboards,
+    "Inventory aging": snapshot_inventory_aging,
+}
+
+
+def prefetch(date_range):
+    # Every section's data is fetched once, side by side, before any view renders. The
+    # results land in the shared disk cache, so the render processes read them from there.
+    fanout = QueryFanout()
+    for name, load in section_data(date_range).items():
+        fanout.submit(name, load)
+    return dict(fanout.as_completed())
+
+
+def plan_views(data):
+    # One view per location for the sections that break down by location
+    views = []
+    for name in SECTIONS:
+        locations = [None]
+        if name == "Product leaderboards":
+            locations = list(split_by_location(data[name])) or [None]
+        elif name == "Inventory aging" and data[name] is not None:
+            locations = list(data[name].locations) or [None]
+        views += [SnapshotView(name, location) for location in locations]
+    return views
+
+
+def render_view(view, date_range, directory):
+    # Runs in a worker process
+    started = time.perf_counter()
+    since = time.time()
+    misses = query_cache.misses
+    page = SnapshotPage(directory, view, date_range)
+    date_range_text = f"for the time frame between {date_range[0]} and {date_range[1]}"
+    data = section_data(date_range)[view.section]()
+    SECTION_RENDERERS[view.section](page, data, date_range_text, view.location)
+    return {
+        "path": page.write(),
+        "seconds": time.perf_counter() - started,
+        "warehouse_queries": query_cache.misses - misses,
+        "query_errors": query_errors(since),
+    }
+
+
+def query_errors(since):
+    # The data helpers report failures with st.error, which draws nothing outside a page
+    return [
+        f"{event['section'] + ': ' if event['section'] else ''}{event['error']} running {event['label']}"
+        for event in list(recorder.events)
+        if event["kind"] == "query" and event["outcome"] == "error" and event["at"] >= since
+    ]
+
+
+def _init_worker(cache_dir):
+    query_cache.disk = DiskCache(cache_dir)
+
+
+@contextmanager
+def shared_cache_dir(cache_dir=None):
+    # The render processes share one query cache through its disk tier. Without one
+    # configured, a temporary directory serves this run.
+    if cache_dir is None and disk_cache is not None:
+        cache_dir = disk_cache.root
+    if cache_dir is not None:
+        yield cache_dir
+        return
+    with tempfile.TemporaryDirectory(prefix="floraos-snapshots-") as tmp_dir:
+        yield tmp_dir
+
+
+def build_snapshots(date_range, directory, workers=MAX_SNAPSHOT_WORKERS, cache_dir=None):
+    from plotly.offline import get_plotlyjs
+
+    started = time.perf_counter()
+    since = time.time()
+    tmp_dir = f"{directory}.tmp-{os.getpid()}"
+    with shared_cache_dir(cache_dir) as cache_dir:
+        query_cache.disk = DiskCache(cache_dir)
+        data = prefetch(date_range)
+        views = plan_views(data)
+        errors = query_errors(since)
+        prefetch_queries = query_cache.misses
+
+        os.makedirs(tmp_dir)
+        write_text_atomic(get_plotlyjs(), os.path.join(tmp_dir, "plotly.min.js"))
+        results = {}
+        # Spawned, not forked: this process already runs query and cursor threads
+        with ProcessPoolExecutor(max_workers=max(1, min(workers, len(views))),
+                                 mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(cache_dir,)) as pool:
+            futures = {pool.submit(render_view, view, date_range, tmp_dir): view for view in views}
+            for future in as_completed(futures):
+                view = futures[future]
+                try:
+                    results[view.file_stem] = future.result()
+                except Exception as e:
+                    errors.append(f"{view.title}: {e}")
+                    continue
+                errors += [f"{view.title}: {error}" for error in results[view.file_stem]["query_errors"]]
+
+    write_text_atomic(index_html(views, results, date_range), os.path.join(tmp_dir, "index.html"))
+    # The previous set for the same range is only replaced once the new one is complete
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.replace(tmp_dir, directory)
+    return {
+        "directory": directory,
+        "views": len(results),
+        "seconds": time.perf_counter() - started,
+        "warehouse_queries": prefetch_queries,
+        "worker_warehouse_queries": sum(result["warehouse_queries"] for result in results.values()),
+        "errors": errors,
+    }
+
+
+def index_html(views, results, date_range):
+    body = [f"<h1>Dashboard snapshots</h1>\n<p>{date_range[0]} to {date_range[1]}</p>"]
+    current_page = None
+    for view in views:
+        if view.page != current_page:
+            if current_page is not None:
+                body.append("</ul>")
+            body.append(f"<h2>{html.escape(view.page)}</h2>\n<ul>")
+            current_page = view.page
+        if view.file_stem in results:
+            body.append(f'<li><a href="{view.file_stem}.html">{html.escape(view.title)}</a></li>')
+        else:
+            body.append(f"<li>{html.escape(view.title)} (failed)</li>")
+    if current_page is not None:
+        body.append("</ul>")
+    return PAGE_TEMPLATE.format(title="Dashboard snapshots", body="\n".join(body))
+
+
+def month_range(month):
+    start = datetime.date.fromisoformat(f"{month}-01")
+    next_month = (start + datetime.timedelta(days=32)).replace(day=1)
+    return start, next_month - datetime.timedelta(days=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Render every dashboard view for a date range into static HTML and PNG.")
+    parser.add_argument("--month", help="Snapshot a whole month (YYYY-MM). Defaults to last month.")
+    parser.add_argument("--start", type=datetime.date.fromisoformat)
+    parser.add_argument("--end", type=datetime.date.fromisoformat)
+    parser.add_argument("--output", help="Directory for the snapshot set.")
+    parser.add_argument("--workers", type=int, default=MAX_SNAPSHOT_WORKERS,
+                        help="Processes rendering views in parallel.")
+    parser.add_argument("--cache-dir", help="Query cache directory shared by the workers.")
+    args = parser.parse_args()
+
+    if args.start or args.end:
+        if not (args.start and args.end):
+            parser.error("--start and --end go together")
+        date_range = (args.start, args.end)
+    elif args.month:
+        date_range = month_range(args.month)
+    else:
+        date_range = default_date_range()
+    directory = args.output or os.path.join(SNAPSHOT_DIR, f"{date_range[0]}_{date_range[1]}")
+
+    report = build_snapshots(date_range, directory, args.workers, args.cache_dir)
+    print(f"Rendered {report['views']} views for {date_range[0]} to {date_range[1]} into "
+          f"{report['directory']} in {report['seconds']:.1f}s "
+          f"({report['warehouse_queries']} warehouse queries, "
+          f"{report['worker_warehouse_queries']} from the render workers)")
+    for error in report["errors"]:
+        print(f"ERROR {error}", file=sys.stderr)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+import json
+import os
+import uuid
+
+
+DATA_DIR = os.environ.get("FLORAOS_DATA_DIR", os.path.join(os.getcwd(), ".floraos"))
+
+
+def write_parquet_atomic(df, path):
+    # Written next to the target and renamed into place, so readers never see a partial file
+    _write_atomic(path, lambda tmp_path: df.to_parquet(tmp_path, index=False))
+
+
+def write_json_atomic(data, path):
+    def write(tmp_path):
+        with open(tmp_path, "w") as json_file:
+            json.dump(data, json_file)
+    _write_atomic(path, write)
+
+
+def write_text_atomic(text, path):
+    def write(tmp_path):
+        with open(tmp_path, "w") as text_file:
+            text_file.write(text)
+    _write_atomic(path, write)
+
+
+def read_json(path):
+    try:
+        with open(path) as json_file:
+            return json.load(json_file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_atomic(path, write):
+    # The data dir is shared between replicas, whose containers often have the same PID, so
+    # every write gets its own temporary file
+    tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,123 @@
+import os
+import uuid
+import warnings
+
+from functions.dtypes import compact_dtypes, concat_compact
+from functions.query_executor import iter_query_batches
+from functions.storage import DATA_DIR
+
+
+STREAM_MEMORY_CEILING_BYTES = int(
+    os.environ.get("FLORAOS_STREAM_MEMORY_CEILING_MB", "512")) * 1024 * 1024
+SPILL_DIR = os.path.join(DATA_DIR, "spill")
+
+
+class StreamResult:
+    # `frame` holds the rows read before the memory ceiling was hit. Past the ceiling,
+    # `truncated` is set and, in spill mode, the remaining rows are in the Parquet file
+    # at `spill_path`. The spill file belongs to the result: use it as a context manager,
+    # or call close(), to remove it.
+
+    def __init__(self, frame, rows, nbytes, truncated=False, spill_path=None):
+        self.frame = frame
+        self.rows = rows
+        self.nbytes = nbytes
+        self.truncated = truncated
+        self.spill_path = spill_path
+
+    def close(self):
+        if self.spill_path is not None:
+            _remove_quietly(self.spill_path)
+            self.spill_path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class StreamTruncated(Exception):
+    # Raised instead of returning a frame cut short at the memory ceiling, so the partial
+    # rows are never cached as a complete result. `frame` holds the rows that were read.
+
+    def __init__(self, frame, rows):
+        super().__init__(f"Only the first {rows:,} rows were loaded to stay within the memory limit.")
+        self.frame = frame
+        self.rows = rows
+
+
+def fetch_frame(query, params=None, max_bytes=STREAM_MEMORY_CEILING_BYTES, on_limit="truncate"):
+    # Builds one compact frame from Arrow batches. Past `max_bytes`, "truncate" stops reading
+    # and "spill" keeps streaming the remaining batches to a Parquet file on disk.
+    if on_limit not in ("truncate", "spill"):
+        raise ValueError(f"on_limit must be 'truncate' or 'spill', not {on_limit!r}")
+
+    frames = []
+    rows = 0
+    nbytes = 0
+    spill_path = None
+    spill_writer = None
+    batches = iter_query_batches(query, params)
+    try:
+        for batch in batches:
+            if spill_writer is not None:
+                spill_writer.write_table(batch.cast(spill_writer.schema))
+                rows += batch.num_rows
+                continue
+
+            df_batch = compact_dtypes(batch.to_pandas())
+            batch_bytes = int(df_batch.memory_usage(deep=True).sum())
+
+            if nbytes + batch_bytes > max_bytes:
+                warnings.warn(
+                    f"Query result exceeded the {max_bytes // (1024 * 1024)} MB streaming ceiling "
+                    f"after {rows} rows; {'spilling to disk' if on_limit == 'spill' else 'truncating'}.",
+                    ResourceWarning,
+                )
+                if on_limit == "truncate":
+                    return StreamResult(concat_compact(frames), rows, nbytes, truncated=True)
+                import pyarrow.parquet as pq
+
+                os.makedirs(SPILL_DIR, exist_ok=True)
+                spill_path = os.path.join(SPILL_DIR, f"{uuid.uuid4().hex}.parquet")
+                # Snowflake sizes integer columns per batch, so the spill file uses int64 throughout
+                spill_writer = pq.ParquetWriter(spill_path, widen_integers(batch.schema))
+                spill_writer.write_table(batch.cast(spill_writer.schema))
+                rows += batch.num_rows
+                continue
+
+            frames.append(df_batch)
+            rows += len(df_batch)
+            nbytes += batch_bytes
+    except BaseException:
+        # A half-written spill file is no use to anyone
+        if spill_writer is not None:
+            spill_writer.close()
+            spill_writer = None
+        if spill_path is not None:
+            _remove_quietly(spill_path)
+        raise
+    finally:
+        batches.close()
+        if spill_writer is not None:
+            spill_writer.close()
+
+    return StreamResult(concat_compact(frames), rows, nbytes,
+                        truncated=spill_path is not None, spill_path=spill_path)
+
+
+def widen_integers(schema):
+    import pyarrow as pa
+
+    return pa.schema([
+        field.with_type(pa.int64()) if pa.types.is_integer(field.type) else field
+        for field in schema
+    ])
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,113 @@
+import datetime
+import os
+import threading
+
+import pandas as pd
+
+from functions.query_executor import execute_query
+from functions.storage import DATA_DIR, read_json, write_json_atomic, write_parquet_atomic
+
+
+RECONCILE_DAYS = int(os.environ.get("FLORAOS_RECONCILE_DAYS", "7"))
+RECONCILE_INTERVAL_HOURS = float(os.environ.get("FLORAOS_RECONCILE_INTERVAL_HOURS", "24"))
+REFRESH_INTERVAL_SECONDS = 15 * 60
+
+DELTA_QUERY = """
+    SELECT
+        CAST(TRANSACTIONDATE AS DATE) AS Transaction_Date,
+        TRANSACTIONID, TOTAL
+    FROM FLORAOS.BLUE_SAGE.DUTCHIE_TRANSACTIONS
+    WHERE TRANSACTIONDATE >= %(since)s
+"""
+
+
+class TransactionWindowStore:
+    # Keeps the trailing year of raw transactions on disk. Each refresh only fetches rows
+    # from the watermark day onwards and drops rows that have aged out of the window.
+    # Every RECONCILE_INTERVAL_HOURS the last RECONCILE_DAYS are fetched again, which
+    # picks up late-arriving rows and corrected or voided totals.
+
+    def __init__(self, root=os.path.join(DATA_DIR, "transactions"),
+                 reconcile_days=RECONCILE_DAYS, reconcile_interval_hours=RECONCILE_INTERVAL_HOURS):
+        self.root = root
+        self.reconcile_days = reconcile_days
+        self.reconcile_interval = datetime.timedelta(hours=reconcile_interval_hours)
+        self._lock = threading.Lock()
+        self._rows_path = os.path.join(root, "trailing_year.parquet")
+        self._state_path = os.path.join(root, "state.json")
+
+    def state(self):
+        state = read_json(self._state_path)
+        if state is None:
+            return None
+        return {
+            "window_start": datetime.date.fromisoformat(state["window_start"]),
+            "watermark": datetime.date.fromisoformat(state["watermark"]),
+            "refreshed_at": datetime.datetime.fromisoformat(state["refreshed_at"]),
+            "reconciled_at": datetime.datetime.fromisoformat(state["reconciled_at"]),
+        }
+
+    def get(self, max_age_seconds=REFRESH_INTERVAL_SECONDS):
+        state = self.state()
+        if state is not None and state["window_start"] == self.window_start():
+            age = datetime.datetime.now() - state["refreshed_at"]
+            if age.total_seconds() < max_age_seconds:
+                df = self.load()
+                if df is not None:
+                    return df
+        return self.refresh()
+
+    def load(self):
+        try:
+            return pd.read_parquet(self._rows_path)
+        except OSError:
+            return None
+
+    def refresh(self, today=None, reconcile=None):
+        with self._lock:
+            today = today or datetime.date.today()
+            now = datetime.datetime.now()
+            window_start = self.window_start(today)
+            state = self.state()
+            df_existing = self.load() if state is not None else None
+
+            if df_existing is None or state["window_start"] > window_start:
+                since = window_start
+                reconcile = True
+                df_existing = None
+            else:
+                since = state["watermark"]
+                if reconcile is None:
+                    reconcile = now - state["reconciled_at"] >= self.reconcile_interval
+                if reconcile:
+                    since = min(since, today - datetime.timedelta(days=self.reconcile_days))
+
+            df_new = execute_query(DELTA_QUERY, {"since": since})
+            df_new["TRANSACTION_DATE"] = pd.to_datetime(df_new["TRANSACTION_DATE"])
+
+            frames = [df_new]
+            if df_existing is not None:
+                frames.insert(0, df_existing.loc[df_existing["TRANSACTION_DATE"] < pd.Timestamp(since)])
+            df = (
+                pd.concat(frames, ignore_index=True)
+                .drop_duplicates(subset="TRANSACTIONID", keep="last")
+            )
+            df = df.loc[df["TRANSACTION_DATE"] >= pd.Timestamp(window_start)].reset_index(drop=True)
+
+            watermark = df["TRANSACTION_DATE"].max().date() if not df.empty else since
+            os.makedirs(self.root, exist_ok=True)
+            write_parquet_atomic(df, self._rows_path)
+            write_json_atomic({
+                "window_start": window_start.isoformat(),
+                "watermark": watermark.isoformat(),
+                "refreshed_at": now.isoformat(),
+                "reconciled_at": (now if reconcile else state["reconciled_at"]).isoformat(),
+            }, self._state_path)
+            return df
+
+    def window_start(self, today=None):
+        today = today or datetime.date.today()
+        return (pd.Timestamp(today) - pd.DateOffset(years=1)).date()
+
+
+transaction_window = TransactionWindowStore()
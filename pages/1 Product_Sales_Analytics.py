@@ -6,19 +6,13 @@ import datetime
 import plotly.express as px
 import plotly.graph_objects as go
 from Functions import *
+from functions.query_executor import execute_query
 import seaborn as sns
 
 st. set_page_config(layout='wide', initial_sidebar_state='expanded')
 
 def run_query(query):
-    #with get_snowflake_connection() as conn:
-    conn = st.connection("snowflake")
-    cur = conn.cursor()
-    cur.execute(query)
-    df = cur.fetch_pandas_all()
-    #return pd.read_sql(query, conn)
-    return df
-    #return pd.read_sql(query, conn)
+    return execute_query(query)
 
 
 def load_page():
@@ -1,16 +1,27 @@
-import datetime
+import time
 import streamlit as st
-import matplotlib.pyplot as plt
-import plotly.express as px
-import plotly.graph_objects as go
-import seaborn as sns
 from functions.functions import (
     get_budtender_transaction_data,
-    display_popular_products_by_sales,
-    display_popular_products_by_transactions,
-    get_Lebanon_data,
-    display_inventory_aging
+    display_leaderboards,
+    get_location_product_sales,
+    split_by_location,
+    get_inventory_aging_index,
+    display_inventory_aging,
+    create_heatmap,
+    AGE_BUCKETS,
+    render_budtender_charts,
+    render_diagnostics_panel,
+    default_date_range,
+    loading_status,
+    show_loading,
+    get_store_locations
 )
+from functions.export import EXPORT_FORMATS, export_manager
+from functions.fanout import QueryFanout
+from functions.fragments import page_fragment
+from functions.instrumentation import current_session_id, section
+from functions.prewarm import start_prewarmer
+from functions.query_executor import cancel_superseded_queries, superseded_queries
 
 # Set page configuration with error handling
 try:
@@ -18,35 +29,167 @@ try:
 except Exception as e:
     st.error(f"Error setting page configuration: {e}")
 
-
-def run_query(query):
-    try:
-        conn = st.connection("snowflake")
-        cur = conn.cursor()
-        cur.execute(query)
-        df = cur.fetch_pandas_all()
-        return df
-    except Exception as e:
-        st.error(f"Error running query: {e}")
-        return None
+start_prewarmer()
+
+
+@page_fragment("Budtender metrics")
+def render_budtender_metrics(df_budtender, date_range_text):
+    st.markdown(
+        f"#### Below you will find product sale metrics :blue[*{date_range_text}*]")
+    if df_budtender is None or df_budtender.empty:
+        st.warning("No data available for the selected date range.")
+        return
+
+    sales_png, sales_fig = render_budtender_charts(df_budtender, "AVERAGE_SALE_AMOUNT")
+    transactions_png, transactions_fig = render_budtender_charts(df_budtender, "TOTAL_TRANSACTIONS")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("### Average Sale Amount per Budtender")
+        st.image(sales_png)
+    with col2:
+        st.markdown("### Total Transactions per Budtender")
+        st.image(transactions_png)
+
+    st.markdown(
+        "### :blue[Different Scheme] for Average Sale Amount and Total Transactions per Budtender")
+    col1, col2 = st.columns(2)
+    col1.plotly_chart(sales_fig)
+    col2.plotly_chart(transactions_fig)
+
+
+@page_fragment("Product leaderboards")
+def render_product_leaderboards(df_products, date_range_text):
+    if df_products is None or df_products.empty:
+        st.warning("No data available for the selected date range.")
+        return
+
+    st.markdown(
+        f"#### Below you will find the 10 best-selling products :blue[{date_range_text}]")
+    st.markdown(
+        "##### *You can change the time frame by changing the date range in the sidebar*")
+    st.markdown("\n\n")
+
+    for location, df_location in split_by_location(df_products).items():
+        location_name = location.title()
+        st.markdown(
+            f"### :orange[{location_name}] -  *Sales* and *Transactions* by Product")
+        with st.expander(f"Please expand to see the {location_name} Sales and Product data"):
+            col = st.columns((1, 1, 1), gap='small')
+            popular_sales_markdown, popular_transactions_markdown = display_leaderboards(df_location)
+            with col[0]:
+                st.markdown(popular_sales_markdown)
+            with col[1]:
+                st.markdown(popular_transactions_markdown)
+            with col[2]:
+                st.dataframe(df_location)
+
+
+# Its filters rerun only this section, against the index the page already built
+@page_fragment("Inventory aging")
+def render_inventory_aging(inventory_index):
+    if inventory_index is None or not len(inventory_index):
+        st.warning("No inventory aging data available.")
+        return
+
+    st.markdown("### :blue[Inventory Aging]")
+    st.markdown(
+        "##### *Below you will find which Cannabis products have been in inventory the longest*")
+    with st.expander("Please expand to see the Inventory Aging data"):
+        col = st.columns((1, 1, 1, 1), gap='small')
+        location = col[0].selectbox("Location", inventory_index.locations, key="aging_location")
+        category = col[1].selectbox(
+            "Category", ["All categories", *inventory_index.categories], key="aging_category")
+        bucket = col[2].selectbox(
+            "Age (days)", AGE_BUCKETS, index=AGE_BUCKETS.index("121+"), key="aging_bucket")
+        exclude_edibles = col[3].checkbox("Exclude edibles", value=True, key="aging_exclude_edibles")
+
+        df_top_aged = inventory_index.top(
+            location=location,
+            category=None if category == "All categories" else category,
+            bucket=bucket,
+            k=10,
+            exclude_categories=("Edibles",) if exclude_edibles else (),
+        )
+        st.markdown(display_inventory_aging(df_top_aged, bucket))
+        if not df_top_aged.empty:
+            heatmap_png = create_heatmap(df_top_aged)
+            if heatmap_png is not None:
+                st.image(heatmap_png)
+
+
+@page_fragment("Transaction export", key="transaction_export")
+def render_transaction_export(date_range, date_range_text, locations):
+    st.markdown("### :blue[Export]")
+    with st.expander(f"Please expand to export every item sold {date_range_text}"):
+        col = st.columns((2, 1, 1), vertical_alignment="bottom")
+        selected = col[0].multiselect(
+            "Locations", locations, placeholder="All locations", key="export_locations")
+        file_format = col[1].selectbox("Format", list(EXPORT_FORMATS), key="export_format")
+        if col[2].button("Start export", key="export_start"):
+            export_manager.start(current_session_id(), date_range, selected, file_format)
+
+        # Exports run in the background; the list only polls while one is running
+        if export_manager.has_active(current_session_id()):
+            render_export_progress()
+        else:
+            render_export_jobs()
+
+
+# Streamlit stops this timer only when the export section reruns without it, so once
+# the jobs finish it keeps redrawing the list, which reads no data, until the next click
+# in the section. Rerunning the page to stop it would redo every section above.
+@page_fragment("Export progress", run_every=1)
+def render_export_progress():
+    render_export_jobs()
+
+
+def rerun_transaction_export():
+    st.rerun("transaction_export")
+
+
+def render_export_jobs():
+    for job in reversed(export_manager.jobs(current_session_id())):
+        label = f"{job.file_format} of {job.date_range[0]} to {job.date_range[1]}"
+        if job.locations:
+            label += f" ({', '.join(job.locations)})"
+        if job.active:
+            total = f"{job.total_rows:,}" if job.total_rows is not None else "..."
+            col1, col2 = st.columns((4, 1), vertical_alignment="bottom")
+            col1.progress(job.progress(), text=f"{label}: {job.rows:,} of {total} rows")
+            col2.button("Cancel", key=f"export_cancel_{job.job_id}", on_click=job.cancel)
+        elif job.status == "done":
+            # A file is read when its button is clicked, not on every rerun, and the click
+            # reruns only the export section. Large exports come in several parts.
+            for number, part in enumerate(job.parts, start=1):
+                rows = f"{part.rows:,} rows"
+                if len(job.parts) > 1:
+                    rows = f"part {number} of {len(job.parts)}, {rows}"
+                st.download_button(
+                    f"Download {label}, {rows}", data=part.read_bytes,
+                    file_name=part.file_name, mime=job.mime,
+                    key=f"export_download_{job.job_id}_{number}", on_click=rerun_transaction_export)
+        elif job.status == "empty":
+            st.caption(f"{label}: no items were sold in this range.")
+        elif job.status == "cancelled":
+            st.caption(f"{label}: cancelled.")
+        else:
+            st.error(f"Export {label} failed: {job.error}")
 
 
 def load_page():
+    run_started = time.time()
+    # Queries an earlier run of this session left running are cancelled at the end of this
+    # one, unless it joined them because it asked for the same results
+    superseded = superseded_queries()
     try:
         st.title(':blue[Product Analytics]')
 
-        # Get today's date
-        today = datetime.date.today()
-
-        # Calculate the last month's date range
-        last_month_end = today.replace(day=1) - datetime.timedelta(days=1)
-        last_month_start = last_month_end.replace(day=1)
-
         # Default to the last month's date range
+        last_month_start, last_month_end = default_date_range()
         date_range = st.sidebar.date_input("Select Date Range", value=[
                                            last_month_start, last_month_end], key="date_range", max_value=last_month_end)
 
-        query_date_filter = f"WHERE transactiondate BETWEEN '{date_range[0]}' AND '{date_range[1]}'" if date_range else ""
         date_range_text = f"for the time frame between {date_range[0]} and {date_range[1]}"
 
         # Sidebar for selecting analytics
@@ -56,208 +199,45 @@ def load_page():
             ('Sales by Product', 'Average Sale Amount')
         )
 
-        if analysis_type == 'Average Sale Amount':
-            st.markdown(
-                f"#### Below you will find product sale metrics :blue[*{date_range_text}*]")
-            df_budtender = get_budtender_transaction_data(query_date_filter)
-
-            if df_budtender is not None and not df_budtender.empty:
-                col1, col2 = st.columns(2)
-
-                with col1:
-                    st.markdown("### Average Sale Amount per Budtender")
-                    df_sorted_sales = df_budtender.sort_values(
-                        by="AVERAGE_SALE_AMOUNT", ascending=False)
-                    df_sorted_sales["AVERAGE_SALE_AMOUNT"] = df_sorted_sales["AVERAGE_SALE_AMOUNT"].apply(
-                        lambda x: f"${x:.2f}")
-
-                    plt.figure(figsize=(10, 5))
-                    sns.barplot(data=df_sorted_sales,
-                                x="AVERAGE_SALE_AMOUNT", y="BUDTENDER", color="c")
-                    plt.xlabel("Average Sale Amount ($)")
-                    plt.ylabel("Budtender")
-                    plt.title("Average Sale Amount per Budtender")
-                    st.pyplot(plt)
-
-                with col2:
-                    st.markdown("### Total Transactions per Budtender")
-                    df_sorted_transactions = df_budtender.sort_values(
-                        by="TOTAL_TRANSACTIONS", ascending=False)
-                    plt.figure(figsize=(10, 5))
-                    sns.barplot(data=df_sorted_transactions,
-                                x="TOTAL_TRANSACTIONS", y="BUDTENDER", color="m")
-                    plt.xlabel("Total Transactions")
-                    plt.ylabel("Budtender")
-                    plt.title("Total Transactions per Budtender")
-                    st.pyplot(plt)
-
-                # Plotly Visualization: Average Sale Amount
-                fig1 = px.bar(
-                    df_sorted_sales,
-                    x="AVERAGE_SALE_AMOUNT",
-                    y="BUDTENDER",
-                    title="Average Sale Amount per Budtender",
-                    labels={
-                        "AVERAGE_SALE_AMOUNT": "Average Sale Amount ($)", "BUDTENDER": "Budtender"},
-                    orientation="h",
-                    color="AVERAGE_SALE_AMOUNT",
-                    color_continuous_scale="Viridis",
-                )
-
-                # Plotly Visualization: Total Transactions
-                fig2 = px.bar(
-                    df_sorted_transactions,
-                    x="TOTAL_TRANSACTIONS",
-                    y="BUDTENDER",
-                    title="Total Transactions per Budtender",
-                    labels={"TOTAL_TRANSACTIONS": "Total Transactions",
-                            "BUDTENDER": "Budtender"},
-                    orientation="h",
-                    color="TOTAL_TRANSACTIONS",
-                    color_continuous_scale="Magma",
-                )
-
-                st.markdown(
-                    "### :blue[Different Scheme] for Average Sale Amount and Total Transactions per Budtender")
-                col1, col2 = st.columns(2)
-                col1.plotly_chart(fig1)
-                col2.plotly_chart(fig2)
-            else:
-                st.warning("No data available for the selected date range.")
-
-        if analysis_type == 'Sales by Product':
-            query = f"""
-                    SELECT
-                    p.productname,
-                    p.location,
-                    SUM(i.totalprice) AS total_sales,
-                    COUNT(DISTINCT i.transactionid) AS total_transactions
-                    FROM
-                    FLORAOS.BLUE_SAGE.flattened_itemsv_blue_sage_04_28_2024 AS i
-                    JOIN FLORAOS.BLUE_SAGE.dutchie_inventory AS p ON i.productid = p.productid
-                    JOIN FLORAOS.BLUE_SAGE.dutchie_transactions AS t ON i.transactionid = t.transactionid
-                    {query_date_filter}
-                    AND p.location = 'carthage'
-                    GROUP BY
-                    p.productname,
-                    p.location
-                    ORDER BY
-                    total_sales DESC
-                    LIMIT 10;
-                    """
-            df = run_query(query)
-            if df is not None and not df.empty:
-                st.markdown(
-                    f"#### Below you will find the 10 best-selling products :blue[{date_range_text}]")
-                st.markdown(
-                    "##### *You can change the time frame by changing the date range in the sidebar*")
-                st.markdown("\n\n")
-
-                bar_chart = go.Figure(
-                    data=[
-                        go.Bar(
-                            x=df["PRODUCTNAME"],
-                            y=df["TOTAL_SALES"],
-                            text=df["TOTAL_SALES"].apply(
-                                lambda x: f"${x:.2f}"),
-                            textposition="auto",
-                            marker_color="royalblue",
-                        )
-                    ]
-                )
-
-                bar_chart.update_layout(
-                    title="Top Selling Products for Carthage",
-                    xaxis_title="Product Name",
-                    yaxis_title="Total Sales ($)",
-                    xaxis_tickangle=45,
-                    yaxis_tickformat="$",
-                    margin=dict(l=60, r=60, b=100, t=60),
-                )
-
-                popular_sales_markdown = display_popular_products_by_sales(df)
-                popular_transactions_markdown = display_popular_products_by_transactions(
-                    df)
-
-                st.markdown(
-                    "### :orange[Carthage] -  *Sales* and *Transactions* by Product")
-                with st.expander("Please expand to see the Carthage Sales and Product data"):
-                    col = st.columns((1, 1, 1), gap='small')
-                    with col[0]:
-                        st.markdown(popular_sales_markdown)
-                    with col[1]:
-                        st.markdown(popular_transactions_markdown)
-                    with col[2]:
-                        st.dataframe(df)
-
-                st.markdown(
-                    "### :orange[Lebanon] -  *Sales* and *Transactions* by Product")
-                with st.expander("Please expand to see the Lebanon Sales and Product data"):
-                    col = st.columns((1, 1, 1), gap='small')
-
-                    df_lebanon = get_Lebanon_data(query_date_filter)
-                    if df_lebanon is not None and not df_lebanon.empty:
-                        with col[0]:
-                            st.markdown(
-                                display_popular_products_by_sales(df_lebanon))
-                        with col[1]:
-                            st.markdown(
-                                display_popular_products_by_transactions(df_lebanon))
-                        with col[2]:
-                            st.dataframe(df_lebanon)
-                    else:
-                        st.warning(
-                            "No data available for Lebanon for the selected date range.")
-
-                @st.cache_data
-                def get_Inventory_Aging_data():
-                    query = """
-                            SELECT
-                            SPLIT_PART (LOCATION, ' - ', 2) AS LOCATION,
-                            PRODUCT, CATEGORY, MASTERCATEGORY, CANNABISINVENTORY, 
-                            "0-30", "31-60", "61-90", "91-120", "121+" 
-                            FROM floraos.blue_sage.report_inventory_aging_may_7_24
-                            """
-                    return run_query(query)
-
-                df_inventory_aging = get_Inventory_Aging_data()
-                if df_inventory_aging is not None and not df_inventory_aging.empty:
-                    st.markdown("### :blue[Inventory Aging]")
-                    st.markdown(
-                        "##### *Below you will find which non-edible Cannabis products have been in inventory for 121+ days*")
-                    with st.expander("Please expand to see the Inventory Aging data"):
-                        df_filtered = df_inventory_aging[df_inventory_aging["CANNABISINVENTORY"]]
-                        df_products_with_large_inventory_Lebanon = (
-                            df_filtered[
-                                (df_filtered['LOCATION'] == 'Lebanon (SMO5)') &
-                                (df_filtered['CATEGORY'] != 'Edibles')
-                            ]
-                            .sort_values(by="121+", ascending=False)
-                            .head(10)
-                        )
-
-                        df_products_with_large_inventory_Carthage = (
-                            df_filtered[
-                                (df_filtered['LOCATION'] == 'Carthage (SMO4)') &
-                                (df_filtered['CATEGORY'] == 'Flower')
-                            ]
-                            .sort_values(by="121+", ascending=False)
-                            .head(10)
-                        )
-
-                        carthage_inventory_markdown = display_inventory_aging(
-                            df_products_with_large_inventory_Carthage)
-                        st.markdown(carthage_inventory_markdown)
-
-                        lebanon_inventory_markdown = display_inventory_aging(
-                            df_products_with_large_inventory_Lebanon)
-                        st.markdown(lebanon_inventory_markdown)
-                else:
-                    st.warning("No inventory aging data available.")
-            else:
-                st.warning("No data available for the selected date range.")
+        # Only the sidebar reruns the whole page. Each section is a fragment fed the data
+        # it shows, so its own widgets rerun just that section.
+        with section(analysis_type):
+            if analysis_type == 'Average Sale Amount':
+                with loading_status("budtender metrics"):
+                    df_budtender = get_budtender_transaction_data(date_range)
+                render_budtender_metrics(df_budtender, date_range_text)
+
+            if analysis_type == 'Sales by Product':
+                # Both sections are independent, so their queries run side by side and each
+                # section is filled in as soon as its own result arrives.
+                fanout = QueryFanout()
+                fanout.submit("products", get_location_product_sales, date_range)
+                fanout.submit("inventory_aging", get_inventory_aging_index)
+                sections = {
+                    "products": st.container(),
+                    "inventory_aging": st.container(),
+                }
+                labels = {"products": "product sales", "inventory_aging": "inventory aging"}
+                waiting = {name: container.empty() for name, container in sections.items()}
+
+                def show_waiting(pending, elapsed):
+                    for name in pending:
+                        show_loading(waiting[name], labels[name], elapsed)
+
+                for name, result in fanout.as_completed(on_wait=show_waiting):
+                    waiting[name].empty()
+                    with sections[name]:
+                        if name == "products":
+                            render_product_leaderboards(result, date_range_text)
+                        else:
+                            render_inventory_aging(result)
+
+        render_transaction_export(date_range, date_range_text, get_store_locations())
+
+        render_diagnostics_panel(run_started)
     except Exception as e:
         st.error(f"An error occurred: {e}")
+    cancel_superseded_queries(superseded)
 
 
 load_page()
@@ -1,7 +1,13 @@
 import streamlit as st
-import datetime
-import plotly.express as px
-from functions.functions import (get_weekly_profitability, get_customer_sales)
+import time
+from functions.functions import (
+    get_weekly_profitability, get_customer_sales, bin_customer_cells, CUSTOMER_CELL_PRECISION,
+    build_weekly_profitability_bar, build_customer_map, render_diagnostics_panel,
+    default_date_range, loading_status)
+from functions.fragments import page_fragment
+from functions.instrumentation import section
+from functions.prewarm import start_prewarmer
+from functions.query_executor import cancel_superseded_queries, superseded_queries
 
 # Set page configuration with error handling
 try:
@@ -10,50 +16,73 @@ try:
 except Exception as e:
     st.error(f"Error setting page configuration: {e}")
 
+start_prewarmer()
+
+
+@page_fragment("Weekly profitability")
+def render_weekly_profitability(df_weekly_profitability, date_range_text):
+    st.markdown(
+        f"#### Below you will find insightful sale metrics :blue[*{date_range_text}*]")
+    st.plotly_chart(build_weekly_profitability_bar(df_weekly_profitability), use_container_width=True)
+
+
+@page_fragment("Customer map")
+def render_customer_map(df_customer_sales, date_range_text):
+    st.markdown(
+        f"#### Below you will find customer sale metrics :blue[*{date_range_text}*]")
+    if df_customer_sales is None or df_customer_sales.empty:
+        st.warning(
+            "No customer data available for the selected date range.")
+        return
+
+    # Changing these redraws the map from the customer rows already fetched
+    col1, col2 = st.columns(2)
+    cell_size = col1.select_slider(
+        "Map cell size", options=["~1 km", "~10 km"], value="~1 km", key="map_cell_size")
+    weight = col2.radio("Map density by", ("Customers", "Revenue"), horizontal=True,
+                        key="map_weight")
+    df_cells = bin_customer_cells(
+        df_customer_sales,
+        CUSTOMER_CELL_PRECISION if cell_size == "~1 km" else CUSTOMER_CELL_PRECISION - 1)
+    st.markdown(
+        '#### The map below shows the :blue[density of customers] based on their home address.')
+    st.pydeck_chart(build_customer_map(df_cells, weight))
+
 
 def load_page():
+    run_started = time.time()
+    # Queries an earlier run of this session left running are cancelled at the end of this
+    # one, unless it joined them because it asked for the same results
+    superseded = superseded_queries()
     try:
         st.title(':blue[Sales Analytics]')
-        today = datetime.date.today()
-        last_month_end = today.replace(day=1) - datetime.timedelta(days=1)
-        last_month_start = last_month_end.replace(
-            day=1)
+        last_month_start, last_month_end = default_date_range()
         date_range = st.sidebar.date_input("Select Date Range", value=[
                                            last_month_start, last_month_end], key="date_range")
 
-        query_date_filter = f"WHERE transactiondate BETWEEN '{date_range[0]}' AND '{date_range[1]}'" if date_range else ""
         date_range_text = f"for the time frame between {date_range[0]} and {date_range[1]}"
         st.sidebar.header('Analytics Options')
         analysis_type = st.sidebar.radio(
             "Select Analysis Type",
             ('Profitability Analysis', 'Customer Analysis',))
 
-        if analysis_type == 'Profitability Analysis':
-            st.markdown(
-                f"#### Below you will find insightful sale metrics :blue[*{date_range_text}*]")
-            df_weekly_profitability = get_weekly_profitability(
-                query_date_filter)
-            fig1 = px.bar(df_weekly_profitability, x='DAY_OF_WEEK', y='TOTAL_REVENUE',
-                          title='This chart shows which days of the week are the most profitable')
-            st.plotly_chart(fig1, use_container_width=True)
-
-        if analysis_type == 'Customer Analysis':
-            query_date_filter = f"WHERE CREATIONDATE BETWEEN '{date_range[0]}' AND '{date_range[1]}'" if date_range else ""
-            st.markdown(
-                f"#### Below you will find customer sale metrics :blue[*{date_range_text}*]")
-            df_customer_sales = get_customer_sales(query_date_filter)
-            if df_customer_sales is not None and not df_customer_sales.empty:
-                df_customer_sales = df_customer_sales.dropna(
-                    subset=['LATITUDE', 'LONGITUDE'])
-                st.markdown(
-                    '#### The map below shows the :blue[location of customers] based on their home address.')
-                st.map(
-                    df_customer_sales[['LATITUDE', 'LONGITUDE']].astype(float))
-            else:
-                st.warning(
-                    "No customer data available for the selected date range.")
+        # Only the sidebar reruns the whole page. Each section is a fragment fed the frames
+        # it shows, so its own widgets rerun just that section.
+        with section(analysis_type):
+            if analysis_type == 'Profitability Analysis':
+                with loading_status("weekly profitability"):
+                    df_weekly_profitability = get_weekly_profitability(date_range)
+                render_weekly_profitability(df_weekly_profitability, date_range_text)
+
+            if analysis_type == 'Customer Analysis':
+                with loading_status("customer locations"):
+                    df_customer_sales = get_customer_sales(date_range)
+                render_customer_map(df_customer_sales, date_range_text)
+
+        render_diagnostics_panel(run_started)
     except Exception as e:
         st.error(f"An error occurred: {e}")
+    cancel_superseded_queries(superseded)
 
 
 load_page()
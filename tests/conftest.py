@@ -0,0 +1,28 @@
+import datetime
+
+import pytest
+
+from benchmarks.synthetic_data import generate
+from functions import local_warehouse, query_executor
+from functions.query_executor import CursorPool
+
+
+# The synthetic data ends here, so date windows in the tests never depend on today
+END_DATE = datetime.date(2026, 6, 30)
+
+
+@pytest.fixture(scope="session")
+def warehouse_path(tmp_path_factory):
+    # A small DuckDB stand-in for the warehouse, built once for the whole run
+    path = tmp_path_factory.mktemp("warehouse") / "floraos.duckdb"
+    generate(str(path), transactions=5_000, days=120, seed=7, end_date=END_DATE)
+    return str(path)
+
+
+@pytest.fixture
+def pool(warehouse_path, monkeypatch):
+    # A fresh pool for each test, so pool statistics start at zero
+    pool = CursorPool(lambda: local_warehouse.connect(warehouse_path), size=2, acquire_timeout=5)
+    monkeypatch.setattr(query_executor, "cursor_pool", pool)
+    yield pool
+    pool.close()
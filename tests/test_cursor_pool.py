@@ -0,0 +1,71 @@
+import threading
+import time
+
+import pytest
+
+from functions.local_warehouse import LocalQueryError
+from functions.query_executor import execute_query, query_registry
+
+
+# Runs for minutes unless it is aborted
+SLOW_QUERY = "SELECT SUM(i * i) AS TOTAL FROM range(100000000000) AS t(i)"
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out waiting for the query to start")
+        time.sleep(0.01)
+
+
+def test_aborted_query_releases_its_cursor(pool):
+    outcome = []
+
+    def run():
+        try:
+            outcome.append(execute_query(SLOW_QUERY))
+        except Exception as e:
+            outcome.append(e)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    wait_for(query_registry.in_flight)
+    query_id = query_registry.in_flight()[0]
+    # Cancelled from a second cursor, the way a superseded run's query is
+    with pool.cursor() as cur:
+        assert cur.abort_query(query_id)
+    thread.join(10)
+
+    assert not thread.is_alive()
+    assert isinstance(outcome[0], LocalQueryError)
+    assert query_registry.in_flight() == []
+    stats = pool.stats()
+    # The aborted query's cursor is discarded, the one that aborted it is back in the pool
+    assert (stats["in_use"], stats["open"], stats["idle"], stats["discarded"]) == (0, 1, 1, 1)
+
+    assert execute_query("SELECT 42 AS ANSWER")["ANSWER"].tolist() == [42]
+    stats = pool.stats()
+    assert (stats["in_use"], stats["open"], stats["idle"], stats["checkouts"]) == (0, 1, 1, 3)
+
+
+def test_cursor_is_reused_after_aborting_a_finished_query(pool):
+    with pool.cursor() as cur:
+        cur.execute_async("SELECT 1")
+        query_id = cur.sfqid
+        cur.get_results_from_sfqid(query_id)
+        assert not cur.abort_query(query_id)
+    first = cur
+
+    with pool.cursor() as cur:
+        assert cur is first
+        assert cur.execute("SELECT 2").fetchall() == [(2,)]
+    assert pool.stats()["discarded"] == 0
+
+
+def test_failed_query_does_not_leak_a_cursor(pool):
+    for _ in range(pool.size + 1):
+        with pytest.raises(LocalQueryError):
+            execute_query("SELECT * FROM FLORAOS.BLUE_SAGE.NO_SUCH_TABLE")
+    stats = pool.stats()
+    assert (stats["in_use"], stats["open"], stats["timeouts"]) == (0, 0, 0)
@@ -0,0 +1,50 @@
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from functions.dtypes import compact_dtypes, concat_compact
+
+
+def test_decimals_become_floats_only_when_exact():
+    df = compact_dtypes(pd.DataFrame({
+        "TOTAL": [Decimal("19.99"), Decimal("4.50"), None],
+        # More significant digits than a double holds
+        "LEDGER_ID": [Decimal("12345678901234567890"), Decimal("1"), Decimal("2")],
+    }))
+
+    assert df["TOTAL"].dtype == np.float64
+    assert df["TOTAL"].iloc[:2].tolist() == [19.99, 4.5]
+    assert df["LEDGER_ID"].dtype == object
+    assert df["LEDGER_ID"].iloc[0] == Decimal("12345678901234567890")
+
+
+def test_compaction_is_lossless():
+    df = pd.DataFrame({
+        "LOCATION": ["lebanon", "carthage"] * 50,
+        "CANNABISINVENTORY": ["TRUE", "false"] * 50,
+        "QUANTITY": np.arange(100, dtype=np.int64),
+        "WEIGHT": np.full(100, 3.5),
+        "PRICE": np.full(100, 19.99),
+    })
+    compact = compact_dtypes(df.copy())
+
+    assert isinstance(compact["LOCATION"].dtype, pd.CategoricalDtype)
+    assert compact["CANNABISINVENTORY"].dtype == bool
+    assert compact["QUANTITY"].dtype == np.int8
+    assert compact["WEIGHT"].dtype == np.float32
+    # 19.99 does not survive float32, so it stays float64
+    assert compact["PRICE"].dtype == np.float64
+    assert compact["LOCATION"].tolist() == df["LOCATION"].tolist()
+    assert compact["CANNABISINVENTORY"].tolist() == [True, False] * 50
+    assert compact["QUANTITY"].tolist() == df["QUANTITY"].tolist()
+
+
+def test_concat_keeps_categoricals_with_different_categories():
+    first = compact_dtypes(pd.DataFrame({"LOCATION": ["lebanon"] * 4}))
+    second = compact_dtypes(pd.DataFrame({"LOCATION": ["carthage"] * 4}))
+
+    df = concat_compact([first, second])
+
+    assert isinstance(df["LOCATION"].dtype, pd.CategoricalDtype)
+    assert df["LOCATION"].tolist() == ["lebanon"] * 4 + ["carthage"] * 4
@@ -0,0 +1,90 @@
+import datetime
+import os
+import threading
+import time
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from functions import local_warehouse, query_executor
+from functions.export import ExportJob
+from functions.local_warehouse import LocalWarehouseConnection
+from functions.query_executor import CursorPool, execute_query, query_registry
+
+
+DATE_RANGE = (datetime.date(2026, 5, 1), datetime.date(2026, 5, 31))
+
+
+def items_sold(date_range):
+    return int(execute_query(f"""
+        SELECT COUNT(*) FROM FLORAOS.BLUE_SAGE.flattened_itemsv_blue_sage_04_28_2024 AS i
+        JOIN FLORAOS.BLUE_SAGE.dutchie_inventory AS p ON i.productid = p.productid
+        JOIN FLORAOS.BLUE_SAGE.dutchie_transactions AS t ON i.transactionid = t.transactionid
+        WHERE TO_DATE(t.transactiondate) BETWEEN '{date_range[0]}' AND '{date_range[1]}'
+    """).iloc[0, 0])
+
+
+def test_large_export_is_split_into_parts(pool, tmp_path, monkeypatch):
+    monkeypatch.setattr(local_warehouse, "ARROW_BATCH_ROWS", 500)
+    job = ExportJob(DATE_RANGE, file_format="CSV", directory=str(tmp_path), part_rows=1_000)
+    job.run()
+
+    assert job.status == "done"
+    assert job.rows == job.total_rows == items_sold(DATE_RANGE)
+    assert len(job.parts) == -(-job.rows // 1_000)
+    assert all(part.rows <= 1_000 for part in job.parts)
+    df = pd.concat([pd.read_csv(part.path) for part in job.parts], ignore_index=True)
+    assert len(df) == job.rows
+    # The parts follow on from each other in the export's order
+    order = list(zip(pd.to_datetime(df["TRANSACTIONDATE"]), df["TRANSACTIONID"]))
+    assert order == sorted(order)
+    # Nothing but the published parts is left behind
+    assert sorted(os.listdir(tmp_path)) == sorted(part.file_name for part in job.parts)
+
+
+def test_small_export_is_one_file(pool, tmp_path):
+    job = ExportJob(DATE_RANGE, file_format="Parquet", directory=str(tmp_path))
+    job.run()
+
+    assert job.status == "done"
+    assert [part.file_name for part in job.parts] == [job.file_name]
+    assert pq.read_table(job.path).num_rows == job.rows == items_sold(DATE_RANGE)
+
+
+@pytest.fixture
+def queued_warehouse(warehouse_path, monkeypatch):
+    # Every query waits in the warehouse queue for longer than the test runs
+    connection = LocalWarehouseConnection(warehouse_path, latency_seconds=60)
+    pool = CursorPool(lambda: connection, size=2, acquire_timeout=5)
+    monkeypatch.setattr(query_executor, "cursor_pool", pool)
+    yield pool
+    pool.close()
+
+
+def test_cancel_aborts_the_query_in_the_warehouse(queued_warehouse, tmp_path):
+    job = ExportJob(DATE_RANGE, directory=str(tmp_path))
+    thread = threading.Thread(target=job.run)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while not query_registry.in_flight():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+    job.cancel()
+    thread.join(5)
+
+    assert not thread.is_alive()
+    assert job.status == "cancelled"
+    assert query_registry.in_flight() == []
+    assert queued_warehouse.stats()["in_use"] == 0
+    assert os.listdir(tmp_path) == []
+
+
+def test_cancelled_before_it_starts_runs_no_query(queued_warehouse, tmp_path):
+    job = ExportJob(DATE_RANGE, directory=str(tmp_path))
+    job.cancel()
+    job.run()
+
+    assert job.status == "cancelled"
+    assert queued_warehouse.stats()["checkouts"] == 0
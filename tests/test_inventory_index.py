@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from functions.inventory_index import AGE_BUCKETS, InventoryAgingIndex
+
+
+@pytest.fixture
+def inventory():
+    rng = np.random.default_rng(7)
+    rows = 6_000
+    df = pd.DataFrame({
+        "PRODUCTNAME": [f"SKU {i:04d}" for i in range(rows)],
+        "LOCATION": rng.choice(["lebanon", "carthage", "nashville"], rows),
+        "CATEGORY": rng.choice(["Flower", "Edibles", "Vapes", "Accessories"], rows),
+        "CANNABISINVENTORY": rng.choice([True, False, None], rows),
+    })
+    for bucket in AGE_BUCKETS:
+        # Small counts, so that ties are common, and some products with none recorded
+        values = rng.integers(0, 20, rows).astype(float)
+        values[rng.random(rows) < 0.1] = np.nan
+        df[bucket] = values
+    return df
+
+
+def expected_top(df, location, category, bucket, k, exclude_categories=()):
+    df = df[df["CANNABISINVENTORY"].fillna(False).astype(bool)]
+    if location is not None:
+        df = df[df["LOCATION"] == location]
+    if category is not None:
+        df = df[df["CATEGORY"] == category]
+    df = df[~df["CATEGORY"].isin(exclude_categories)]
+    return df.sort_values(bucket, ascending=False, kind="stable", na_position="last").head(k)
+
+
+@pytest.mark.parametrize("location, category", [
+    (None, None), ("lebanon", None), (None, "Flower"), ("carthage", "Edibles"),
+])
+def test_top_matches_filtering_and_sorting_the_frame(inventory, location, category):
+    index = InventoryAgingIndex(inventory)
+
+    for bucket in AGE_BUCKETS:
+        df = index.top(location, category, bucket=bucket, k=15)
+        expected = expected_top(inventory, location, category, bucket, 15)
+        assert df["PRODUCTNAME"].tolist() == expected["PRODUCTNAME"].tolist()
+
+
+def test_excluded_categories_are_skipped(inventory):
+    index = InventoryAgingIndex(inventory)
+
+    # More rows than one scan chunk are excluded before K are kept
+    df = index.top("lebanon", bucket="121+", k=300, exclude_categories=("Accessories", "Vapes"))
+
+    expected = expected_top(inventory, "lebanon", None, "121+", 300, ("Accessories", "Vapes"))
+    assert df["PRODUCTNAME"].tolist() == expected["PRODUCTNAME"].tolist()
+    assert len(df) == 300
+
+
+def test_unknown_partition_is_empty(inventory):
+    index = InventoryAgingIndex(inventory)
+
+    assert index.top("memphis").empty
+    assert index.locations == ["carthage", "lebanon", "nashville"]
+    assert len(index) == inventory["CANNABISINVENTORY"].fillna(False).astype(bool).sum()
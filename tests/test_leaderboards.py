@@ -0,0 +1,51 @@
+import datetime
+
+import pytest
+
+from functions import functions
+from functions.query_cache import QueryCache
+from functions.rollup_store import RollupStore
+
+
+# The last day of the synthetic data in conftest.py
+END_DATE = datetime.date(2026, 6, 30)
+DAYS = [END_DATE - datetime.timedelta(days=offset) for offset in range(2, 9)]
+
+
+@pytest.fixture
+def sources(warehouse_path, pool, tmp_path, monkeypatch):
+    # Returns get(fn, *args) -> (answer from the rollups, answer from the warehouse)
+    rollups = RollupStore(root=str(tmp_path / "rollups"))
+    rollups.refresh(since=datetime.date(2026, 4, 1), today=END_DATE)
+    no_rollups = RollupStore(root=str(tmp_path / "empty"))
+
+    def get(fn, *args, **kwargs):
+        answers = []
+        for store in (rollups, no_rollups):
+            monkeypatch.setattr(functions, "rollup_store", store)
+            monkeypatch.setattr(functions, "query_cache", QueryCache(disk=None))
+            answers.append(fn(*args, **kwargs))
+        return answers
+    return get
+
+
+def test_budtender_top_ten_breaks_ties_by_name(sources):
+    ties = 0
+    for day in DAYS:
+        from_rollups, from_warehouse = sources(functions.get_budtender_transaction_data, (day, day))
+        assert from_rollups["BUDTENDER"].tolist() == from_warehouse["BUDTENDER"].tolist()
+        assert from_rollups["TOTAL_TRANSACTIONS"].tolist() == from_warehouse["TOTAL_TRANSACTIONS"].tolist()
+        ranked = from_warehouse.assign(
+            KEY=list(zip(-from_warehouse["TOTAL_TRANSACTIONS"], from_warehouse["BUDTENDER"])))
+        assert ranked["KEY"].is_monotonic_increasing
+        ties += from_warehouse["TOTAL_TRANSACTIONS"].duplicated().sum()
+    # The days are short enough that some budtenders tie
+    assert ties > 0
+
+
+def test_location_top_products_break_ties_by_name(sources):
+    for day in DAYS:
+        from_rollups, from_warehouse = sources(functions.get_location_product_sales, (day, day), top_n=3)
+        columns = ["LOCATION", "PRODUCTNAME"]
+        assert from_rollups[columns].astype(str).values.tolist() == \
+            from_warehouse[columns].astype(str).values.tolist()
@@ -0,0 +1,82 @@
+import datetime
+
+from functions.pipeline import Pipeline
+from functions.query_executor import execute_query
+
+
+DATE_RANGE = (datetime.date(2026, 5, 1), datetime.date(2026, 5, 31))
+
+
+def product_sales():
+    return (
+        Pipeline.table("FLORAOS.BLUE_SAGE.flattened_itemsv_blue_sage_04_28_2024", alias="i")
+        .join("FLORAOS.BLUE_SAGE.dutchie_inventory", "i.productid = p.productid", alias="p")
+        .join("FLORAOS.BLUE_SAGE.dutchie_transactions", "i.transactionid = t.transactionid", alias="t")
+        .filter_date_range("t.transactiondate", DATE_RANGE)
+        .aggregate(
+            by={"PRODUCTNAME": "p.productname", "LOCATION": "p.location"},
+            TOTAL_SALES="SUM(i.totalprice)",
+        )
+    )
+
+
+def raw_product_sales():
+    # The same totals summed in pandas from the raw rows
+    df = execute_query(f"""
+        SELECT p.productname AS PRODUCTNAME, p.location AS LOCATION, i.totalprice AS TOTALPRICE
+        FROM FLORAOS.BLUE_SAGE.flattened_itemsv_blue_sage_04_28_2024 AS i
+        JOIN FLORAOS.BLUE_SAGE.dutchie_inventory AS p ON i.productid = p.productid
+        JOIN FLORAOS.BLUE_SAGE.dutchie_transactions AS t ON i.transactionid = t.transactionid
+        WHERE CAST(t.transactiondate AS DATE) BETWEEN DATE '{DATE_RANGE[0]}' AND DATE '{DATE_RANGE[1]}'
+    """)
+    df = df.astype({"PRODUCTNAME": str, "LOCATION": str})
+    return (
+        df.groupby(["PRODUCTNAME", "LOCATION"], as_index=False)["TOTALPRICE"].sum()
+        .rename(columns={"TOTALPRICE": "TOTAL_SALES"})
+    )
+
+
+def test_steps_do_not_change_the_pipeline_they_extend():
+    base = product_sales()
+    before = base.to_query()
+
+    base.top_n(3, by="SUM(i.totalprice)", partition_by="p.location")
+    base.filter_in("p.location", "location", ["lebanon"])
+
+    after = base.to_query()
+    assert (after.sql, after.params) == (before.sql, before.params)
+
+
+def test_per_location_top_n_runs_in_the_warehouse(pool):
+    query = (
+        product_sales()
+        .top_n(3, by="SUM(i.totalprice)", partition_by="p.location", tie_break="p.productname")
+        .order_by("LOCATION", "TOTAL_SALES DESC", "PRODUCTNAME")
+        .to_query()
+    )
+    assert "QUALIFY ROW_NUMBER() OVER (PARTITION BY p.location" in query.sql
+    assert query.params["top_n"] == 3
+
+    df = execute_query(query.sql, query.params).astype({"PRODUCTNAME": str, "LOCATION": str})
+
+    raw = raw_product_sales()
+    raw["TOTAL_SALES"] = raw["TOTAL_SALES"].round(2)
+    expected = (
+        raw.sort_values(["LOCATION", "TOTAL_SALES", "PRODUCTNAME"], ascending=[True, False, True])
+        .groupby("LOCATION").head(3)
+    )
+    assert len(df) == 3 * raw["LOCATION"].nunique()
+    assert df[["LOCATION", "PRODUCTNAME"]].values.tolist() == \
+        expected[["LOCATION", "PRODUCTNAME"]].values.tolist()
+    assert df["TOTAL_SALES"].round(2).tolist() == expected["TOTAL_SALES"].tolist()
+
+
+def test_global_top_n_is_order_by_and_limit(pool):
+    query = product_sales().top_n(5, by="SUM(i.totalprice)", tie_break="p.productname").to_query()
+    assert query.sql.endswith("ORDER BY SUM(i.totalprice) DESC, p.productname LIMIT %(limit)s")
+
+    df = execute_query(query.sql, query.params)
+
+    expected = raw_product_sales().assign(TOTAL_SALES=lambda df: df["TOTAL_SALES"].round(2))
+    expected = expected.sort_values(["TOTAL_SALES", "PRODUCTNAME"], ascending=[False, True]).head(5)
+    assert df["TOTAL_SALES"].round(2).tolist() == expected["TOTAL_SALES"].tolist()
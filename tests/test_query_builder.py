@@ -0,0 +1,50 @@
+import datetime
+
+from functions.query_builder import BoundQuery, QueryBuilder
+from functions.query_cache import cache_key
+
+
+TEMPLATE = """
+    SELECT location, SUM(total) AS TOTAL_SALES
+    FROM FLORAOS.BLUE_SAGE.DUTCHIE_TRANSACTIONS
+    {where}
+    GROUP BY 1
+"""
+
+
+def sales(date_range, locations=None):
+    return (
+        QueryBuilder(TEMPLATE)
+        .where_date_range("transactiondate", date_range)
+        .where_in("location", "location", locations)
+        .build()
+    )
+
+
+def test_values_are_bound_not_spliced():
+    query = sales((datetime.date(2026, 5, 1), "2026-05-31"), ["lebanon"])
+
+    assert "2026" not in query.sql and "lebanon" not in query.sql
+    assert query.params == {
+        "start_date": datetime.date(2026, 5, 1),
+        "end_date": datetime.date(2026, 5, 31),
+        "location_0": "lebanon",
+    }
+
+
+def test_same_logical_query_has_the_same_text():
+    may = sales((datetime.date(2026, 5, 1), datetime.date(2026, 5, 31)), ["lebanon", "carthage"])
+    june = sales((datetime.date(2026, 6, 1), datetime.date(2026, 6, 30)), ["carthage", "lebanon", "carthage"])
+
+    assert may.sql == june.sql
+    assert (may.params["location_0"], may.params["location_1"]) == ("carthage", "lebanon")
+    assert may.params["location_0"] == june.params["location_0"]
+    # Only the window differs, so both share one cache template
+    assert cache_key(may.sql, may.params)[0] == cache_key(june.sql, june.params)[0]
+    assert cache_key(june.sql, june.params)[1] == (datetime.date(2026, 6, 1), datetime.date(2026, 6, 30))
+
+
+def test_text_is_normalized():
+    assert BoundQuery("SELECT  1\n  FROM t ;").sql == "SELECT 1 FROM t"
+    assert sales(None).sql == "SELECT location, SUM(total) AS TOTAL_SALES " \
+        "FROM FLORAOS.BLUE_SAGE.DUTCHIE_TRANSACTIONS GROUP BY 1"
@@ -0,0 +1,74 @@
+import datetime
+
+import duckdb
+import pandas as pd
+
+from functions.pipeline import Pipeline
+from functions.query_cache import QueryCache
+from functions.query_executor import execute_query
+
+
+def daily_revenue(date_range):
+    # The daily-grain query get_weekly_profitability sends when no rollup covers the range
+    return (
+        Pipeline.table("FLORAOS.BLUE_SAGE.DUTCHIE_TRANSACTIONS")
+        .filter_date_range("TRANSACTIONDATE", date_range)
+        .aggregate(
+            by={"TRANSACTION_DATE": "TO_DATE(TRANSACTIONDATE)"},
+            TOTAL_REVENUE="SUM(TOTAL)",
+            PRICED_TRANSACTIONS="COUNT(TOTAL)",
+        )
+        .to_query()
+    )
+
+
+def counting(fetch, calls):
+    def run(query, params):
+        calls.append(params)
+        return fetch(query, params)
+    return run
+
+
+def by_date(df):
+    df = df.assign(TRANSACTION_DATE=pd.to_datetime(df["TRANSACTION_DATE"]))
+    return df.sort_values("TRANSACTION_DATE").reset_index(drop=True)
+
+
+def test_narrower_window_is_sliced_from_cached_wider_window(warehouse_path, pool):
+    cache = QueryCache(disk=None)
+    calls = []
+    fetch = counting(execute_query, calls)
+    wide = daily_revenue((datetime.date(2026, 4, 1), datetime.date(2026, 6, 30)))
+    narrow = daily_revenue((datetime.date(2026, 5, 10), datetime.date(2026, 5, 20)))
+
+    cache.get_or_fetch(wide.sql, fetch, date_column="TRANSACTION_DATE", params=wide.params)
+    df = cache.get_or_fetch(narrow.sql, fetch, date_column="TRANSACTION_DATE",
+                            params=narrow.params)
+
+    assert len(calls) == 1
+    assert cache.covered_hits == 1
+    # The same totals straight from the database, without the query builder or the cache
+    expected = duckdb.connect(warehouse_path, read_only=True).execute("""
+        SELECT CAST(TRANSACTIONDATE AS DATE) AS TRANSACTION_DATE,
+               SUM(TOTAL) AS TOTAL_REVENUE, COUNT(TOTAL) AS PRICED_TRANSACTIONS
+        FROM FLORAOS.BLUE_SAGE.DUTCHIE_TRANSACTIONS
+        WHERE CAST(TRANSACTIONDATE AS DATE) BETWEEN DATE '2026-05-10' AND DATE '2026-05-20'
+        GROUP BY 1
+    """).df()
+    assert len(expected) == 11
+    pd.testing.assert_frame_equal(by_date(df), by_date(expected), check_dtype=False)
+
+
+def test_result_without_date_column_is_not_sliced(warehouse_path, pool):
+    cache = QueryCache(disk=None)
+    calls = []
+    fetch = counting(execute_query, calls)
+    wide = daily_revenue((datetime.date(2026, 4, 1), datetime.date(2026, 6, 30)))
+    narrow = daily_revenue((datetime.date(2026, 5, 10), datetime.date(2026, 5, 20)))
+
+    cache.get_or_fetch(wide.sql, fetch, params=wide.params)
+    df = cache.get_or_fetch(narrow.sql, fetch, params=narrow.params)
+
+    assert len(calls) == 2
+    assert cache.covered_hits == 0
+    assert len(df) == 11
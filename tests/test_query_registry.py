@@ -0,0 +1,70 @@
+import threading
+import time
+
+import pytest
+
+from functions import query_executor
+from functions.local_warehouse import LocalWarehouseConnection
+from functions.query_cache import QueryCache
+from functions.query_executor import (
+    CursorPool,
+    QueryCancelled,
+    cancel_superseded_queries,
+    execute_query,
+    query_registry,
+    superseded_queries,
+)
+
+
+WANTED_AGAIN = "SELECT 1 AS ANSWER"
+# Runs for minutes unless it is aborted
+NOT_WANTED = "SELECT SUM(i * i) AS TOTAL FROM range(100000000000) AS t(i)"
+
+
+@pytest.fixture
+def session(warehouse_path, monkeypatch):
+    # Every query runs for a session, after a second in the warehouse queue
+    connection = LocalWarehouseConnection(warehouse_path, latency_seconds=1)
+    pool = CursorPool(lambda: connection, size=4, acquire_timeout=5)
+    monkeypatch.setattr(query_executor, "cursor_pool", pool)
+    monkeypatch.setattr(query_executor, "current_session_id", lambda: "session")
+    yield
+    pool.close()
+
+
+def test_only_queries_the_next_run_does_not_ask_for_are_cancelled(session):
+    cache = QueryCache(disk=None)
+    fetched = []
+    outcomes = {}
+
+    def fetch(query, params):
+        fetched.append(query)
+        return execute_query(query, params)
+
+    def earlier_run(query):
+        try:
+            outcomes[query] = cache.get_or_fetch(query, fetch)
+        except Exception as e:
+            outcomes[query] = e
+
+    threads = [threading.Thread(target=earlier_run, args=(query,))
+               for query in (WANTED_AGAIN, NOT_WANTED)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while len(query_registry.in_flight("session")) < 2:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+    # The next run asks for one of the two results again
+    superseded = superseded_queries()
+    df = cache.get_or_fetch(WANTED_AGAIN, fetch)
+    assert cancel_superseded_queries(superseded) == 1
+    for thread in threads:
+        thread.join(10)
+
+    assert df["ANSWER"].tolist() == [1]
+    assert fetched.count(WANTED_AGAIN) == 1
+    assert outcomes[WANTED_AGAIN]["ANSWER"].tolist() == [1]
+    assert isinstance(outcomes[NOT_WANTED], QueryCancelled)
+    assert query_registry.in_flight("session") == []
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from functions.ranking import rank_metrics, render_leaderboard, top_n
+
+
+def products():
+    return pd.DataFrame({
+        "PRODUCTNAME": ["Gummies", "Vape", "Flower", "Tincture", "Pre-roll", "Topical"],
+        "TOTAL_SALES": [50.0, 80.0, 80.0, np.nan, 20.0, 50.0],
+        "TOTAL_TRANSACTIONS": [5, 3, 9, 9, 1, 2],
+    })
+
+
+def test_ties_are_ordered_by_label_and_share_a_rank():
+    ranked = top_n(products(), "TOTAL_SALES", n=4)
+
+    assert ranked["PRODUCTNAME"].tolist() == ["Flower", "Vape", "Gummies", "Topical"]
+    assert ranked["RANK"].tolist() == [1, 1, 3, 3]
+
+
+def test_matches_a_full_sort():
+    rng = np.random.default_rng(7)
+    df = pd.DataFrame({
+        "PRODUCTNAME": [f"SKU {i:05d}" for i in rng.permutation(20_000)],
+        "TOTAL_SALES": rng.integers(0, 500, 20_000).astype(float),
+    })
+
+    ranked = top_n(df, "TOTAL_SALES", n=25)
+
+    expected = df.sort_values(["TOTAL_SALES", "PRODUCTNAME"], ascending=[False, True]).head(25)
+    assert ranked["PRODUCTNAME"].tolist() == expected["PRODUCTNAME"].tolist()
+
+
+def test_missing_values_never_make_a_leaderboard():
+    ranked = top_n(products(), "TOTAL_SALES", n=10)
+
+    assert "Tincture" not in ranked["PRODUCTNAME"].tolist()
+    assert len(ranked) == 5
+
+
+def test_several_metrics_rank_independently():
+    rankings = rank_metrics(products(), ["TOTAL_SALES", "TOTAL_TRANSACTIONS"], n=2)
+
+    assert rankings["TOTAL_SALES"]["PRODUCTNAME"].tolist() == ["Flower", "Vape"]
+    assert rankings["TOTAL_TRANSACTIONS"]["PRODUCTNAME"].tolist() == ["Flower", "Tincture"]
+
+
+def test_leaderboard_markdown():
+    ranked = top_n(products(), "TOTAL_SALES", n=3)
+
+    assert render_leaderboard(ranked, "TOTAL_SALES") == (
+        "### 🏆 Top 3 Products by :blue[Total Sales] 🏆\n"
+        "1. **Flower** - $80.00 in sales\n"
+        "1. **Vape** - $80.00 in sales\n"
+        "3. **Gummies** - $50.00 in sales\n"
+    )
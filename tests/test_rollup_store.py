@@ -0,0 +1,102 @@
+import datetime
+
+import pytest
+
+from benchmarks.synthetic_data import generate
+from functions import query_executor
+from functions.local_warehouse import LocalWarehouseConnection
+from functions.query_executor import CursorPool, execute_query
+from functions.rollup_store import RollupStore
+
+
+END_DATE = datetime.date(2026, 6, 30)
+CUTOFF = datetime.date(2026, 5, 10)
+
+
+@pytest.fixture
+def warehouse(tmp_path, monkeypatch):
+    # A writable copy, so the tests can hold rows back and change them between refreshes
+    path = tmp_path / "floraos.duckdb"
+    generate(str(path), transactions=5_000, days=120, seed=7, end_date=END_DATE)
+    connection = LocalWarehouseConnection(str(path), read_only=False)
+    pool = CursorPool(lambda: connection, size=2, acquire_timeout=5)
+    monkeypatch.setattr(query_executor, "cursor_pool", pool)
+    yield connection
+    pool.close()
+    connection.close()
+
+
+def run(connection, sql):
+    connection.cursor().execute(sql)
+
+
+def warehouse_revenue(start, end):
+    df = execute_query(f"""
+        SELECT TO_DATE(TRANSACTIONDATE) AS TRANSACTION_DATE, SUM(TOTAL) AS TOTAL_REVENUE
+        FROM FLORAOS.BLUE_SAGE.DUTCHIE_TRANSACTIONS
+        WHERE TO_DATE(TRANSACTIONDATE) BETWEEN '{start}' AND '{end}'
+        GROUP BY 1 ORDER BY 1
+    """)
+    return df["TOTAL_REVENUE"].round(2).tolist()
+
+
+def rollup_revenue(store, start, end):
+    df = store.daily_revenue(start, end).sort_values("TRANSACTION_DATE")
+    return df["TOTAL_REVENUE"].round(2).tolist()
+
+
+def hold_back_after(connection, day):
+    # Rows after `day` have not arrived yet
+    run(connection, f"""
+        CREATE TABLE blue_sage.late AS SELECT * FROM blue_sage.DUTCHIE_TRANSACTIONS
+        WHERE CAST(TRANSACTIONDATE AS DATE) > DATE '{day}'
+    """)
+    run(connection, f"""
+        DELETE FROM blue_sage.DUTCHIE_TRANSACTIONS
+        WHERE CAST(TRANSACTIONDATE AS DATE) > DATE '{day}'
+    """)
+
+
+def release_held_back(connection):
+    run(connection, "INSERT INTO blue_sage.DUTCHIE_TRANSACTIONS SELECT * FROM blue_sage.late")
+
+
+def test_later_since_still_fetches_from_the_watermark(warehouse, tmp_path):
+    store = RollupStore(root=str(tmp_path / "rollups"))
+    hold_back_after(warehouse, CUTOFF)
+    store.refresh(since=datetime.date(2026, 4, 1), today=CUTOFF)
+    assert store.manifest()["watermark"] == CUTOFF
+    release_held_back(warehouse)
+
+    store.refresh(since=datetime.date(2026, 6, 1), today=END_DATE)
+
+    gap = (datetime.date(2026, 5, 15), datetime.date(2026, 5, 20))
+    assert store.covers(*gap)
+    assert rollup_revenue(store, *gap) == warehouse_revenue(*gap)
+    # The formerly partial watermark day is complete now too
+    assert rollup_revenue(store, CUTOFF, CUTOFF) == warehouse_revenue(CUTOFF, CUTOFF)
+
+
+def test_refresh_picks_up_corrections_in_the_reconciliation_window(warehouse, tmp_path):
+    store = RollupStore(root=str(tmp_path / "rollups"), reconcile_days=7)
+    store.refresh(since=datetime.date(2026, 4, 1), today=END_DATE)
+    corrected = END_DATE - datetime.timedelta(days=3)
+    run(warehouse, f"""
+        UPDATE blue_sage.DUTCHIE_TRANSACTIONS SET TOTAL = TOTAL + 100
+        WHERE CAST(TRANSACTIONDATE AS DATE) = DATE '{corrected}'
+    """)
+
+    store.refresh(today=END_DATE)
+
+    assert rollup_revenue(store, corrected, corrected) == warehouse_revenue(corrected, corrected)
+    assert store.manifest()["start"] == datetime.date(2026, 4, 1)
+
+
+def test_watermark_day_is_not_covered(warehouse, tmp_path):
+    store = RollupStore(root=str(tmp_path / "rollups"))
+    hold_back_after(warehouse, CUTOFF)
+    store.refresh(since=datetime.date(2026, 4, 1), today=CUTOFF)
+
+    assert store.covers(datetime.date(2026, 4, 1), CUTOFF - datetime.timedelta(days=1))
+    assert not store.covers(datetime.date(2026, 4, 1), CUTOFF)
+    assert not store.covers(datetime.date(2026, 3, 31), datetime.date(2026, 4, 30))
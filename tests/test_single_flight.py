@@ -0,0 +1,89 @@
+import threading
+import time
+
+import pytest
+
+from functions.local_warehouse import LocalQueryError
+from functions.query_cache import QueryCache
+from functions.query_executor import execute_query
+from functions.single_flight import FlightAbandoned, SingleFlight
+
+
+WAITERS = 4
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out waiting for the other callers")
+        time.sleep(0.01)
+
+
+def run_together(target, count):
+    # Calls `target` on `count` threads and returns what each one returned or raised
+    outcomes = [None] * count
+
+    def run(index):
+        try:
+            outcomes[index] = target()
+        except Exception as e:
+            outcomes[index] = e
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return outcomes
+
+
+def test_failed_query_is_raised_in_every_waiter(pool):
+    cache = QueryCache(disk=None)
+    calls = []
+
+    def fetch(query, params):
+        calls.append(query)
+        # Hold the query back until every other caller is waiting on it
+        wait_for(lambda: cache.flights.stats()["shared"] == WAITERS)
+        return execute_query(query, params)
+
+    outcomes = run_together(
+        lambda: cache.get_or_fetch("SELECT * FROM FLORAOS.BLUE_SAGE.NO_SUCH_TABLE", fetch),
+        WAITERS + 1)
+
+    assert len(calls) == 1
+    assert all(isinstance(outcome, LocalQueryError) for outcome in outcomes)
+    assert len({id(outcome) for outcome in outcomes}) == 1
+    assert cache.flights.in_flight() == 0
+    assert cache.stats()["entries"] == 0
+
+
+def test_waiter_takes_over_an_abandoned_flight():
+    flights = SingleFlight()
+    calls = []
+
+    def fn():
+        calls.append(None)
+        if len(calls) == 1:
+            wait_for(lambda: flights.stats()["shared"] == 1)
+            raise FlightAbandoned()
+        return "result"
+
+    outcomes = run_together(lambda: flights.do("key", fn), 2)
+
+    assert len(calls) == 2
+    # The leader gives up, and the waiter runs `fn` again as the new leader
+    assert any(isinstance(outcome, FlightAbandoned) for outcome in outcomes)
+    assert ("result", False) in outcomes
+
+
+def test_error_leaves_no_flight_behind():
+    flights = SingleFlight()
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        flights.do("key", fail)
+    assert flights.do("key", lambda: 1) == (1, False)
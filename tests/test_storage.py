@@ -0,0 +1,42 @@
+import os
+import threading
+
+import pandas as pd
+import pytest
+
+from functions.storage import read_json, write_json_atomic, write_parquet_atomic
+
+
+def test_concurrent_writers_never_publish_a_mixed_file(tmp_path):
+    # Writers in one process share a PID, like replicas in identical containers
+    path = str(tmp_path / "rows.parquet")
+    frames = [pd.DataFrame({"WRITER": [writer] * 50_000}) for writer in range(8)]
+    errors = []
+
+    def write(df):
+        try:
+            for _ in range(5):
+                write_parquet_atomic(df, path)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(df,)) for df in frames]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert pd.read_parquet(path)["WRITER"].nunique() == 1
+    assert os.listdir(tmp_path) == ["rows.parquet"]
+
+
+def test_failed_write_leaves_no_temporary_file(tmp_path):
+    path = str(tmp_path / "state.json")
+    write_json_atomic({"watermark": "2026-06-30"}, path)
+
+    with pytest.raises(TypeError):
+        write_json_atomic({"watermark": object()}, path)
+
+    assert read_json(path) == {"watermark": "2026-06-30"}
+    assert os.listdir(tmp_path) == ["state.json"]
@@ -0,0 +1,102 @@
+import datetime
+import functools
+
+import pyarrow.parquet as pq
+import pytest
+
+from functions import functions, local_warehouse, streaming
+from functions.disk_cache import DiskCache
+from functions.pipeline import Pipeline
+from functions.query_cache import QueryCache
+from functions.query_executor import iter_query_batches
+from functions.streaming import fetch_frame
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = QueryCache(disk=DiskCache(str(tmp_path / "query_cache")))
+    monkeypatch.setattr(functions, "query_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def ceiling(monkeypatch):
+    # Small batches under a small ceiling, so a few thousand rows are enough to hit it
+    monkeypatch.setattr(local_warehouse, "ARROW_BATCH_ROWS", 500)
+
+    def set_ceiling(max_bytes):
+        monkeypatch.setattr(functions, "fetch_frame", functools.partial(fetch_frame, max_bytes=max_bytes))
+    return set_ceiling
+
+
+def transactions():
+    return (
+        Pipeline.table("FLORAOS.BLUE_SAGE.DUTCHIE_TRANSACTIONS")
+        .filter_date_range("TRANSACTIONDATE", (datetime.date(2026, 3, 1), datetime.date(2026, 6, 30)))
+        .select("TRANSACTIONID", "TRANSACTIONDATE", "TOTAL")
+        .to_query()
+    )
+
+
+def test_truncated_stream_is_not_cached(pool, cache, ceiling):
+    ceiling(30_000)
+
+    with pytest.warns(ResourceWarning):
+        df = functions.get_data(transactions(), fetch=functions.fetch_streaming)
+    with pytest.warns(ResourceWarning):
+        again = functions.get_data(transactions(), fetch=functions.fetch_streaming)
+
+    # Every call shows the rows that fit, and queries again rather than reading them back
+    assert 0 < len(df) == len(again) < 4_000
+    assert cache.misses == 2
+    assert cache.stats()["entries"] == 0
+    assert cache.disk.stats()["entries"] == 0
+
+
+def test_complete_stream_is_cached(pool, cache, ceiling):
+    ceiling(64 * 1024 * 1024)
+
+    df = functions.get_data(transactions(), fetch=functions.fetch_streaming)
+    again = functions.get_data(transactions(), fetch=functions.fetch_streaming)
+
+    assert len(df) == len(again) > 1_000
+    assert (cache.misses, cache.hits) == (1, 1)
+    assert cache.disk.stats()["entries"] == 1
+
+
+@pytest.fixture
+def spill_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_warehouse, "ARROW_BATCH_ROWS", 500)
+    monkeypatch.setattr(streaming, "SPILL_DIR", str(tmp_path / "spill"))
+    return tmp_path / "spill"
+
+
+def test_spill_file_is_removed_with_its_result(pool, spill_dir):
+    query = transactions()
+    with pytest.warns(ResourceWarning):
+        with fetch_frame(query.sql, query.params, max_bytes=30_000, on_limit="spill") as result:
+            assert result.truncated
+            spilled = pq.read_table(result.spill_path).num_rows
+            assert len(result.frame) + spilled == result.rows > 1_000
+
+    assert result.spill_path is None
+    assert list(spill_dir.iterdir()) == []
+
+
+def test_spill_file_is_removed_when_the_stream_fails(pool, spill_dir, monkeypatch):
+    def failing_batches(query, params=None):
+        batches = iter_query_batches(query, params)
+        try:
+            for number, batch in enumerate(batches):
+                if number == 4:
+                    raise ConnectionError("connection reset")
+                yield batch
+        finally:
+            batches.close()
+    monkeypatch.setattr(streaming, "iter_query_batches", failing_batches)
+
+    query = transactions()
+    with pytest.warns(ResourceWarning), pytest.raises(ConnectionError):
+        fetch_frame(query.sql, query.params, max_bytes=30_000, on_limit="spill")
+
+    assert list(spill_dir.iterdir()) == []
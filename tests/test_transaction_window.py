@@ -0,0 +1,107 @@
+import datetime
+
+import pytest
+
+from benchmarks.synthetic_data import generate
+from functions import query_executor, transaction_window
+from functions.local_warehouse import LocalWarehouseConnection
+from functions.query_executor import CursorPool, execute_query
+from functions.transaction_window import TransactionWindowStore
+
+
+END_DATE = datetime.date(2026, 6, 30)
+CUTOFF = datetime.date(2026, 6, 20)
+
+
+@pytest.fixture
+def warehouse(tmp_path, monkeypatch):
+    # A writable copy, so the tests can hold rows back and change them between refreshes
+    path = tmp_path / "floraos.duckdb"
+    generate(str(path), transactions=5_000, days=120, seed=7, end_date=END_DATE)
+    connection = LocalWarehouseConnection(str(path), read_only=False)
+    pool = CursorPool(lambda: connection, size=2, acquire_timeout=5)
+    monkeypatch.setattr(query_executor, "cursor_pool", pool)
+    yield connection
+    pool.close()
+    connection.close()
+
+
+@pytest.fixture
+def fetched_since(monkeypatch):
+    # The `since` of every delta query the store sends
+    calls = []
+
+    def run(query, params=None):
+        calls.append(params["since"])
+        return execute_query(query, params)
+    monkeypatch.setattr(transaction_window, "execute_query", run)
+    return calls
+
+
+def run(connection, sql):
+    connection.cursor().execute(sql)
+
+
+def warehouse_rows(since):
+    df = execute_query(f"""
+        SELECT TRANSACTIONID, TOTAL FROM FLORAOS.BLUE_SAGE.DUTCHIE_TRANSACTIONS
+        WHERE CAST(TRANSACTIONDATE AS DATE) >= DATE '{since}'
+    """)
+    return stored_rows(df)
+
+
+def stored_rows(df):
+    # Some transactions have no total; None compares equal where NaN does not
+    totals = df["TOTAL"].round(2).astype(object).where(df["TOTAL"].notna(), None)
+    return dict(zip(df["TRANSACTIONID"], totals))
+
+
+def test_refresh_fetches_only_from_the_watermark(warehouse, fetched_since, tmp_path):
+    store = TransactionWindowStore(root=str(tmp_path / "transactions"))
+    run(warehouse, f"CREATE TABLE blue_sage.late AS SELECT * FROM blue_sage.DUTCHIE_TRANSACTIONS "
+                   f"WHERE CAST(TRANSACTIONDATE AS DATE) > DATE '{CUTOFF}'")
+    run(warehouse, f"DELETE FROM blue_sage.DUTCHIE_TRANSACTIONS "
+                   f"WHERE CAST(TRANSACTIONDATE AS DATE) > DATE '{CUTOFF}'")
+    store.refresh(today=CUTOFF)
+    run(warehouse, "INSERT INTO blue_sage.DUTCHIE_TRANSACTIONS SELECT * FROM blue_sage.late")
+
+    df = store.refresh(today=END_DATE, reconcile=False)
+
+    assert fetched_since == [store.window_start(CUTOFF), CUTOFF]
+    assert store.state()["watermark"] == END_DATE
+    assert stored_rows(df) == warehouse_rows(store.window_start(END_DATE))
+
+
+def test_reconciliation_picks_up_voided_and_corrected_transactions(warehouse, fetched_since, tmp_path):
+    store = TransactionWindowStore(root=str(tmp_path / "transactions"), reconcile_days=7)
+    store.refresh(today=END_DATE)
+    changed = END_DATE - datetime.timedelta(days=3)
+    run(warehouse, f"""
+        UPDATE blue_sage.DUTCHIE_TRANSACTIONS SET TOTAL = TOTAL + 100
+        WHERE CAST(TRANSACTIONDATE AS DATE) = DATE '{changed}'
+    """)
+    run(warehouse, f"""
+        DELETE FROM blue_sage.DUTCHIE_TRANSACTIONS WHERE TRANSACTIONID = (
+            SELECT MIN(TRANSACTIONID) FROM blue_sage.DUTCHIE_TRANSACTIONS
+            WHERE CAST(TRANSACTIONDATE AS DATE) = DATE '{changed}')
+    """)
+    expected = warehouse_rows(store.window_start(END_DATE))
+
+    # A plain refresh only looks at the watermark day
+    assert stored_rows(store.refresh(today=END_DATE, reconcile=False)) != expected
+    df = store.refresh(today=END_DATE, reconcile=True)
+
+    assert fetched_since[-1] == END_DATE - datetime.timedelta(days=7)
+    assert stored_rows(df) == expected
+
+
+def test_rows_that_age_out_of_the_window_are_dropped(warehouse, fetched_since, tmp_path):
+    store = TransactionWindowStore(root=str(tmp_path / "transactions"))
+    store.refresh(today=END_DATE)
+    later = datetime.date(2027, 4, 15)
+
+    df = store.refresh(today=later, reconcile=False)
+
+    assert fetched_since[-1] == END_DATE
+    assert df["TRANSACTION_DATE"].min().date() >= store.window_start(later)
+    assert stored_rows(df) == warehouse_rows(store.window_start(later))